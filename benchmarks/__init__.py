@@ -0,0 +1,4 @@
+"""
+Reproducible benchmarks of the distributed index, see `python -m benchmarks
+--help`.
+"""
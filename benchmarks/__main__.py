@@ -0,0 +1,89 @@
+"""
+Usage:
+
+    python -m benchmarks corpus 1000 data/synthetic.1000.jsonl
+    python -m benchmarks micro --output results/micro.json
+    python -m benchmarks micro --nlp fast --output results/micro.fast.json
+    python -m benchmarks cluster --nodes 1 2 4 --output results/cluster.json
+    python -m benchmarks compare results/baseline.json results/micro.json
+"""
+import argparse
+import sys
+
+from benchmarks import cluster, corpus, micro
+from benchmarks.results import THRESHOLD, compare, load, save
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    corpus_parser = commands.add_parser(
+        'corpus', help="Write a synthetic corpus as JSON lines.")
+    corpus_parser.add_argument('documents', type=int)
+    corpus_parser.add_argument('path')
+    corpus_parser.add_argument('--seed', type=int, default=0)
+
+    micro_parser = commands.add_parser(
+        'micro', help="Benchmark the index data structures.")
+    micro_parser.add_argument('--documents', type=int, default=2000)
+    micro_parser.add_argument('--seed', type=int, default=0)
+    micro_parser.add_argument('--repetitions', type=int, default=3)
+    micro_parser.add_argument('--nodes', type=int, default=4)
+    micro_parser.add_argument(
+        '--nlp', choices=['stub', 'spacy', 'fast'], default='stub',
+        help="Analyze the texts with a stub tokenizer, spaCy or the fast "
+             "engine of the slave nodes.")
+    micro_parser.add_argument('--output')
+
+    cluster_parser = commands.add_parser(
+        'cluster', help="Benchmark a cluster on localhost.")
+    cluster_parser.add_argument('--documents', type=int, default=1000)
+    cluster_parser.add_argument('--seed', type=int, default=0)
+    cluster_parser.add_argument('--repetitions', type=int, default=1)
+    cluster_parser.add_argument('--nodes', type=int, nargs='+',
+                                default=[1, 2, 4])
+    cluster_parser.add_argument('--command', default='env/bin/start_master')
+    cluster_parser.add_argument('--port', type=int, default=8080)
+    cluster_parser.add_argument('--timeout', type=int, default=600)
+    cluster_parser.add_argument(
+        '--option', action='append', default=[], dest='options',
+        help="Option for the master node, e.g. --option=--shuffle=push.")
+    cluster_parser.add_argument('--output')
+
+    compare_parser = commands.add_parser(
+        'compare', help="Compare two result files. Exits with 1 if a "
+                        "measurement got slower.")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float,
+                                default=THRESHOLD)
+
+    arguments = parser.parse_args()
+
+    if arguments.command == 'corpus':
+        corpus.write(
+            corpus.generate(arguments.documents, arguments.seed),
+            arguments.path)
+    elif arguments.command == 'micro':
+        save(micro.run(
+            arguments.documents, arguments.seed, arguments.repetitions,
+            arguments.nodes, arguments.nlp), arguments.output)
+    elif arguments.command == 'cluster':
+        save(cluster.run(
+            arguments.documents, arguments.seed, arguments.nodes,
+            arguments.repetitions, arguments.command, arguments.port,
+            arguments.options, arguments.timeout), arguments.output)
+    else:
+        lines, regression = compare(
+            load(arguments.baseline), load(arguments.current),
+            arguments.threshold)
+        print('\n'.join(lines))
+        sys.exit(1 if regression else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+End-to-end runs of a cluster on localhost. Each run starts a master node
+with the given number of slave nodes, indexes a synthetic corpus via the
+job API and fetches the index, then stops the cluster again.
+"""
+import json
+import os
+import signal
+import subprocess
+import time
+from statistics import median
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from distributed_index.shared.process import descendants, peak_memory, \
+    proportional_memory
+
+from benchmarks import corpus
+from benchmarks.results import environment
+
+# Seconds between two requests for the health of the cluster or the status
+# of a job.
+POLL_INTERVAL = 0.1
+
+# Words per page when the index is fetched
+PAGE_SIZE = 10000
+
+
+def request(url, payload=None):
+    """
+    Send a GET request, or a POST request with a JSON payload. Returns the
+    decoded response and the number of bytes sent and received.
+    """
+    body = None
+    headers = {}
+    if payload is not None:
+        body = json.dumps(payload).encode('utf-8')
+        headers['content-type'] = 'application/json'
+
+    with urlopen(Request(url, data=body, headers=headers),
+                 timeout=3600) as response:
+        data = response.read()
+
+    return json.loads(data.decode('utf-8')), len(body or b''), len(data)
+
+
+def wait_for_cluster(url, timeout):
+    """
+    Wait until the master node and all slave nodes are healthy. Returns the
+    health of the cluster.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health, _, _ = request(f"{url}/api/health")
+            if health['health'] == 'green' and health.get('slave_nodes'):
+                return health
+        except (URLError, OSError, ValueError):
+            pass
+
+        time.sleep(POLL_INTERVAL)
+
+    raise TimeoutError(f"The cluster did not start within {timeout}s.")
+
+
+def cluster_memory(pid):
+    """
+    Peak and proportional memory of the master node and all processes it
+    started, in bytes.
+    """
+    pids = [pid] + descendants(pid)
+    return (
+        sum(peak_memory(pid_) or 0 for pid_ in pids),
+        sum(proportional_memory(pid_) or 0 for pid_ in pids)
+    )
+
+
+def run_once(documents, nodes, command, port, options, timeout):
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        command.split() + [
+            f"--port={port}",
+            f"--slave_nodes_num={nodes}",
+            "--max_grace_seconds=0",
+            "--logfile=/dev/null"
+        ] + options,
+        preexec_fn=os.setsid
+    )
+
+    try:
+        t0 = time.perf_counter()
+        wait_for_cluster(url, timeout)
+        startup = time.perf_counter() - t0
+
+        # Index the corpus in the background and wait for the job
+        t0 = time.perf_counter()
+        job, bytes_sent, _ = request(
+            f"{url}/api/jobs", {"documents": documents, "return_index": True})
+        while job['status'] not in ('done', 'failed'):
+            time.sleep(POLL_INTERVAL)
+            job, _, _ = request(f"{url}/api/jobs/{job['job']}")
+        indexed = time.perf_counter() - t0
+
+        if job['status'] == 'failed':
+            raise RuntimeError(f"Indexing failed: {job.get('error')}")
+
+        # Fetch the index page by page
+        t0 = time.perf_counter()
+        bytes_received = 0
+        offset, total = 0, 1
+        while offset < total:
+            page, _, size = request(
+                f"{url}/api/jobs/{job['job']}/index"
+                f"?offset={offset}&size={PAGE_SIZE}")
+            bytes_received += size
+            offset += PAGE_SIZE
+            total = page['total']
+        collected = time.perf_counter() - t0
+
+        peak, proportional = cluster_memory(process.pid)
+    finally:
+        os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+        process.wait()
+
+    return {
+        "startup": startup,
+        "overall": indexed + collected,
+        "create_indices": job['stats']['create_indices'],
+        "merge_word_indices": job['stats']['merge_word_indices'],
+        "merge_final_indices": job['stats']['merge_final_indices'],
+        "collect": collected,
+        "bytes_sent": bytes_sent,
+        "bytes_shuffled": job['progress']['bytes_shuffled'],
+        "bytes_received": bytes_received,
+        "peak_memory": peak,
+        "proportional_memory": proportional
+    }
+
+
+def run(documents=1000, seed=0, nodes=(1, 2, 4), repetitions=1,
+        command="env/bin/start_master", port=8080, options=(),
+        timeout=600):
+    corpus_ = corpus.generate(documents, seed)
+
+    measurements = {}
+    for number_of_nodes in nodes:
+        runs = [
+            run_once(corpus_, number_of_nodes, command, port, list(options),
+                     timeout)
+            for _ in range(repetitions)
+        ]
+
+        prefix = f"cluster/{number_of_nodes}_nodes"
+        for stage in ('startup', 'overall', 'create_indices',
+                      'merge_word_indices', 'merge_final_indices',
+                      'collect'):
+            seconds = [run_[stage] for run_ in runs]
+            measurements[f"{prefix}/{stage}"] = {
+                "seconds": seconds,
+                "median": median(seconds)
+            }
+
+        for key in ('bytes_sent', 'bytes_shuffled', 'bytes_received',
+                    'peak_memory', 'proportional_memory'):
+            measurements[f"{prefix}/overall"][key] = \
+                median(run_[key] for run_ in runs)
+
+    return {
+        "benchmark": "cluster",
+        "environment": environment(),
+        "parameters": {
+            "documents": documents,
+            "seed": seed,
+            "repetitions": repetitions,
+            "nodes": list(nodes),
+            "options": list(options)
+        },
+        "measurements": measurements
+    }
@@ -0,0 +1,85 @@
+"""
+Deterministic synthetic corpora. The same seed always produces the same
+documents, so that runs on different machines or commits are comparable.
+"""
+import json
+import random
+
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'shi', 'vo', 'der', 'pan', 'gel',
+    'tor', 'fen', 'bri', 'sal', 'um', 'ost', 'ay', 'quin', 'zel'
+]
+
+STOPWORDS = ['the', 'a', 'and', 'of', 'in', 'to', 'is', 'was', 'for', 'on']
+
+
+def vocabulary(size, rng):
+    """
+    Create `size` distinct made-up words.
+    """
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES)
+                       for _ in range(rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+
+    return words
+
+
+def generate(number_of_documents, seed=0, vocabulary_size=20000,
+             mean_length=300):
+    """
+    Generate documents whose words follow a Zipf distribution, mixed with
+    stop words, numbers and punctuation like real text. Some words are
+    capitalized or get a plural 's' to exercise the analyzers.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, rng)
+
+    # Zipf weights: the n-th most frequent word occurs about 1/n as often
+    # as the most frequent one.
+    weights = [1 / rank for rank in range(1, vocabulary_size + 1)]
+    cumulative = []
+    total = 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    documents = []
+    for doc_id in range(number_of_documents):
+        length = max(1, int(rng.lognormvariate(0, 0.6) * mean_length))
+        tokens = []
+        for word in rng.choices(words, cum_weights=cumulative, k=length):
+            roll = rng.random()
+            if roll < 0.3:
+                tokens.append(rng.choice(STOPWORDS))
+            elif roll < 0.32:
+                tokens.append(str(rng.randint(0, 2000)))
+            elif roll < 0.4:
+                word = word.capitalize()
+            elif roll < 0.45:
+                word += 's'
+            tokens.append(word)
+            if rng.random() < 0.07:
+                tokens.append(rng.choice(['.', ',', '!', '?']))
+
+        documents.append({
+            "id": doc_id,
+            "url": f"https://example.org/{doc_id}",
+            "title": ' '.join(tokens[:5]),
+            "text": ' '.join(tokens)
+        })
+
+    return documents
+
+
+def write(documents, path):
+    """
+    Write the documents as JSON lines, the format /api/index/stream expects.
+    """
+    with open(path, 'w') as f:
+        for document in documents:
+            f.write(json.dumps(document) + '\n')
@@ -0,0 +1,108 @@
+"""
+Microbenchmarks of the index data structures on a single machine, without
+HTTP. Texts are analyzed by `StubNLP` unless spaCy or the fast engine is
+requested, so that the time of the index itself is not hidden by the NLP
+pipeline.
+"""
+from distributed_index.shared import wire
+from distributed_index.shared.fast_nlp import FastNLP
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.partitioning import HashRing
+from distributed_index.shared.process import peak_memory
+
+from benchmarks import corpus
+from benchmarks.results import environment, measure
+from benchmarks.stub import StubNLP
+
+MODES = {
+    "plain": {"scoring": False, "positional": False},
+    "scoring": {"scoring": True, "positional": False},
+    "positional": {"scoring": False, "positional": True}
+}
+
+
+def number_of_postings(inverted_index):
+    return sum(
+        len(postings)
+        for analyzers in inverted_index.values()
+        for index in analyzers.values()
+        for postings in index.values()
+    )
+
+
+def benchmark_mode(nlp, documents, settings, nodes, repetitions):
+    measurements = {}
+
+    def create_index(documents_):
+        index = InvertedIndex(nlp, **settings)
+        index.index(documents_)
+        return index
+
+    result, index = measure(lambda: create_index(documents), repetitions)
+    result["documents_per_second"] = len(documents) / result["median"]
+    result["postings"] = number_of_postings(index.inverted_index)
+    result["words"] = len(index.words())
+    measurements["index"] = result
+
+    # Assigning the words to the nodes is lazy, so the partial index of one
+    # node is created as well, like a node does when it serves its words.
+    def partition():
+        index.partition(ring)
+        return index.create_partition(0)
+
+    ring = HashRing([f"node_{i}" for i in range(nodes)])
+    measurements["partition"], _ = measure(partition, repetitions)
+
+    # The words one node of the cluster owns
+    words = [word for word in index.words() if ring.partition(word) == 0]
+    measurements["create_partial_index"], partial_index = measure(
+        lambda: index.create_partial_index(words), repetitions)
+
+    # Merge the indices of the batches of all nodes, like the reduce step
+    partial_indices = [
+        create_index(documents[i::nodes]).inverted_index
+        for i in range(nodes)
+    ]
+    measurements["merge"], _ = measure(
+        lambda: InvertedIndex.merge(None, *partial_indices, **settings),
+        repetitions)
+
+    measurements["wire_encode"], body = measure(
+        lambda: wire.encode_index(partial_index), repetitions)
+    measurements["wire_encode"]["bytes"] = len(body)
+    measurements["wire_decode"], _ = measure(
+        lambda: wire.decode_index(body), repetitions)
+
+    return measurements
+
+
+def run(documents=2000, seed=0, repetitions=3, nodes=4, engine='stub'):
+    if engine == 'spacy':
+        import spacy
+        nlp = spacy.load('en', disable=['parser', 'ner'])
+    elif engine == 'fast':
+        nlp = FastNLP()
+    else:
+        nlp = StubNLP()
+
+    corpus_ = corpus.generate(documents, seed)
+
+    measurements = {}
+    for mode, settings in MODES.items():
+        for name, result in benchmark_mode(
+                nlp, corpus_, settings, nodes, repetitions).items():
+            measurements[f"{mode}/{name}"] = result
+
+    return {
+        "benchmark": "micro",
+        "environment": environment(),
+        "parameters": {
+            "documents": documents,
+            "seed": seed,
+            "repetitions": repetitions,
+            "nodes": nodes,
+            "nlp": engine
+        },
+        "peak_memory": peak_memory(),
+        "measurements": measurements
+    }
@@ -0,0 +1,95 @@
+"""
+Machine-readable benchmark results and their comparison between runs.
+
+A result file is a JSON object with the environment of the run and the
+measurements by name. Each measurement has the seconds of every repetition
+and their median, plus any other numbers that were recorded (bytes,
+postings, memory, ...).
+"""
+import json
+import platform
+import subprocess
+import sys
+import time
+from statistics import median
+
+# Relative increase of the median time that counts as a regression
+THRESHOLD = 0.1
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def measure(function, repetitions):
+    """
+    Call the function `repetitions` times. Returns the measurement and the
+    result of the last call.
+    """
+    seconds = []
+    result = None
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - t0)
+
+    return {"seconds": seconds, "median": median(seconds)}, result
+
+
+def save(results, path=None):
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if path is None:
+        print(text)
+        return
+
+    with open(path, 'w') as f:
+        f.write(text + '\n')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    Compare the median times of the measurements both runs have. Returns
+    the lines of a report and whether any measurement got slower by more
+    than `threshold`.
+    """
+    lines = [f"{'measurement':<40} {'baseline':>10} {'current':>10} "
+             f"{'change':>8}"]
+    regression = False
+
+    for name in sorted(baseline['measurements']):
+        if name not in current['measurements']:
+            continue
+
+        before = baseline['measurements'][name]['median']
+        after = current['measurements'][name]['median']
+        change = after / before - 1 if before else 0.0
+
+        flag = ''
+        if change > threshold:
+            flag = ' slower'
+            regression = True
+        elif change < -threshold:
+            flag = ' faster'
+
+        lines.append(f"{name:<40} {before:>10.4f} {after:>10.4f} "
+                     f"{change:>+8.1%}{flag}")
+
+    return lines, regression
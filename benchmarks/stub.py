@@ -0,0 +1,46 @@
+"""
+Stand-in for the spaCy pipeline, so that the data structures can be
+benchmarked without the cost (and the installation) of spaCy. It only
+provides what `InvertedIndex` uses.
+"""
+import re
+
+from benchmarks.corpus import STOPWORDS
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class StubToken:
+    __slots__ = ('text', 'i', 'is_stop', 'pos_', 'tag_', 'lemma_')
+
+    def __init__(self, text, i):
+        self.text = text
+        self.i = i
+        self.is_stop = text.lower() in STOPWORDS
+
+        if text.isdigit():
+            self.pos_ = 'NUM'
+        elif not text[0].isalnum():
+            self.pos_ = 'PUNCT'
+        else:
+            self.pos_ = 'NOUN'
+        self.tag_ = self.pos_
+
+        self.lemma_ = text[:-1] if text.endswith('s') else text
+
+    def __str__(self):
+        return self.text
+
+
+class StubNLP:
+    def __call__(self, text):
+        return [StubToken(match.group(), i)
+                for i, match in enumerate(TOKEN.finditer(text))]
+
+    def pipe(self, texts, as_tuples=False, batch_size=None, n_process=1):
+        for item in texts:
+            if as_tuples:
+                text, context = item
+                yield self(text), context
+            else:
+                yield self(item)
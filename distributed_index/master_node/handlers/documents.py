@@ -0,0 +1,111 @@
+import json
+import time
+from itertools import chain
+
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.decorators import consumes
+from supercell.mediatypes import Return, Error
+
+from distributed_index.master_node.models import DocumentsRequest, \
+    DocumentsResponse
+from distributed_index.master_node.pipeline import IndexPipelineMixin
+
+
+@consumes('application/json', model=DocumentsRequest)
+@provides('application/json', default=True)
+class DocumentsHandler(IndexPipelineMixin, RequestHandler):
+    """
+    Handler for /api/documents
+
+    Adds, replaces and deletes documents of the index on the slave nodes
+    without indexing the corpus again. The new documents are indexed like a
+    small corpus of their own and every node adds the words it owns to its
+    shard as a new segment.
+    """
+
+    @async
+    def post(self, model=None):
+        # Updates wait for running jobs, which replace the shards of the
+        # nodes (and would drop the update), and vice versa.
+        with (yield self.environment.job_lock.acquire()):
+            http_client = self.environment.http_client
+            nodes = self.environment.cluster['nodes']
+
+            if not nodes:
+                raise Error(500, additional={
+                    "message": "Documents must be indexed first."
+                })
+
+            t0 = time.time()
+            documents = [doc.serialize() for doc in model.documents]
+
+            # New versions of indexed documents replace the old ones.
+            deleted = set(model.delete) | \
+                {int(doc['id']) for doc in documents}
+
+            #
+            # STEP 1:
+            # Index the new documents. Every node gets a batch, even an
+            # empty one, so that no node merges the documents of an earlier
+            # job again.
+            #
+            requests = [
+                self.index_request(node, documents[i::len(nodes)], nodes)
+                for i, node in enumerate(nodes)
+            ]
+
+            responses_raw = yield [
+                http_client.fetch(request) for request in requests
+            ]
+
+            if not all([response.code == 200 for response in responses_raw]):
+                raise Error(500, additional={
+                    "message": "Slave node could not create index."
+                })
+
+            responses = [json.loads(response.body)
+                         for response in responses_raw]
+            field_lengths = self.collect_field_lengths(responses)
+
+            #
+            # STEP 2:
+            # Let the owners of the words add them to their shards. The
+            # partitioning of the words stays the same as long as the nodes do.
+            #
+            words = set(chain(*[response['words'] for response in responses]))
+
+            responses_raw = yield [
+                http_client.fetch(request)
+                for request in self.merge_requests(
+                    nodes, words, return_index=False, append=True,
+                    delete=deleted)
+            ]
+
+            if not all([response.code == 200 for response in responses_raw]):
+                raise Error(500, additional={
+                    "message": "Error merging indices."
+                })
+
+            # Update the statistics for ranking
+            cluster_field_lengths = self.environment.cluster['field_lengths']
+            for lengths in cluster_field_lengths.values():
+                lengths.delete(list(deleted))
+
+            for field, lengths in field_lengths.items():
+                if field in cluster_field_lengths:
+                    cluster_field_lengths[field].update(lengths)
+                else:
+                    cluster_field_lengths[field] = lengths
+
+            self.save_cluster()
+
+            response = DocumentsResponse({
+                "success": True,
+                "indexed": len(documents),
+                "deleted": len(model.delete),
+                "overall": time.time() - t0
+            })
+            response.validate()
+            raise Return(response)
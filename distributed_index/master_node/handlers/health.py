@@ -1,5 +1,3 @@
-import json
-
 from supercell.api import RequestHandler
 from supercell.api import async
 from supercell.api import provides
@@ -14,20 +12,29 @@ class HealthHandler(RequestHandler):
 
     @async
     def get(self):
-        http_client = self.environment.http_client
-
-        # Call all nodes and collect their health status.
-        nodes = []
-        for node_info in self.environment.nodes:
-            result = yield http_client.fetch(
-                f"http://{self.config.address}:{node_info['port']}/api/health"
+        monitor = self.environment.monitor
+
+        # Report the health of the nodes as seen by the last heartbeats.
+        nodes = [
+            dict(
+                monitor.stats.get(node['name'], {}),
+                health="green" if monitor.is_alive(node) else "red",
+                node_name=node['name']
             )
+            for node in monitor.nodes
+        ]
 
-            nodes.append(json.loads(result.body))
+        alive = len(monitor.live_nodes())
+        if alive == len(nodes):
+            health = "green"
+        elif alive:
+            health = "yellow"
+        else:
+            health = "red"
 
         model = HealthResponse(
             {
-                "health": "green",
+                "health": health,
                 "node_name": "master_node",
                 "slave_nodes": nodes
             }
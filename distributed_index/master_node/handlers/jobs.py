@@ -0,0 +1,119 @@
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.decorators import consumes
+from supercell.mediatypes import Return, Error
+from tornado.ioloop import IOLoop
+
+from distributed_index.master_node.jobs import IndexJob, add_job
+from distributed_index.master_node.models import IndexRequest, \
+    JobIndexResponse, JobResponse
+from distributed_index.shared.inverted_index import InvertedIndex
+
+# Number of words per page of the index of a job
+PAGE_SIZE = 1000
+
+
+def job_response(job):
+    response = JobResponse({
+        "job": job.id,
+        "status": job.status,
+        "progress": {
+            "documents": job.number_of_documents,
+            "documents_indexed": job.documents_indexed,
+            "partitions": job.partitions,
+            "partitions_merged": job.partitions_merged,
+            "bytes_shuffled": job.bytes_shuffled
+        },
+        "error": job.error,
+        "stats": job.stats
+    })
+    response.validate()
+    return response
+
+
+@consumes('application/json', model=IndexRequest)
+@provides('application/json', default=True)
+class JobsHandler(RequestHandler):
+    """
+    Handler for /api/jobs
+
+    Queues an indexing job and returns its id right away. The job runs in
+    the background after the jobs that were queued before.
+    """
+
+    @async
+    def post(self, model=None):
+        job = IndexJob(
+            self.config,
+            self.environment,
+            [doc.serialize() for doc in model.documents],
+            model.return_index
+        )
+        add_job(self.environment.jobs, job)
+        IOLoop.current().spawn_callback(job.run)
+
+        raise Return(job_response(job))
+
+
+@provides('application/json', default=True)
+class JobHandler(RequestHandler):
+    """
+    Handler for /api/jobs/<job>
+
+    Returns the status and the progress of a job.
+    """
+
+    @async
+    def get(self, job_id):
+        job = self.environment.jobs.get(job_id)
+        if job is None:
+            raise Error(404, additional={"message": "Unknown job."})
+
+        raise Return(job_response(job))
+
+
+@provides('application/json', default=True)
+class JobIndexHandler(RequestHandler):
+    """
+    Handler for /api/jobs/<job>/index
+
+    Returns the index that a job created page by page. Pass `?offset=` to
+    get the words from this position on (in alphabetical order) and
+    `?size=` to set the number of words per page.
+    """
+
+    @async
+    def get(self, job_id):
+        job = self.environment.jobs.get(job_id)
+        if job is None:
+            raise Error(404, additional={"message": "Unknown job."})
+
+        if job.status != 'done':
+            raise Error(409, additional={"message": "Job is not done."})
+
+        if not job.return_index:
+            raise Error(404, additional={
+                "message": "Job did not keep the index."
+            })
+
+        try:
+            offset = int(self.get_argument('offset', 0))
+            size = int(self.get_argument('size', PAGE_SIZE))
+        except ValueError:
+            raise Error(400, additional={
+                "message": "Offset and size must be integers."
+            })
+
+        if offset < 0 or size < 0:
+            raise Error(400, additional={
+                "message": "Offset and size must not be negative."
+            })
+
+        response = JobIndexResponse({
+            "total": job.number_of_words(),
+            "offset": offset,
+            "index": InvertedIndex.serialize(job.page(offset, size))
+        })
+        response.validate()
+        raise Return(response)
@@ -0,0 +1,33 @@
+from supercell.api import RequestHandler
+from supercell.api import async
+
+from distributed_index.shared import metrics as metrics_
+from distributed_index.shared.metrics import record_process
+
+
+class MetricsHandler(RequestHandler):
+    """Handler for /api/metrics"""
+
+    @async
+    def get(self):
+        # The metrics are written as text for Prometheus instead of being
+        # returned as a model. The metrics of the slave nodes are served by
+        # the nodes themselves.
+        metrics = self.environment.metrics
+        record_process(metrics)
+
+        monitor = self.environment.monitor
+        alive = len(monitor.live_nodes())
+        nodes = metrics.gauge('slave_nodes', "Slave nodes by health.")
+        nodes.set(alive, health='green')
+        nodes.set(len(monitor.nodes) - alive, health='red')
+
+        jobs = metrics.gauge(
+            'jobs', "Indexing jobs that are not finished by status.")
+        for status in ('queued', 'indexing', 'merging', 'collecting'):
+            jobs.set(sum(job.status == status
+                         for job in self.environment.jobs.values()),
+                     status=status)
+
+        self.set_header('Content-Type', metrics_.CONTENT_TYPE)
+        self.write(metrics.render())
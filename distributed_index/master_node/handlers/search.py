@@ -0,0 +1,160 @@
+import json
+from collections import defaultdict
+
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.decorators import consumes
+from supercell.mediatypes import Return, Error
+from tornado.httpclient import HTTPRequest
+
+from distributed_index.master_node.models import SearchRequest, \
+    SearchResponse
+from distributed_index.shared import positions, wire
+from distributed_index.shared.postings import as_postings, difference, \
+    intersect, to_postings, union
+from distributed_index.shared.scoring import score, top_k
+
+
+@consumes('application/json', model=SearchRequest)
+@provides('application/json', default=True)
+class SearchHandler(RequestHandler):
+    """Handler for /api/search"""
+
+    @async
+    def post(self, model=None):
+        # Fetch the postings of the query terms from the nodes that own
+        # them and evaluate the boolean query on them.
+        http_client = self.environment.http_client
+        nodes = self.environment.cluster['nodes']
+        ring = self.environment.cluster['ring']
+
+        if not nodes:
+            raise Error(500, additional={
+                "message": "Documents must be indexed first."
+            })
+
+        if model.phrase and not self.config.positions:
+            raise Error(400, additional={
+                "message": "Phrase queries require an index with positions."
+            })
+
+        # Route each term to its owner, using the same partitioning as the
+        # merge step of the index pipeline.
+        terms_distributed = defaultdict(list)
+        for term in set(model.must + model.should + model.must_not +
+                        model.phrase):
+            terms_distributed[ring.partition(term)].append(term)
+
+        requests = [
+            HTTPRequest(
+                f"http://{self.config.address}:{nodes[partition]['port']}"
+                f"/api/postings",
+                method="POST",
+                body=json.dumps({"words": terms}),
+                headers={
+                    'content-type': 'application/json',
+                    'accept': wire.accept(self.config.wire_format)
+                }
+            ) for partition, terms in terms_distributed.items()
+        ]
+
+        responses_raw = yield [
+            http_client.fetch(request) for request in requests
+        ]
+
+        # Check that all requests were successful
+        if not all([response.code == 200 for response in responses_raw]):
+            raise Error(500, additional={
+                "message": "Error retrieving postings."
+            })
+
+        postings = {}
+        for response in responses_raw:
+            partial_index = wire.loads(response)
+            if model.analyzer not in partial_index.get(model.field, {}):
+                raise Error(400, additional={
+                    "message": "Unknown field or analyzer."
+                })
+
+            postings.update(partial_index[model.field][model.analyzer])
+
+        doc_ids = self.evaluate(model, postings, self.config.positions)
+        total = len(doc_ids)
+        end = model.offset + model.size
+
+        scores = None
+        if model.rank:
+            field_lengths = \
+                self.environment.cluster['field_lengths'].get(model.field)
+            if field_lengths is None:
+                raise Error(400, additional={
+                    "message": "Ranking requires an index in scoring mode."
+                })
+
+            # The field lengths and the postings of the owners are the
+            # global statistics, no index needs to be transferred.
+            doc_ids, scores = top_k(doc_ids, score(
+                doc_ids,
+                [self.doc_ids(postings[term])
+                 for term in set(model.must + model.should + model.phrase)
+                 if term in postings],
+                field_lengths
+            ), end)
+            scores = scores[model.offset:end].tolist()
+
+        response = SearchResponse({
+            "total": total,
+            "documents": doc_ids[model.offset:end].tolist(),
+            "scores": scores
+        })
+        response.validate()
+        raise Return(response)
+
+    def doc_ids(self, postings):
+        """
+        Doc ids of a postings list, once per occurrence of the term if the
+        index keeps them.
+        """
+        if self.config.positions:
+            return positions.doc_ids(postings)
+
+        return as_postings(postings)
+
+    @staticmethod
+    def evaluate(query, postings, positional=False):
+        """
+        Evaluate the boolean query on the postings of its terms. The phrase
+        counts as one more term that the documents must contain.
+        """
+        def get(term):
+            term_postings = postings.get(term, [])
+            if positional:
+                term_postings = positions.doc_ids(term_postings)
+
+            # Drop the duplicates of postings that keep term frequencies
+            return to_postings(term_postings)
+
+        must = [get(term) for term in query.must]
+        if query.phrase:
+            must.append(positions.match_phrase(
+                [postings.get(term, []) for term in query.phrase],
+                query.slop
+            ))
+
+        if must:
+            doc_ids = intersect(*must)
+            if query.should:
+                doc_ids = intersect(
+                    doc_ids, union(*[get(term) for term in query.should]))
+        elif query.should:
+            doc_ids = union(*[get(term) for term in query.should])
+        else:
+            # A query with only negated terms matches nothing.
+            doc_ids = as_postings([])
+
+        if query.must_not:
+            doc_ids = difference(
+                doc_ids, union(*[get(term) for term in query.must_not]))
+
+        return doc_ids
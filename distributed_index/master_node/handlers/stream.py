@@ -0,0 +1,192 @@
+import json
+import time
+from itertools import chain
+
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.mediatypes import Return, Error
+from tornado import gen
+from tornado.web import stream_request_body
+
+from distributed_index.master_node.models import IndexResponse
+from distributed_index.master_node.pipeline import Dispatcher, \
+    IndexPipelineMixin
+from distributed_index.shared import wire
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.models import Document
+
+# The corpus is never held in memory as a whole, so allow large uploads.
+MAX_BODY_SIZE = 100 * 1024 ** 3
+
+
+@stream_request_body
+@provides('application/json', default=True)
+class StreamIndexHandler(IndexPipelineMixin, RequestHandler):
+    """
+    Handler for /api/index/stream
+
+    Accepts the corpus as NDJSON (one document per line) and forwards the
+    documents in chunks to the slave nodes while the upload is still running.
+    Each chunk goes to the next idle node, which adds it to its index.
+    Pass `?return_index=false` to keep the index on the nodes only.
+    """
+
+    @gen.coroutine
+    def prepare(self):
+        # The body is parsed line by line in `data_received`, so there is
+        # no consumer for it.
+        self.request.connection.set_max_body_size(MAX_BODY_SIZE)
+
+        # The upload replaces the index of the cluster like a job, so it
+        # waits for the running jobs (and they for it). The body is only
+        # read once the lock is held.
+        self._locked = False
+        self._closed = False
+        yield self.environment.job_lock.acquire()
+        self._locked = True
+
+        # The client went away while the upload waited
+        if self._closed:
+            self._release()
+            return
+
+        self._t0 = time.time()
+        self._nodes = self.environment.monitor.live_nodes()
+        self._line_buffer = b''
+        self._line_number = 0
+        self._chunk = []
+        self._error = None
+        self._dispatcher = Dispatcher(self, self._nodes)
+
+    @gen.coroutine
+    def data_received(self, data):
+        if self._error:
+            return
+
+        lines = (self._line_buffer + data).split(b'\n')
+        self._line_buffer = lines.pop()
+
+        for line in lines:
+            self._add_line(line)
+
+            if len(self._chunk) >= self.config.stream_chunk_size:
+                # Reading the body pauses until a node is ready for the
+                # chunk.
+                yield self._send_chunk()
+
+    def _add_line(self, line):
+        self._line_number += 1
+        if self._error or not line.strip():
+            return
+
+        try:
+            document = Document(json.loads(line.decode('utf-8')))
+            document.validate()
+        except Exception as e:
+            self._error = f"Invalid document in line {self._line_number}: {e}"
+            return
+
+        self._chunk.append(document.serialize())
+
+    def _release(self):
+        if self._locked:
+            self._locked = False
+            self.environment.job_lock.release()
+
+    def on_finish(self):
+        self._release()
+
+    def on_connection_close(self):
+        super().on_connection_close()
+        self._closed = True
+        self._release()
+
+    def _send_chunk(self):
+        """
+        Send the current chunk to the next idle node.
+        """
+        chunk, self._chunk = self._chunk, []
+        return self._dispatcher.send(chunk)
+
+    @async
+    def post(self):
+        http_client = self.environment.http_client
+        nodes = self._nodes
+
+        if not nodes:
+            raise Error(500, additional={
+                "message": "No slave node is available."
+            })
+
+        if self._error is None:
+            self._add_line(self._line_buffer)
+
+        if self._error:
+            raise Error(400, additional={"message": self._error})
+
+        #
+        # STEP 1:
+        # Most documents were sent to the nodes while they were uploaded.
+        # Send the rest and reset the index of nodes that did not get any.
+        #
+        if self._chunk:
+            yield self._send_chunk()
+
+        responses_raw = yield self._dispatcher.finish()
+
+        # Check that all requests were successful
+        if not all([response.code == 200 for response in responses_raw]):
+            raise Error(500, additional={
+                "message": "Slave node could not create index."
+            })
+
+        responses = [json.loads(response.body) for response in responses_raw]
+        field_lengths = self.collect_field_lengths(responses)
+
+        #
+        # STEP 2:
+        # Split the tokens used in the whole corpus over all nodes.
+        #
+        t1 = time.time()
+        words = set(chain(*[response['words'] for response in responses]))
+        return_index = self.get_argument('return_index', 'true') != 'false'
+
+        responses_raw = yield [
+            http_client.fetch(request)
+            for request in self.merge_requests(nodes, words, return_index)
+        ]
+
+        if not all([response.code == 200 for response in responses_raw]):
+            raise Error(500, additional={"message": "Error merging indices."})
+
+        responses = [wire.loads(response) for response in responses_raw]
+        self.environment.cluster['nodes'] = nodes
+        self.environment.cluster['ring'] = self.ring(nodes)
+        self.environment.cluster['field_lengths'] = field_lengths
+        self.save_cluster()
+
+        #
+        # STEP 3:
+        # Merge the partial indices that were calculated by the nodes.
+        #
+        t2 = time.time()
+        index = None
+        if return_index:
+            index = InvertedIndex.serialize(
+                self.merge_final_indices(responses).inverted_index)
+
+        t3 = time.time()
+        response = IndexResponse({
+            "success": True,
+            "index": index,
+            "stats": {
+                # Includes the time to upload the corpus
+                "create_indices": t1 - self._t0,
+                "merge_word_indices": t2 - t1,
+                "merge_final_indices": t3 - t2,
+                "overall": t3 - self._t0
+            }
+        })
+        response.validate()
+        raise Return(response)
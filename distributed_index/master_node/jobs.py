@@ -0,0 +1,313 @@
+import json
+import time
+from copy import copy
+from itertools import chain
+from math import ceil
+from random import shuffle
+from uuid import uuid4
+
+from tornado import gen
+
+from distributed_index.master_node.pipeline import Dispatcher, \
+    IndexPipelineMixin, cost_batches, cost_chunks, document_cost
+from distributed_index.shared import tracing, wire
+from distributed_index.shared.metrics import record_stage
+
+# Number of chunks per node in the 'queue' batching mode. More chunks even
+# out the load better, but cost more requests.
+QUEUE_CHUNKS_PER_NODE = 8
+
+# Number of jobs to remember. The oldest finished jobs and their results are
+# dropped first.
+MAX_JOBS = 20
+
+
+class JobError(Exception):
+    pass
+
+
+class IndexJob(IndexPipelineMixin):
+    """
+    Indexes a corpus on the slave nodes. The job is run by /api/index right
+    away, or in the background by /api/jobs. Jobs run one after the other,
+    because each job replaces the index of the cluster.
+
+    The status goes from 'queued' over 'indexing', 'merging' and
+    'collecting' (the merged index from the nodes) to 'done' or 'failed'.
+    """
+
+    def __init__(self, config, environment, documents, return_index=True):
+        self.config = config
+        self.environment = environment
+        self.id = uuid4().hex
+
+        self.documents = documents
+        self.number_of_documents = len(documents)
+        self.return_index = return_index
+
+        self.status = 'queued'
+        self.error = None
+
+        # Progress of the current phase
+        self.dispatcher = None
+        self.partitions = 0
+        self.partitions_merged = 0
+        self.bytes_shuffled = 0
+
+        # The merged index (if it is returned) and the timings of the phases
+        self.index = None
+        self.stats = None
+
+        self._words = None
+
+    @property
+    def trace(self):
+        """
+        The requests of a job are traced by the id of the job.
+        """
+        return self.id
+
+    @property
+    def documents_indexed(self):
+        if self.status in ('merging', 'collecting', 'done'):
+            return self.number_of_documents
+        if self.dispatcher is None:
+            return 0
+
+        return self.dispatcher.documents_indexed
+
+    def page(self, offset, size):
+        """
+        Return a part of the merged index with `size` words, starting at the
+        word at `offset` in alphabetical order.
+        """
+        if self._words is None:
+            self._words = sorted(self.index.words())
+
+        return self.index.create_partial_index(
+            self._words[offset:offset + size])
+
+    def number_of_words(self):
+        if self._words is None:
+            self._words = sorted(self.index.words())
+
+        return len(self._words)
+
+    @gen.coroutine
+    def run(self):
+        """
+        Wait for the previous jobs and run this one. A failed job keeps the
+        reason in `error`.
+        """
+        with (yield self.environment.job_lock.acquire()):
+            try:
+                yield self._run()
+            except JobError as e:
+                self.status = 'failed'
+                self.error = str(e)
+            except Exception:
+                self.status = 'failed'
+                self.error = "Internal error."
+                raise
+            finally:
+                # The documents are not needed any more
+                self.documents = None
+
+                self.environment.metrics.counter(
+                    'jobs_total', "Indexing jobs by their final status."
+                ).inc(status=self.status)
+
+    def _on_merged(self, future):
+        response = future.result()
+        if response.code != 200:
+            return
+
+        self.partitions_merged += 1
+        self.bytes_shuffled += int(
+            response.headers.get(wire.SHUFFLED_BYTES_HEADER, 0))
+
+    @gen.coroutine
+    def _run(self):
+        # Main pipeline for the distributed indexing task.
+        http_client = self.environment.http_client
+        monitor = self.environment.monitor
+        documents = self.documents
+
+        #
+        # STEP 1:
+        # Split the documents into batches and send them to the slave nodes.
+        #
+        self.status = 'indexing'
+        t0 = time.time()
+
+        # Only use the nodes that answer the heartbeats
+        nodes = monitor.live_nodes()
+        if not nodes:
+            raise JobError("No slave node is available.")
+
+        # In case we have more nodes than documents, scale down the number
+        # of nodes to have one for each document
+        if len(documents) < len(nodes):
+            nodes = nodes[:len(documents)]
+
+        if self.config.batching == 'queue':
+            # Split the documents into small chunks of about the same cost,
+            # each node gets the next one as soon as it is idle.
+            max_cost = sum(map(document_cost, documents)) / \
+                (len(nodes) * QUEUE_CHUNKS_PER_NODE)
+            batches = cost_chunks(documents, max_cost)
+        elif self.config.batching == 'cost':
+            # Balance the estimated cost of the batches, because the length
+            # of the documents varies a lot.
+            batches = cost_batches(documents, len(nodes))
+        else:
+            batch_size = int(ceil(len(documents) / len(nodes)))
+            batches = [
+                documents[i * batch_size: (i + 1) * batch_size]
+                for i in range(0, len(nodes))
+            ]
+
+        # Shuffle the nodes to better distribute the load over them,
+        # because the last batch might be smaller than 'batch_size'.
+        nodes = copy(nodes)
+        shuffle(nodes)
+
+        # A node that fails is not used any more and the other nodes index
+        # its batches again. With the push shuffle, the failed node might
+        # already have received words from the others, so the job starts
+        # over without it instead.
+        dispatcher = None
+        merged = False
+        for _ in range(self.config.retries + 1):
+            if dispatcher is None:
+                job_nodes = nodes
+                dispatcher = Dispatcher(
+                    self, job_nodes, keep_chunks=True,
+                    speculative=self.config.speculation and
+                    self.config.shuffle == 'pull',
+                    speculation_factor=self.config.speculation_factor
+                )
+                self.dispatcher = dispatcher
+                for batch in batches:
+                    yield dispatcher.send(batch)
+
+            self.status = 'indexing'
+            responses_raw = yield dispatcher.finish()
+            nodes = dispatcher.nodes
+
+            if dispatcher.pending:
+                # All nodes failed
+                break
+
+            if dispatcher.failed and self.config.shuffle == 'push':
+                failed = yield monitor.check(job_nodes)
+                nodes = [node for node in job_nodes
+                         if node['name'] not in failed]
+                self.new_job()
+                dispatcher = None
+                continue
+
+            responses = [json.loads(response.body)
+                         for response in responses_raw]
+            field_lengths = self.collect_field_lengths(responses)
+
+            #
+            # STEP 2:
+            # Now that we crated a partial index for each batch, we need to
+            # split the tokens used in the whole corpus over all nodes.
+            #
+            self.status = 'merging'
+            self.partitions = len(nodes)
+            self.partitions_merged = 0
+            self.bytes_shuffled = 0
+
+            t1 = time.time()
+            words = set(chain(*[response['words'] for response in responses]))
+
+            # Send the requests to merge the words to all nodes in parallel.
+            # The partitions the nodes created while indexing do not match
+            # the remaining nodes if a node failed.
+            futures = [
+                http_client.fetch(request, raise_error=False)
+                for request in self.merge_requests(
+                    nodes, words, self.return_index,
+                    partitioned=not dispatcher.failed)
+            ]
+            for future in futures:
+                future.add_done_callback(self._on_merged)
+
+            responses_raw = yield futures
+
+            if all([response.code == 200 for response in responses_raw]):
+                merged = True
+                break
+
+            # Only the nodes that do not answer any more are replaced, a
+            # merge can also fail because a peer failed.
+            failed = yield monitor.check(nodes)
+            if self.config.shuffle == 'push':
+                nodes = [node for node in nodes if node['name'] not in failed]
+                self.new_job()
+                dispatcher = None
+            else:
+                for name in failed:
+                    dispatcher.fail(name)
+
+        if not merged:
+            raise JobError("Indexing failed, not enough slave nodes left.")
+
+        responses = [wire.loads(response) for response in responses_raw]
+
+        # The nodes now own the words of their partition, remember them to
+        # route search requests, together with the statistics for ranking.
+        self.environment.cluster['nodes'] = nodes
+        self.environment.cluster['ring'] = self.ring(nodes)
+        self.environment.cluster['field_lengths'] = field_lengths
+        self.save_cluster()
+
+        #
+        # STEP 3:
+        # Merge the partial indices that were calculated by the nodes.
+        #
+        self.status = 'collecting'
+
+        t2 = time.time()
+        if self.return_index:
+            self.index = self.merge_final_indices(responses)
+
+        t3 = time.time()
+        self.stats = {
+            "create_indices": t1 - t0,
+            "merge_word_indices": t2 - t1,
+            "merge_final_indices": t3 - t2,
+            "overall": t3 - t0
+        }
+        self.status = 'done'
+
+        metrics = self.environment.metrics
+        metrics.counter(
+            'job_documents_total', "Documents of the finished jobs."
+        ).inc(self.number_of_documents)
+        metrics.counter(
+            'shuffled_bytes_total',
+            "Bytes of partial indices the slave nodes exchanged."
+        ).inc(self.bytes_shuffled)
+
+        for phase, start, end in (('create_indices', t0, t1),
+                                  ('merge_word_indices', t1, t2),
+                                  ('merge_final_indices', t2, t3)):
+            record_stage(metrics, phase, end - start)
+            tracing.log_phase(self.trace, 'master_node', phase, start, end)
+
+
+def add_job(jobs, job):
+    """
+    Remember a job by its id and forget the oldest finished jobs if there
+    are too many.
+    """
+    jobs[job.id] = job
+
+    finished = [job_id for job_id, job_ in jobs.items()
+                if job_.status in ('done', 'failed')]
+    for job_id in finished[:max(0, len(jobs) - MAX_JOBS)]:
+        del jobs[job_id]
@@ -1,5 +1,5 @@
 from schematics.models import Model
-from schematics.types import BooleanType, FloatType
+from schematics.types import BooleanType, FloatType, IntType, StringType
 from schematics.types.compound import ModelType, ListType
 
 from distributed_index.shared.models import Document, InvertedIndexModel
@@ -14,9 +14,79 @@ class StatisticsModel(Model):
 
 class IndexRequest(Model):
     documents = ListType(ModelType(Document), required=True)
+    # The index stays searchable on the slave nodes either way.
+    return_index = BooleanType(default=True)
 
 
 class IndexResponse(Model):
     success = BooleanType(required=True)
-    index = ModelType(InvertedIndexModel, required=True)
+    index = ModelType(InvertedIndexModel, serialize_when_none=False)
     stats = ModelType(StatisticsModel, required=True)
+
+
+class JobProgressModel(Model):
+    documents = IntType(required=True)
+    documents_indexed = IntType(required=True)
+    partitions = IntType(required=True)
+    partitions_merged = IntType(required=True)
+    bytes_shuffled = IntType(required=True)
+
+
+class JobResponse(Model):
+    job = StringType(required=True)
+    status = StringType(required=True, choices=[
+        'queued', 'indexing', 'merging', 'collecting', 'done', 'failed'])
+    progress = ModelType(JobProgressModel, required=True)
+    error = StringType(serialize_when_none=False)
+    stats = ModelType(StatisticsModel, serialize_when_none=False)
+
+
+class JobIndexResponse(Model):
+    # Number of words of the whole index, the page contains the words from
+    # `offset` on in alphabetical order.
+    total = IntType(required=True)
+    offset = IntType(required=True)
+    index = ModelType(InvertedIndexModel, required=True)
+
+
+class DocumentsRequest(Model):
+    # Documents to add. Documents with the id of an indexed document replace
+    # it.
+    documents = ListType(ModelType(Document), default=[])
+    # Ids of the documents to delete.
+    delete = ListType(IntType(), default=[])
+
+
+class DocumentsResponse(Model):
+    success = BooleanType(required=True)
+    indexed = IntType(required=True)
+    deleted = IntType(required=True)
+    overall = FloatType(required=True)
+
+
+class SearchRequest(Model):
+    # The terms must already be analyzed like the given analyzer does it,
+    # e.g. lowercased for 'token_lowercase'.
+    field = StringType(default='text')
+    analyzer = StringType(default='token_lowercase')
+    # Documents must contain all of these terms (AND) ...
+    must = ListType(StringType(), default=[])
+    # ... and at least one of these terms (OR) ...
+    should = ListType(StringType(), default=[])
+    # ... but none of these terms (NOT).
+    must_not = ListType(StringType(), default=[])
+    # ... and these terms in this order, each at most `slop` + 1 positions
+    # after the previous one. Requires an index created with positions.
+    phrase = ListType(StringType(), default=[])
+    slop = IntType(default=0, min_value=0)
+    offset = IntType(default=0, min_value=0)
+    size = IntType(default=10, min_value=0)
+    # Order the documents by their BM25 score for the must and should terms.
+    # Requires an index created in scoring mode.
+    rank = BooleanType(default=False)
+
+
+class SearchResponse(Model):
+    total = IntType(required=True)
+    documents = ListType(IntType(), required=True)
+    scores = ListType(FloatType(), serialize_when_none=False)
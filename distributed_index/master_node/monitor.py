@@ -0,0 +1,203 @@
+import json
+import subprocess
+import time
+
+from tornado import gen
+from tornado.httpclient import HTTPRequest
+
+# Seconds to wait before a process that exited is started again. The delay
+# doubles with every further crash of the process, up to MAX_RESTART_DELAY,
+# and a process that crashed MAX_RESTARTS times in a row is not restarted.
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 300
+MAX_RESTARTS = 10
+
+# Seconds a process must run before its exit does not count as a crash
+STABLE_SECONDS = 300
+
+
+class SlaveMonitor:
+    """
+    Keeps track of the slave node processes. A heartbeat checks the health
+    of every node regularly and restarts the nodes whose process exited.
+    A restarted node has lost the index it was building (its shard is
+    loaded from its snapshot, see `snapshots`) and is only used again for
+    jobs that start after it answered a heartbeat.
+
+    Nodes that keep crashing are restarted with a growing delay and given
+    up after MAX_RESTARTS crashes in a row. They stay red until the master
+    is restarted.
+    """
+
+    def __init__(self, http_client, address, interval, timeout, logger):
+        self.http_client = http_client
+        self.address = address
+        self.logger = logger
+
+        # Seconds between heartbeats and after the last successful one that
+        # a node is considered to be dead.
+        self.interval = interval
+        self.timeout = timeout
+
+        self.nodes = []
+
+        # Process, command and time of the last successful heartbeat of
+        # each node by name. The node dicts themselves are sent to other
+        # nodes, so they only contain the name and port.
+        self.processes = {}
+        self.commands = {}
+        self.last_seen = {}
+
+        # When the process of each node was started, the number of crashes
+        # in a row, when a crashed process may be started again and the
+        # nodes that are not restarted any more.
+        self.process_started = {}
+        self.crashes = {}
+        self.restart_at = {}
+        self.given_up = set()
+
+        # Startup time and memory each node reported in its last heartbeat,
+        # and when the first node was started until all nodes were up.
+        self.stats = {}
+        self.started = None
+        self.startup_time = None
+
+    def start(self, node, command):
+        """
+        Start the process of a slave node.
+        """
+        self.start_group([node], command)
+
+    def start_group(self, nodes, command):
+        """
+        Start one process that runs all of the given slave nodes.
+        """
+        if self.started is None:
+            self.started = time.time()
+
+        process = subprocess.Popen(command)
+        for node in nodes:
+            self.nodes.append(node)
+            self.commands[node['name']] = command
+            self.last_seen[node['name']] = None
+            self.processes[node['name']] = process
+            self.process_started[node['name']] = time.time()
+
+    def restart(self, node):
+        """
+        Restart the process of a node that exited, together with all nodes
+        that ran in the same process, once its restart delay has passed.
+        """
+        name = node['name']
+        process = self.processes[name]
+        names = [node_['name'] for node_ in self.nodes
+                 if self.processes[node_['name']] is process]
+
+        if name not in self.restart_at:
+            crashes = self.crashes.get(name, 0)
+            if time.time() - self.process_started[name] >= STABLE_SECONDS:
+                crashes = 0
+            crashes += 1
+
+            for name_ in names:
+                self.last_seen[name_] = None
+                self.crashes[name_] = crashes
+
+            if crashes > MAX_RESTARTS:
+                self.given_up.update(names)
+                self.logger.error(
+                    f"Node {name} exited with code {process.returncode} "
+                    f"after {MAX_RESTARTS} restarts, giving up.")
+                return
+
+            delay = min(RESTART_DELAY * 2 ** (crashes - 1),
+                        MAX_RESTART_DELAY)
+            for name_ in names:
+                self.restart_at[name_] = time.time() + delay
+
+            self.logger.warning(
+                f"Node {name} exited with code "
+                f"{process.returncode}, restarting it in {delay}s.")
+
+        if time.time() < self.restart_at[name]:
+            return
+
+        # Restart all nodes that ran in the same process
+        new_process = subprocess.Popen(self.commands[name])
+        for name_ in names:
+            self.processes[name_] = new_process
+            self.process_started[name_] = time.time()
+            del self.restart_at[name_]
+
+    def is_alive(self, node):
+        last_seen = self.last_seen[node['name']]
+        return last_seen is not None and \
+            time.time() - last_seen <= self.timeout
+
+    def live_nodes(self):
+        """
+        The nodes that answered the recent heartbeats, in their original
+        order.
+        """
+        return [node for node in self.nodes if self.is_alive(node)]
+
+    @gen.coroutine
+    def check(self, nodes):
+        """
+        Check the health of the given nodes right away. Returns the names of
+        the nodes that did not answer.
+        """
+        responses = yield [
+            self.http_client.fetch(
+                HTTPRequest(
+                    f"http://{self.address}:{node['port']}/api/health",
+                    request_timeout=self.interval
+                ),
+                raise_error=False
+            ) for node in nodes
+        ]
+
+        failed = []
+        for node, response in zip(nodes, responses):
+            if response.code == 200:
+                self.last_seen[node['name']] = time.time()
+                self.stats[node['name']] = json.loads(response.body)
+            else:
+                failed.append(node['name'])
+
+        if self.startup_time is None and \
+                len(self.live_nodes()) == len(self.nodes):
+            self.startup_time = time.time() - self.started
+            self.log_startup()
+
+        raise gen.Return(failed)
+
+    def log_startup(self):
+        memory = [
+            sum(self.stats[node['name']].get(key) or 0 for node in self.nodes)
+            for key in ('resident_memory', 'proportional_memory')
+        ]
+        self.logger.info(
+            f"All {len(self.nodes)} slave nodes are up after "
+            f"{self.startup_time:.1f}s, resident memory "
+            f"{memory[0] / 1024 ** 2:.0f} MB, proportional memory "
+            f"{memory[1] / 1024 ** 2:.0f} MB."
+        )
+
+    @gen.coroutine
+    def heartbeat(self):
+        """
+        Restart the nodes whose process exited and check the health of the
+        others.
+        """
+        running = []
+        for node in self.nodes:
+            if node['name'] in self.given_up:
+                continue
+
+            if self.processes[node['name']].poll() is not None:
+                self.restart(node)
+            else:
+                running.append(node)
+
+        yield self.check(running)
@@ -0,0 +1,525 @@
+import heapq
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+from statistics import median
+from uuid import uuid4
+
+from tornado import gen
+from tornado.httpclient import HTTPRequest
+
+from distributed_index.shared import tracing, wire
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.partitioning import HashRing
+from distributed_index.shared.positions import strip_positions
+from distributed_index.shared.scoring import FieldLengths, \
+    strip_frequencies
+
+# Estimated cost of a document besides the length of its text, e.g. for the
+# request and setting up the analysis.
+DOCUMENT_COST = 200
+
+# Seconds between the checks for chunks that take too long, see `Dispatcher`.
+SPECULATION_INTERVAL = 1
+
+
+def document_cost(document):
+    """
+    Estimated cost to index a (serialized) document.
+    """
+    return DOCUMENT_COST + len(document.get('text') or '')
+
+
+def cost_batches(documents, number_of_batches):
+    """
+    Split the documents into batches of about the same cost. The most
+    expensive documents are assigned first, each to the cheapest batch so
+    far (longest processing time first).
+    """
+    batches = [[] for _ in range(number_of_batches)]
+    costs = [(0, i) for i in range(number_of_batches)]
+
+    for document in sorted(documents, key=document_cost, reverse=True):
+        cost, i = heapq.heappop(costs)
+        batches[i].append(document)
+        heapq.heappush(costs, (cost + document_cost(document), i))
+
+    return batches
+
+
+def cost_chunks(documents, max_cost):
+    """
+    Split the documents into consecutive chunks that cost at most `max_cost`
+    (or contain a single document).
+    """
+    chunks = []
+    chunk, chunk_cost = [], 0
+
+    for document in documents:
+        cost = document_cost(document)
+        if chunk and chunk_cost + cost > max_cost:
+            chunks.append(chunk)
+            chunk, chunk_cost = [], 0
+
+        chunk.append(document)
+        chunk_cost += cost
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+class Dispatcher:
+    """
+    Sends chunks of documents to the slave nodes as they become idle, so
+    that nodes that finish early get more work. Each node indexes at most
+    one chunk at a time and adds its chunks to its index in order.
+
+    A node that fails a request is not used any more. With `keep_chunks`,
+    the chunks it indexed are sent to the other nodes again (by `finish`),
+    otherwise the failed response is returned like the others.
+
+    With `keep_chunks` and `speculative`, a chunk that takes much longer
+    than expected from the chunks that are done (a straggler) is sent to an
+    idle node as well once all chunks were sent. The first copy that
+    finishes wins, the other one is cancelled, so that its node removes the
+    documents again. A node whose first chunk was cancelled keeps the index
+    it had, so its next chunk replaces that index instead of adding to it.
+    """
+
+    def __init__(self, handler, nodes, keep_chunks=False, speculative=False,
+                 speculation_factor=2.0):
+        self.handler = handler
+        self.keep_chunks = keep_chunks
+        self.speculative = speculative and keep_chunks
+        self.speculation_factor = speculation_factor
+
+        # The nodes that did not fail and the names of the ones that did
+        self.nodes = list(nodes)
+        self.failed = set()
+        self.nodes_by_name = {node['name']: node for node in nodes}
+
+        # Names of the nodes that received a chunk, the requests that are
+        # currently running and the responses of the finished requests.
+        self.started_nodes = set()
+        self.running = {}
+        self.responses = []
+
+        # The chunks and their number of documents by task id, the tasks
+        # each node indexed and the chunks to send again.
+        self.tasks = {}
+        self.sizes = {}
+        self.chunks = defaultdict(list)
+        self.pending = []
+
+        # The task each node is running and when it was sent, the first task
+        # of each node, the node that finished each task first, the seconds
+        # per unit of cost of the finished tasks and the requests that
+        # cancel the other copies (and the copies themselves).
+        self.running_tasks = {}
+        self.first_tasks = {}
+        self.finished = {}
+        self.rates = []
+        self.cancels = []
+
+    @property
+    def documents_indexed(self):
+        """
+        Number of documents in the chunks that were indexed so far.
+        """
+        return sum(self.sizes[task] for task in self.finished)
+
+    def fail(self, name):
+        """
+        Stop using a node and send its chunks to the other nodes again.
+        """
+        if name in self.failed:
+            return
+
+        self.failed.add(name)
+        self.nodes = [node for node in self.nodes if node['name'] != name]
+
+        running = {task for node, (task, _) in self.running_tasks.items()
+                   if node != name}
+        for task in self.chunks.pop(name, []):
+            self.finished.pop(task, None)
+
+            # A copy of the chunk that still runs on another node replaces
+            # the one of this node.
+            if task not in running:
+                self.pending.append(self.tasks[task])
+
+    def _cancel(self, name, task):
+        """
+        Let a node remove the chunk of a task that another node finished
+        first.
+        """
+        self.chunks[name].remove(task)
+
+        # The node did not replace its index with the one of the chunk
+        if self.first_tasks.get(name) == task:
+            self.started_nodes.discard(name)
+
+        self.cancels.append(
+            self.handler.environment.http_client.fetch(
+                self.handler.cancel_request(self.nodes_by_name[name], task),
+                raise_error=False
+            )
+        )
+
+    @gen.coroutine
+    def _wait_for_node(self, timeout=None):
+        """
+        Wait until one of the running requests is finished and return the
+        name of the node that is idle again, or None if no request finished
+        within `timeout` seconds.
+        """
+        wait_iterator = gen.WaitIterator(**self.running)
+        next_response = wait_iterator.next()
+
+        if timeout is not None:
+            try:
+                yield gen.with_timeout(
+                    timedelta(seconds=timeout), next_response)
+            except gen.TimeoutError:
+                raise gen.Return(None)
+
+        response = yield next_response
+
+        name = wait_iterator.current_index
+        del self.running[name]
+        task, started = self.running_tasks.pop(name)
+
+        if response.code != 200:
+            self.fail(name)
+            if not self.keep_chunks:
+                self.responses.append(response)
+        elif task not in self.finished:
+            self.finished[task] = name
+            self.responses.append(response)
+
+            cost = sum(map(document_cost, self.tasks.get(task, [])))
+            if cost:
+                self.rates.append((time.time() - started) / cost)
+
+            # Cancel the copies of the chunk on the other nodes. Their
+            # responses do not matter any more, so the nodes count as idle.
+            losers = [other for other, (other_task, _)
+                      in self.running_tasks.items() if other_task == task]
+            for other in losers:
+                self.cancels.append(self.running.pop(other))
+                del self.running_tasks[other]
+                self._cancel(other, task)
+
+        raise gen.Return(name)
+
+    def _send(self, node, chunk, task=None):
+        if task is None:
+            task = uuid4().hex
+
+        append = node['name'] in self.started_nodes
+        request = self.handler.index_request(
+            node, chunk, self.nodes, append=append,
+            task=task if self.speculative else None
+        )
+        if not append:
+            self.first_tasks[node['name']] = task
+        self.started_nodes.add(node['name'])
+        self.running[node['name']] = \
+            self.handler.environment.http_client.fetch(
+                request, raise_error=False)
+        self.running_tasks[node['name']] = (task, time.time())
+        self.sizes[task] = len(chunk)
+
+        if self.keep_chunks:
+            self.tasks[task] = chunk
+            self.chunks[node['name']].append(task)
+
+    def _speculate(self):
+        """
+        Send the chunks that take much longer than expected to the idle
+        nodes as well, the slowest ones first. The expected duration of a
+        chunk follows from its cost and the median time per unit of cost of
+        the chunks that are done.
+        """
+        if not self.rates:
+            return
+
+        rate = median(self.rates)
+        now = time.time()
+
+        # Each chunk runs on two nodes at most
+        tasks = [task for task, _ in self.running_tasks.values()]
+        stragglers = []
+        for task, started in self.running_tasks.values():
+            if task in self.finished or tasks.count(task) > 1:
+                continue
+
+            expected = rate * sum(map(document_cost, self.tasks[task]))
+            if expected and \
+                    now - started > self.speculation_factor * expected:
+                stragglers.append(((now - started) / expected, task))
+
+        idle = [node for node in self.nodes
+                if node['name'] not in self.running]
+        for node, (_, task) in zip(idle, sorted(stragglers, reverse=True)):
+            self._send(node, self.tasks[task], task)
+
+    @gen.coroutine
+    def send(self, chunk):
+        """
+        Send a chunk to the next idle node, waiting for one if necessary.
+        """
+        while True:
+            idle = [node for node in self.nodes
+                    if node['name'] not in self.running]
+            if idle:
+                self._send(idle[0], chunk)
+                return
+
+            if not self.running:
+                # All nodes failed
+                self.pending.append(chunk)
+                return
+
+            yield self._wait_for_node()
+
+    @gen.coroutine
+    def finish(self):
+        """
+        Send the chunks of failed nodes again, reset the index of the nodes
+        that did not get any chunk and wait for all requests. Returns the
+        responses of all requests. If all nodes failed, `pending` holds the
+        chunks that were not indexed.
+        """
+        timeout = SPECULATION_INTERVAL if self.speculative else None
+
+        while True:
+            while self.pending and self.nodes:
+                yield self.send(self.pending.pop(0))
+
+            for node in self.nodes:
+                if node['name'] not in self.started_nodes:
+                    self._send(node, [])
+
+            if not self.running:
+                break
+
+            while self.running:
+                yield self._wait_for_node(timeout)
+                if self.speculative and not self.pending:
+                    self._speculate()
+
+        # The nodes must have removed (or skipped) the chunks of the copies
+        # that lost before their index is merged. The copies may still be
+        # indexing, so they are awaited as well.
+        yield self.cancels
+        self.cancels = []
+
+        raise gen.Return(self.responses)
+
+
+class IndexPipelineMixin:
+    """
+    Steps of the distributed indexing pipeline that are shared by the index
+    handlers of the master node.
+    """
+
+    @property
+    def job(self):
+        """
+        Id of the indexing job of this request, which the nodes use to tell
+        apart the partial indices that are pushed to them.
+        """
+        if not hasattr(self, '_job'):
+            self.new_job()
+
+        return self._job
+
+    def new_job(self):
+        """
+        Start over with a new job id, e.g. to ignore what the nodes pushed
+        to each other in a failed attempt.
+        """
+        self._job = uuid4().hex
+
+    @property
+    def trace(self):
+        """
+        Id of the trace the requests to the slave nodes belong to, see
+        `tracing`. It stays the same when the job starts over.
+        """
+        if not hasattr(self, '_trace'):
+            self._trace = uuid4().hex
+
+        return self._trace
+
+    def save_cluster(self):
+        """
+        Take a snapshot of the state of the cluster (if snapshots are
+        enabled), after the nodes wrote the snapshots of their shards.
+        """
+        snapshot = self.environment.snapshot
+        if snapshot is not None:
+            snapshot.save(self.environment.cluster)
+
+    @staticmethod
+    def ring(nodes):
+        """
+        The ring that assigns the words to the given nodes.
+        """
+        return HashRing([node['name'] for node in nodes])
+
+    def index_request(self, node, documents, nodes, append=False,
+                      task=None):
+        """
+        Create a request that lets a slave node index the given (serialized)
+        documents, or add them to its index if `append` is set.
+        `nodes` are the nodes taking part in the job. A request with a `task`
+        id can be cancelled, see `cancel_request`.
+        """
+        url = f"http://{self.config.address}:{node['port']}/api/index"
+        payload = {
+            "documents": documents,
+            "append": append,
+            "scoring": self.config.scoring,
+            "positions": self.config.positions
+        }
+
+        if task:
+            payload["task"] = task
+
+        if self.config.shuffle == 'push':
+            # Let the node send the words to their owners right away. The
+            # merge step then only needs to tell the owners to merge them.
+            payload["push"] = nodes
+            payload["job"] = self.job
+        elif self.config.prepartition:
+            # Let the nodes split their index by the partition of the words
+            # right away, so that the merge step does not need to scan it.
+            payload["ring"] = [node_['name'] for node_ in nodes]
+
+        return HTTPRequest(
+            url,
+            method="POST",
+            body=json.dumps(payload),
+            headers={
+                'content-type': 'application/json',
+                tracing.TRACE_HEADER: self.trace
+            },
+            request_timeout=3600
+        )
+
+    def cancel_request(self, node, task):
+        """
+        Create a request that lets a slave node remove the documents of the
+        index request with the given task id from its index again.
+        """
+        url = f"http://{self.config.address}:{node['port']}/api/index/cancel"
+
+        return HTTPRequest(
+            url,
+            method="POST",
+            body=json.dumps({"task": task}),
+            headers={
+                'content-type': 'application/json',
+                tracing.TRACE_HEADER: self.trace
+            },
+            request_timeout=3600
+        )
+
+    def merge_requests(self, nodes, words, return_index=True, append=False,
+                       delete=(), partitioned=True):
+        """
+        Split the words over the nodes and create the requests that tell
+        each node what tokens it is responsible for. The nodes keep their
+        merged index and only return it if `return_index` is set.
+        With `append`, the nodes add the merged index to their shard instead
+        of replacing it, after deleting the documents in `delete`.
+        Unset `partitioned` if the nodes did not partition their index for
+        these nodes.
+        """
+        # Redistribute the tokens over the nodes by their partition, which
+        # is the position of the node that is responsible for them.
+        ring = self.ring(nodes)
+        words_distributed = [[] for _ in nodes]
+        for word in words:
+            words_distributed[ring.partition(word)].append(word)
+
+        requests = []
+        for partition, (node, words_for_node) in enumerate(
+                zip(nodes, words_distributed)):
+            url = f"http://{self.config.address}:{node['port']}/api/merge"
+            payload = {
+                "words": words_for_node,
+                "nodes": [node_ for node_ in nodes if node_ != node],
+                "return_index": return_index,
+                "append": append,
+                "delete": list(delete),
+                "scoring": self.config.scoring,
+                "positions": self.config.positions
+            }
+            if self.config.shuffle == 'push':
+                # The words were already pushed to their owners
+                payload["words"] = []
+                payload["nodes"] = []
+                payload["job"] = self.job
+            elif self.config.prepartition and partitioned:
+                payload["partition"] = partition
+
+            request = HTTPRequest(
+                url,
+                method="POST",
+                body=json.dumps(payload),
+                headers={
+                    'content-type': 'application/json',
+                    'accept': wire.accept(self.config.wire_format),
+                    tracing.TRACE_HEADER: self.trace
+                },
+                request_timeout=3600
+            )
+            requests.append(request)
+
+        return requests
+
+    @staticmethod
+    def collect_field_lengths(responses):
+        """
+        Collect the field lengths of all documents from the responses of the
+        slave nodes to the index requests (only sent in scoring mode).
+        """
+        lengths = defaultdict(dict)
+        for response in responses:
+            for field, doc_lengths in \
+                    (response.get('field_lengths') or {}).items():
+                lengths[field].update(doc_lengths)
+
+        return {
+            field: FieldLengths(doc_lengths)
+            for field, doc_lengths in lengths.items()
+        }
+
+    def merge_final_indices(self, responses):
+        """
+        Merge the partial indices that were calculated by the nodes. The
+        result is equal to an index that would have been created by a single
+        node. Positions and term frequencies are only used for searching on
+        the nodes, so the postings of a positional or scoring index are
+        turned into plain lists of distinct doc ids, whatever the settings.
+        """
+        if self.config.positions:
+            responses = [strip_positions(response) for response in responses]
+        elif self.config.scoring:
+            responses = [strip_frequencies(response)
+                         for response in responses]
+
+        # Support the case of an empty response. This can happen with small
+        # corpora that only contain stop words.
+        # Each word was merged by exactly one node, so the partial indices
+        # are disjoint.
+        if responses:
+            return InvertedIndex.merge(None, *responses, disjoint=True)
+
+        return InvertedIndex(None)
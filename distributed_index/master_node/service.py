@@ -1,15 +1,61 @@
-import subprocess
+import os
+import shlex
+from collections import OrderedDict
 
 from supercell.service import Service
 from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import PeriodicCallback
+from tornado.locks import Lock
 from tornado.options import define
 
 from distributed_index import configuration
+from distributed_index.master_node.handlers.documents import \
+    DocumentsHandler
 from distributed_index.master_node.handlers.health import HealthHandler
 from distributed_index.master_node.handlers.index import IndexHandler
+from distributed_index.master_node.handlers.jobs import JobHandler, \
+    JobIndexHandler, JobsHandler
+from distributed_index.master_node.handlers.metrics import MetricsHandler
+from distributed_index.master_node.handlers.search import SearchHandler
+from distributed_index.master_node.handlers.stream import StreamIndexHandler
+from distributed_index.master_node.monitor import SlaveMonitor
+from distributed_index.shared.metrics import ByteCounter, Metrics, \
+    request_logger
+from distributed_index.shared.snapshots import ClusterSnapshot
 
 define('slave_nodes_num', type=int, help="Number of slave nodes to spawn.")
 define('slave_nodes_port', type=int, help="The port of the first slave node.")
+define('prepartition', type=bool,
+       help="Partition the slave indices by word owner after indexing.")
+define('wire_format', type=str,
+       help="Format to request indices from slave nodes: binary or json.")
+define('stream_chunk_size', type=int,
+       help="Number of streamed documents to send to a slave node at once.")
+define('scoring', type=bool,
+       help="Keep term frequencies and field lengths for ranked search.")
+define('positions', type=bool,
+       help="Keep term positions for phrase and proximity search.")
+define('shuffle', type=str,
+       help="How the slave nodes exchange the words in the merge step: "
+            "pull or push.")
+define('retries', type=int,
+       help="Number of times an indexing job is retried after failures.")
+define('heartbeat_interval', type=int,
+       help="Seconds between health checks of the slave nodes.")
+define('heartbeat_timeout', type=int,
+       help="Seconds without a successful health check until a slave node "
+            "is considered to be dead.")
+define('speculation', type=bool,
+       help="Send batches of slow slave nodes to idle nodes as well.")
+define('speculation_factor', type=float,
+       help="How many times longer than expected a batch must take to be "
+            "sent to an idle node as well.")
+define('batching', type=str,
+       help="How to split documents over the slave nodes: "
+            "equal, cost or queue.")
+define('snapshots', type=str,
+       help="Directory of the snapshots of the cluster (empty to disable "
+            "them).")
 
 
 class MasterNodeService(Service):
@@ -33,35 +79,97 @@ class MasterNodeService(Service):
         if not self.config['slave_nodes_port']:
             self.config['slave_nodes_port'] = configuration['slave']['port']
 
-    def start_slave_nodes(self):
+        if self.config['prepartition'] is None:
+            self.config['prepartition'] = \
+                configuration['master']['prepartition']
+
+        if not self.config['wire_format']:
+            self.config['wire_format'] = configuration['master']['wire_format']
+
+        if not self.config['stream_chunk_size']:
+            self.config['stream_chunk_size'] = \
+                configuration['master']['stream_chunk_size']
+
+        if self.config['scoring'] is None:
+            self.config['scoring'] = configuration['master']['scoring']
+
+        if self.config['positions'] is None:
+            self.config['positions'] = configuration['master']['positions']
+
+        if not self.config['shuffle']:
+            self.config['shuffle'] = configuration['master']['shuffle']
+
+        if self.config['retries'] is None:
+            self.config['retries'] = configuration['master']['retries']
+
+        if not self.config['heartbeat_interval']:
+            self.config['heartbeat_interval'] = \
+                configuration['master']['heartbeat_interval']
+
+        if not self.config['heartbeat_timeout']:
+            self.config['heartbeat_timeout'] = \
+                configuration['master']['heartbeat_timeout']
+
+        if not self.config['batching']:
+            self.config['batching'] = configuration['master']['batching']
+
+        if self.config['speculation'] is None:
+            self.config['speculation'] = \
+                configuration['master']['speculation']
+
+        if not self.config['speculation_factor']:
+            self.config['speculation_factor'] = \
+                configuration['master']['speculation_factor']
+
+        if self.config['snapshots'] is None:
+            self.config['snapshots'] = configuration['master']['snapshots']
+
+    def start_slave_nodes(self, monitor):
         """
         Start the slave nodes as sub processes. This ensures that they will be
         terminated when the master process is stopped.
         :return: A list of name & port of each started slave node.
         """
         nodes = []
+        arguments = []
         for i in range(self.config.slave_nodes_num):
             name = configuration['slave']['name'].format(number=i)
             port = f"{self.config.slave_nodes_port + i}"
 
-            command = configuration['slave']['run_command'].split()
-            command += [f"--node_name={name}"]
-            command += [f"--port={port}"]
-            command += ["--max_grace_seconds=0"]
-            command += ["--logfile=" +
-                        configuration['slave']['logfile'].format(number=i)]
-
-            subprocess.Popen(command)
-
-            self.slog.info(f"Spawned node {i + 1}/"
-                           f"{self.config.slave_nodes_num} on port {port}.")
-
             nodes.append({
                 "name": name,
                 "port": port
             })
+            arguments.append([
+                f"--node_name={name}",
+                f"--port={port}",
+                "--max_grace_seconds=0",
+                "--logfile=" +
+                configuration['slave']['logfile'].format(number=i)
+            ])
+
+        if configuration['slave']['launch'] == 'prefork':
+            # One process loads the NLP models and forks the nodes, so that
+            # they share the memory of the models. The arguments of each node
+            # are quoted, the launcher splits them again.
+            command = configuration['slave']['prefork_command'].split()
+            command += [" ".join(map(shlex.quote, arguments_))
+                        for arguments_ in arguments]
+            monitor.start_group(nodes, command)
+
+            self.slog.info(f"Spawned {len(nodes)} nodes on ports "
+                           f"{nodes[0]['port']}-{nodes[-1]['port']}.")
+            return monitor.nodes
+
+        for i, (node, arguments_) in enumerate(zip(nodes, arguments)):
+            command = configuration['slave']['run_command'].split()
+            monitor.start(node, command + arguments_)
+
+            self.slog.info(f"Spawned node {i + 1}/"
+                           f"{self.config.slave_nodes_num} on port "
+                           f"{node['port']}.")
 
-        return nodes
+        return monitor.nodes
 
     def run(self):
         """
@@ -71,6 +179,13 @@ class MasterNodeService(Service):
         http_client = AsyncHTTPClient(max_clients=100)
         self.environment.add_managed_object("http_client", http_client)
 
+        # Counters and timings reported by /api/metrics
+        metrics = Metrics()
+        self.environment.add_managed_object("metrics", metrics)
+        self.environment.tornado_settings['log_function'] = \
+            request_logger(metrics, "master_node")
+        self.environment.tornado_settings['transforms'] = [ByteCounter]
+
         self.slog.info(
             f"Running Master Node on "
             f"'http://{self.config.address}:{self.config.port}'."
@@ -78,10 +193,75 @@ class MasterNodeService(Service):
 
         self.environment.add_handler(r"/api/health", HealthHandler, {})
         self.environment.add_handler(r"/api/index", IndexHandler, {})
+        self.environment.add_handler(r"/api/index/stream",
+                                     StreamIndexHandler, {})
+        self.environment.add_handler(r"/api/jobs", JobsHandler, {})
+        self.environment.add_handler(r"/api/jobs/([0-9a-f]+)", JobHandler, {})
+        self.environment.add_handler(r"/api/jobs/([0-9a-f]+)/index",
+                                     JobIndexHandler, {})
+        self.environment.add_handler(r"/api/documents", DocumentsHandler, {})
+        self.environment.add_handler(r"/api/metrics", MetricsHandler, {})
+        self.environment.add_handler(r"/api/search", SearchHandler, {})
 
-        # Start the slave nodes and remember their names & ports
-        nodes = self.start_slave_nodes()
+        # Start the slave nodes and remember their names & ports. The
+        # monitor restarts them if they exit and tracks which of them are
+        # alive.
+        monitor = SlaveMonitor(
+            http_client,
+            self.config.address,
+            self.config.heartbeat_interval,
+            self.config.heartbeat_timeout,
+            self.slog
+        )
+        nodes = self.start_slave_nodes(monitor)
         self.environment.add_managed_object("nodes", nodes)
+        self.environment.add_managed_object("monitor", monitor)
+
+        PeriodicCallback(
+            monitor.heartbeat, self.config.heartbeat_interval * 1000
+        ).start()
+
+        # State of the last indexing job: the nodes whose shards hold the
+        # words, in the order of their partitions, the ring that assigns the
+        # words to them and the field lengths of the documents (only in
+        # scoring mode).
+        cluster = {
+            "nodes": None,
+            "ring": None,
+            "field_lengths": {}
+        }
+
+        # Continue with the index of the last snapshot. The nodes load their
+        # shards themselves, so it is only used if the same nodes run again.
+        snapshot = None
+        if self.config.snapshots:
+            snapshot = ClusterSnapshot(
+                os.path.join(self.config.snapshots, "master_node"),
+                {
+                    "scoring": self.config.scoring,
+                    "positions": self.config.positions
+                }
+            )
+
+            restored = snapshot.load()
+            if restored and all(node in nodes for node in restored['nodes']):
+                cluster.update(restored)
+                self.slog.info(
+                    f"Restored the index of {len(restored['nodes'])} nodes "
+                    f"from '{snapshot.directory}'."
+                )
+            elif restored:
+                self.slog.warning(
+                    "Not restoring the index of the last snapshot, its "
+                    "slave nodes are not running any more."
+                )
+
+        self.environment.add_managed_object("cluster", cluster)
+        self.environment.add_managed_object("snapshot", snapshot)
+
+        # Indexing jobs by id, oldest first. They run one after the other.
+        self.environment.add_managed_object("jobs", OrderedDict())
+        self.environment.add_managed_object("job_lock", Lock())
 
 
 def start_api():
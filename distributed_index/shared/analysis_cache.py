@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Number of analyzed texts to keep by default
+MAX_ENTRIES = 1000000
+
+
+def model_version(nlp):
+    """
+    Language, name and version of the NLP model and the version of spaCy
+    (see `Language.meta`), so that texts are analyzed again once the model
+    changes. Engines without this information all share the same entries.
+    """
+    meta = getattr(nlp, 'meta', None) or {}
+    return [meta.get(field)
+            for field in ('lang', 'name', 'version', 'spacy_version')]
+
+
+class AnalysisCache:
+    """
+    Persistent cache of analyzed texts, so that texts that were indexed
+    before (e.g. republished articles or a corpus that is indexed again) do
+    not go through the NLP pipeline again. The entries are keyed by a hash
+    of the text and the analyzers and hold the valid tokens of the text as
+    tuples of their position and their analyzed forms.
+
+    Keys also contain the version of the model (see `model_version`), so
+    that a new model does not get the analyses of the old one.
+
+    The cache is a SQLite database that can be shared by several processes.
+    New entries are written by `flush`, which also drops the least recently
+    used entries if there are more than `max_entries`.
+    """
+
+    def __init__(self, path, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+
+        # Entries to write and keys of the entries that were used since the
+        # last flush.
+        self._new = {}
+        self._used = set()
+
+        # Connections can not be shared with forked processes, so each
+        # process opens its own.
+        self._connection = None
+        self._pid = None
+
+    @staticmethod
+    def key(text, analyzers, model=None):
+        # Texts analyzed by another model get keys of their own
+        key = [analyzers, text]
+        if model is not None:
+            key.insert(0, model)
+
+        return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+    @property
+    def connection(self):
+        if self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "key TEXT PRIMARY KEY, tokens TEXT, used REAL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_used "
+                "ON analyses (used)")
+
+            # Number of entries, kept up to date by `flush` so that the
+            # table is not counted every time. It is counted once if the
+            # cache was created without it.
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS analyses_count (entries INTEGER)")
+            self._connection.execute(
+                "INSERT INTO analyses_count "
+                "SELECT (SELECT COUNT(*) FROM analyses) "
+                "WHERE NOT EXISTS (SELECT 1 FROM analyses_count)")
+            self._connection.commit()
+            self._pid = os.getpid()
+
+        return self._connection
+
+    def get(self, key):
+        """
+        Return the tokens of the text with the given key, or None if it is
+        not cached.
+        """
+        if key in self._new:
+            return self._new[key]
+
+        row = self.connection.execute(
+            "SELECT tokens FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        self._used.add(key)
+        return json.loads(row[0])
+
+    def put(self, key, tokens):
+        self._new[key] = tokens
+
+    def flush(self):
+        """
+        Write the new entries, mark the used ones and evict the least
+        recently used entries in one transaction.
+        """
+        if not self._new and not self._used:
+            return
+
+        now = time.time()
+        with self.connection as connection:
+            # Another process may have added the same text in the meantime,
+            # with the same tokens. Only the entries that are really new are
+            # counted.
+            inserted = connection.executemany(
+                "INSERT OR IGNORE INTO analyses VALUES (?, ?, ?)",
+                [(key, json.dumps(tokens), now)
+                 for key, tokens in self._new.items()]
+            ).rowcount
+            connection.executemany(
+                "UPDATE analyses SET used = ? WHERE key = ?",
+                [(now, key) for key in self._used | set(self._new)]
+            )
+            connection.execute(
+                "UPDATE analyses_count SET entries = entries + ?",
+                (max(inserted, 0),))
+
+            count = connection.execute(
+                "SELECT entries FROM analyses_count").fetchone()[0]
+            if count > self.max_entries:
+                deleted = connection.execute(
+                    "DELETE FROM analyses WHERE key IN ("
+                    "SELECT key FROM analyses ORDER BY used LIMIT ?)",
+                    (count - self.max_entries,)
+                ).rowcount
+                connection.execute(
+                    "UPDATE analyses_count SET entries = entries - ?",
+                    (deleted,))
+
+        self._new = {}
+        self._used = set()
@@ -0,0 +1,17 @@
+from supercell.api import ConsumerBase, ContentType
+
+from distributed_index.shared import wire
+
+
+class InvertedIndexConsumer(ConsumerBase):
+    """
+    Consumes inverted indices in the binary format of
+    `distributed_index.shared.wire`. Instead of an instance of the model, the
+    decoded index is passed to the handler, so that the postings stay arrays
+    and are not converted one by one.
+    """
+
+    CONTENT_TYPE = ContentType(wire.CONTENT_TYPE)
+
+    def consume(self, handler, model):
+        return wire.decode_index(handler.request.body)
@@ -0,0 +1,180 @@
+"""
+Analyzer engine that does without the spaCy pipeline, for corpora where the
+accuracy of the tagger does not matter. Texts are split by a regular
+expression, tokens without any letter (numbers, symbols and punctuation)
+and stop words are dropped, and lemmas are looked up in a table instead of
+being derived from the part of speech.
+
+The forms of a word only depend on the word itself, so they are computed
+once per word and `InvertedIndex` takes them as they are, see
+`AnalyzedText`.
+"""
+import hashlib
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Words (also with inner apostrophes, e.g. "don't") and single characters
+# that are neither part of a word nor whitespace. The latter are dropped,
+# but count as positions, like the punctuation tokens of spaCy.
+TOKEN = re.compile(r"\w+(?:'\w+)*|[^\w\s]")
+
+# Tokens without a letter are numbers, symbols or punctuation
+LETTER = re.compile(r"[^\W\d_]")
+
+# The forms of a word, in the order they are kept by `FastNLP`
+FORMS = ('token', 'lemma', 'lemma_lowercase', 'token_lowercase')
+
+# Number of words whose forms are kept before they are computed anew
+MAX_WORDS = 1000000
+
+
+def load_lemmas(path=None, allow_missing=False):
+    """
+    Load the lookup table of lemmas from a file with a form and its lemma,
+    separated by a tab, on each line. Without a file, the English lookup
+    table of spaCy is used if the installed version ships one.
+
+    A table that cannot be read or is empty raises a `ValueError`, unless
+    `allow_missing` is set: then words are their own lemmas.
+    """
+    lemmas = {}
+    error = None
+
+    if path:
+        try:
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 2:
+                        lemmas[fields[0]] = fields[1]
+        except (OSError, UnicodeDecodeError) as e:
+            error = f"Cannot read the lookup table of lemmas '{path}': {e}"
+        else:
+            if not lemmas:
+                error = f"The lookup table of lemmas '{path}' is empty."
+    else:
+        try:
+            from spacy.lang.en.lemmatizer import LOOKUP
+        except ImportError:
+            error = "spaCy ships no lookup table of lemmas."
+        else:
+            lemmas = dict(LOOKUP)
+
+    if error:
+        if not allow_missing:
+            raise ValueError(error)
+        logger.warning(f"{error} Words are their own lemmas.")
+
+    return lemmas
+
+
+def load_stop_words(path=None):
+    """
+    Load the stop words from a file with one word on each line, or use the
+    English stop words of spaCy.
+    """
+    if path:
+        with open(path, encoding='utf-8') as file:
+            words = [line.strip() for line in file]
+    else:
+        from spacy.lang.en.stop_words import STOP_WORDS
+        words = STOP_WORDS
+
+    return {word.lower() for word in words if word}
+
+
+class AnalyzedText:
+    """
+    The valid tokens of a text, as tuples of their position and all their
+    forms (see `FORMS`).
+    """
+
+    __slots__ = ('tokens',)
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def select(self, analyzers):
+        """
+        Return the tokens as tuples of their position and their form for
+        each of the given analyzers, like `InvertedIndex._tokens`.
+        """
+        indices = [FORMS.index(analyzer) for analyzer in analyzers]
+
+        return [
+            (position, [forms[i] for i in indices])
+            for position, forms in self.tokens
+        ]
+
+
+class FastNLP:
+    """
+    Drop-in replacement of the spaCy pipeline for `InvertedIndex`: texts
+    can be analyzed one by one or via `pipe`.
+    """
+
+    def __init__(self, lemmas=None, stop_words=None, max_words=MAX_WORDS):
+        self.lemmas = load_lemmas() if lemmas is None else lemmas
+        self.stop_words = load_stop_words() if stop_words is None \
+            else {word.lower() for word in stop_words}
+        self.max_words = max_words
+
+        # The forms of each word that was seen, None if it is not indexed
+        self._words = {}
+
+        self._meta = None
+
+    @property
+    def meta(self):
+        """
+        Name and version of the engine like the `meta` of a spaCy model.
+        The version is a digest of the lemmas and stop words, which
+        determine the forms of the words.
+        """
+        if self._meta is None:
+            digest = hashlib.sha1(json.dumps(
+                [sorted(self.lemmas.items()), sorted(self.stop_words)]
+            ).encode('utf-8')).hexdigest()
+            self._meta = {"lang": "en", "name": "fast",
+                          "version": digest[:12]}
+
+        return self._meta
+
+    def _forms(self, word):
+        lowercase = word.lower()
+        if lowercase in self.stop_words or not LETTER.search(word):
+            return None
+
+        lemma = self.lemmas.get(word) or self.lemmas.get(lowercase, word)
+        return word, lemma, lemma.lower(), lowercase
+
+    def __call__(self, text):
+        words = self._words
+        if len(words) > self.max_words:
+            words.clear()
+
+        tokens = []
+        for position, word in enumerate(TOKEN.findall(text)):
+            try:
+                forms = words[word]
+            except KeyError:
+                forms = words[word] = self._forms(word)
+
+            if forms is not None:
+                tokens.append((position, forms))
+
+        return AnalyzedText(tokens)
+
+    def pipe(self, texts, as_tuples=False, batch_size=None, n_process=1):
+        for item in texts:
+            if as_tuples:
+                text, context = item
+                yield self(text), context
+            else:
+                yield self(item)
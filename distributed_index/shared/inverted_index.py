@@ -1,7 +1,22 @@
-import json
+import time
 from collections import defaultdict
 from itertools import chain
 
+import numpy as np
+
+from distributed_index.shared import positions
+from distributed_index.shared.analysis_cache import model_version
+from distributed_index.shared.fast_nlp import AnalyzedText
+from distributed_index.shared.postings import as_postings, merge_sorted, \
+    to_postings, union
+from distributed_index.shared.segment import Segment, write_segment
+from distributed_index.shared.terms import TermDictionary, TermTable
+
+# Part of the terms of a table that must have changed before the table is
+# packed again, see `TermTable.pack`. Packing copies all postings, so it is
+# not done after every small update.
+PACK_RATIO = 0.25
+
 
 class InvertedIndex:
     ANALYZE = {
@@ -13,7 +28,8 @@ class InvertedIndex:
 
     AVOID = {"SYM", "NUM", "PUNCT"}
 
-    def __init__(self, nlp, fields=None, analyzers=None):
+    def __init__(self, nlp, fields=None, analyzers=None, batch_size=None,
+                 n_process=1, scoring=False, positional=False, cache=None):
         if fields is None:
             fields = ['text']
 
@@ -29,14 +45,75 @@ class InvertedIndex:
         self.analyzers = analyzers
         self.nlp = nlp
 
-        self.inverted_index = {
+        # When a batch size is given, texts are analyzed in batches
+        # via `nlp.pipe`, optionally spread over multiple processes.
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+        # Texts that were analyzed before are taken from the cache (an
+        # `AnalysisCache`) instead.
+        self.cache = cache
+
+        # Every term is stored once in the dictionary, the postings of each
+        # field and analyzer are kept by term id, see `terms`.
+        self.terms = TermDictionary()
+        self.inverted_index = self._empty_index(
+            lambda: TermTable(self.terms))
+
+        # In scoring mode, postings keep a doc id once per occurrence of the
+        # term, so that term frequencies are known, and the number of valid
+        # tokens of each field of each document is recorded.
+        self.scoring = scoring
+        self.field_lengths = {field: {} for field in self.fields}
+
+        # In positional mode, postings hold one entry per occurrence of the
+        # term that also encodes its position, see `positions`.
+        self.positional = positional
+
+        # Postings of the documents that are currently being indexed. They are
+        # collected as lists and turned into arrays by `_sort_index`.
+        self._buffer = None
+
+        # The ring that assigns the words to partitions and the partition of
+        # each term id, see `partition`.
+        self.ring = None
+        self.owners = None
+
+        # Counts and timings of the last call of `index`.
+        self.stats = None
+
+    def __getstate__(self):
+        # The NLP model stays behind when an index is passed to another
+        # process.
+        state = dict(self.__dict__)
+        state['nlp'] = None
+        state['cache'] = None
+        return state
+
+    def _empty_index(self, factory):
+        return {
             field: {
-                analyzer: defaultdict(list)
-                for analyzer in analyzers
+                analyzer: factory()
+                for analyzer in self.analyzers
             }
-            for field in fields
+            for field in self.fields
         }
 
+    def _table(self, field, analyzer):
+        """
+        Return the postings of a field and analyzer as a `TermTable`.
+        Segments that were loaded from a file are read-only, so they are
+        copied into one first.
+        """
+        index = self.inverted_index[field][analyzer]
+        if not isinstance(index, TermTable):
+            table = TermTable(self.terms)
+            table.update(index.items())
+            table.pack()
+            index = self.inverted_index[field][analyzer] = table
+
+        return index
+
     def is_valid_token(self, token):
         if len(str(token).strip()) == 0:
             # Remove empty tokens
@@ -52,41 +129,205 @@ class InvertedIndex:
         """
         Process all documents in the stream
         and add them to the inverted index.
+        Returns the words that occur in these documents.
         """
-        for doc in stream:
-            for field in self.fields:
-                text = doc.get(field)
+        self._buffer = self._empty_index(lambda: defaultdict(list))
+        self.stats = stats = {
+            "documents": 0,
+            "tokens": 0,
+            "cached": 0,
+            "postings": 0,
+            "analyze_seconds": 0.0,
+            "add_to_index_seconds": 0.0,
+            "sort_index_seconds": 0.0
+        }
 
-                for token in self.nlp(text):
-                    if not self.is_valid_token(token):
-                        continue
+        # The time to get the next text from `_analyze` is spent in the NLP
+        # pipeline (or the cache), the rest in `_add_to_index`.
+        t0 = time.perf_counter()
+        for tokens, (doc_id, field) in self._analyze(stream):
+            t1 = time.perf_counter()
+            stats["analyze_seconds"] += t1 - t0
 
-                    for analyzer in self.analyzers:
-                        self._add_to_index(
-                            self.ANALYZE[analyzer](token),
-                            doc['id'],
-                            field,
-                            analyzer
-                        )
+            if self.scoring:
+                self.field_lengths[field][int(doc_id)] = len(tokens)
+
+            for position, terms in tokens:
+                for analyzer, term in zip(self.analyzers, terms):
+                    self._add_to_index(term, doc_id, field, analyzer, position)
+
+            stats["tokens"] += len(tokens)
+            if field == self.fields[0]:
+                stats["documents"] += 1
+
+            t0 = time.perf_counter()
+            stats["add_to_index_seconds"] += t0 - t1
+
+        if self.cache is not None:
+            self.cache.flush()
+
+        t0 = time.perf_counter()
+        words = self._sort_index()
+        stats["sort_index_seconds"] = time.perf_counter() - t0
+
+        return words
+
+    def _tokens(self, parsed):
+        """
+        Return the valid tokens of a parsed text as tuples of their position
+        and their form for each analyzer.
+        """
+        if isinstance(parsed, AnalyzedText):
+            # The fast engine already dropped the invalid tokens and knows
+            # the forms of the others.
+            return parsed.select(self.analyzers)
 
-        self._sort_index()
+        return [
+            (token.i, [self.ANALYZE[analyzer](token)
+                       for analyzer in self.analyzers])
+            for token in parsed
+            if self.is_valid_token(token)
+        ]
 
-    def _add_to_index(self, text, doc_id, field, analyzer):
-        self.inverted_index[field][analyzer][text].append(int(doc_id))
+    def _analyze(self, stream):
+        """
+        Analyze every field of every document in the stream. Yields tuples
+        of the valid tokens of the text (see `_tokens`) and its
+        (doc_id, field).
+        """
+        texts = (
+            (doc.get(field), (doc['id'], field))
+            for doc in stream
+            for field in self.fields
+        )
+
+        if self.cache is None:
+            for parsed, context in self._parse(texts):
+                yield self._tokens(parsed), context
+            return
+
+        # Only the texts that are not cached are parsed. The cached ones are
+        # yielded in between. Texts that occur again while they are still
+        # being parsed (e.g. in the same batch) are only parsed once, their
+        # contexts wait in `pending` for the result.
+        cached = []
+        pending = {}
+        model = model_version(self.nlp)
+
+        def uncached():
+            for text, context in texts:
+                key = self.cache.key(text, self.analyzers, model)
+                if key in pending:
+                    pending[key].append(context)
+                    self.stats["cached"] += 1
+                    continue
+
+                tokens = self.cache.get(key)
+                if tokens is None:
+                    pending[key] = []
+                    yield text, (context, key)
+                else:
+                    cached.append((tokens, context))
+                    self.stats["cached"] += 1
+
+        for parsed, (context, key) in self._parse(uncached()):
+            tokens = self._tokens(parsed)
+            self.cache.put(key, tokens)
+            yield tokens, context
+
+            for duplicate in pending.pop(key):
+                yield tokens, duplicate
+
+            while cached:
+                yield cached.pop()
+
+        while cached:
+            yield cached.pop()
+
+    def _parse(self, texts):
+        """
+        Run the NLP pipeline over the texts of the tuples of text and
+        context. Yields tuples of the parsed text and its context.
+        """
+        if not self.batch_size:
+            for text, context in texts:
+                yield self.nlp(text), context
+            return
+
+        yield from self.nlp.pipe(
+            texts,
+            as_tuples=True,
+            batch_size=self.batch_size,
+            n_process=self.n_process
+        )
+
+    def _add_to_index(self, text, doc_id, field, analyzer, position=None):
+        if self.positional:
+            entry = positions.encode(doc_id, position)
+        else:
+            entry = int(doc_id)
+
+        self._buffer[field][analyzer][text].append(entry)
 
     def _sort_index(self):
         """
-        Sort postings and remove duplicates.
+        Sort the buffered postings, remove duplicates and add them to the
+        index as arrays. Returns the words that were added.
         """
+        words = set()
+
         for field in self.fields:
             for analyzer in self.analyzers:
-                index = self.inverted_index[field][analyzer]
-                for token in list(index.keys()):
-                    self.inverted_index[field][analyzer][token] = \
-                        sorted(set(index[token]))
+                index = self._table(field, analyzer)
+
+                for token, doc_ids in self._buffer[field][analyzer].items():
+                    postings = to_postings(doc_ids, not self.scoring)
+                    self.stats["postings"] += len(postings)
+
+                    term_id = self.terms.add(token)
+                    existing = index.get_id(term_id)
+                    if existing is not None:
+                        postings = union(
+                            existing, postings, unique=not self.scoring)
+                    index.set_id(term_id, postings)
+
+                index.pack(PACK_RATIO)
+                words.update(self._buffer[field][analyzer].keys())
+
+        self._buffer = None
+
+        if self.ring is not None:
+            self._owners()
+
+        return words
+
+    @staticmethod
+    def serialize(inverted_index):
+        """
+        Convert an inverted index (or a partial index) with array postings
+        to plain python lists, e.g. to send it as JSON.
+        """
+        return {
+            field: {
+                analyzer: {
+                    token: postings.tolist()
+                    for token, postings in index.items()
+                }
+                for analyzer, index in analyzers.items()
+            }
+            for field, analyzers in inverted_index.items()
+        }
 
     def save_to_file(self, path):
-        json.dump(self.inverted_index, open(path, 'w'))
+        """
+        Write the index to a segment file, see `segment`.
+        """
+        write_segment(
+            path,
+            self.inverted_index,
+            scoring=self.scoring,
+            positional=self.positional
+        )
 
     def create_partial_index(self, words):
         """
@@ -95,42 +336,186 @@ class InvertedIndex:
         partial_index = {}
         words = set(words)
 
+        # The words are looked up in the dictionary only once
+        ids = [term_id for term_id in map(self.terms.ids.get, words)
+               if term_id is not None]
+        terms = self.terms.terms
+
         for field in self.fields:
             partial_index[field] = {}
             for analyzer in self.analyzers:
+                index = self.inverted_index[field][analyzer]
+                if isinstance(index, TermTable):
+                    partial_index[field][analyzer] = {
+                        terms[term_id]: postings
+                        for term_id, postings in index.items_by_id(ids)
+                    }
+                    continue
+
                 partial_index[field][analyzer] = {
-                    word: postings for word, postings
-                    in self.inverted_index[field][analyzer].items()
-                    if word in words
+                    word: index[word] for word in words if word in index
                 }
 
         return partial_index
 
+    def update(self, partial_index):
+        """
+        Add the postings of a (partial) index of other documents to this
+        index.
+        """
+        for field in self.fields:
+            for analyzer in self.analyzers:
+                index = self._table(field, analyzer)
+                for token, postings in \
+                        partial_index[field][analyzer].items():
+                    postings = as_postings(postings)
+                    if token in index:
+                        postings = union(
+                            index[token], postings, unique=not self.scoring)
+                    index[token] = postings
+
+                index.pack(PACK_RATIO)
+
+    def add(self, other):
+        """
+        Add another index of other documents to this index, together with
+        their field lengths.
+        """
+        self.update(other.inverted_index)
+
+        for field, lengths in other.field_lengths.items():
+            self.field_lengths[field].update(lengths)
+
+    def delete(self, doc_ids):
+        """
+        Remove the given documents from the index. Words that only occur in
+        these documents are removed as well.
+        """
+        deleted = as_postings(list(doc_ids))
+
+        for field in self.fields:
+            for doc_id in deleted.tolist():
+                self.field_lengths[field].pop(doc_id, None)
+
+            for analyzer in self.analyzers:
+                index = self._table(field, analyzer)
+
+                for token, postings in list(index.items()):
+                    if self.positional:
+                        doc_ids = positions.doc_ids(postings)
+                    else:
+                        doc_ids = as_postings(postings)
+
+                    keep = ~np.isin(doc_ids, deleted)
+                    if keep.all():
+                        continue
+
+                    if keep.any():
+                        index[token] = postings[keep]
+                    else:
+                        del index[token]
+
+                index.pack(PACK_RATIO)
+
+        # Forget the words that do not occur any more
+        self.terms.retain(set(chain(*[
+            self.inverted_index[field][analyzer].ids()
+            for field in self.fields
+            for analyzer in self.analyzers
+        ])))
+
+    def partition(self, ring):
+        """
+        Assign the words of the index to the nodes of the given `HashRing`,
+        so that the partial index of the words a node owns can later be
+        served without scanning the vocabulary, see `create_partition`.
+        Words that are added later are assigned as well.
+        """
+        self.ring = ring
+        self.owners = np.zeros(0, dtype=np.int64)
+
+        # The postings are looked up by term id
+        for field in self.fields:
+            for analyzer in self.analyzers:
+                self._table(field, analyzer)
+
+    def _owners(self):
+        """
+        Return the partition of each term id (-1 for removed terms). The
+        partition of each word is only computed once.
+        """
+        terms = self.terms.terms
+        if len(self.owners) < len(terms):
+            self.owners = np.concatenate([self.owners, np.array(
+                [-1 if term is None else self.ring.partition(term)
+                 for term in terms[len(self.owners):]],
+                dtype=np.int64
+            )])
+
+        return self.owners
+
+    def create_partition(self, partition):
+        """
+        Create the partial index of the words of a partition, i.e. the words
+        the node at this position of the ring owns.
+        """
+        ids = np.flatnonzero(self._owners() == partition).tolist()
+        terms = self.terms.terms
+
+        return {
+            field: {
+                analyzer: {
+                    terms[term_id]: postings for term_id, postings in
+                    self._table(field, analyzer).items_by_id(ids)
+                }
+                for analyzer in self.analyzers
+            }
+            for field in self.fields
+        }
+
     def words(self):
         """
         Return a list of all the words used in this index.
         """
-        return list(set(chain(
-            *[
-                self.inverted_index[field][analyzer].keys()
-                for field in self.fields
-                for analyzer in self.analyzers
-            ]
-        )))
+        tables = [
+            self.inverted_index[field][analyzer]
+            for field in self.fields
+            for analyzer in self.analyzers
+        ]
+
+        # The dictionary holds exactly the words of the tables, unless they
+        # were loaded from a file.
+        if all(isinstance(table, TermTable) for table in tables):
+            return list(self.terms)
+
+        return list(set(chain(*[table.keys() for table in tables])))
 
     @classmethod
     def from_file(cls, nlp, path):
-        data = json.load(open(path))
-        fields = data.keys()
-        analyzers = data[list(fields)[0]].keys()
+        """
+        Open an index from a segment file. The postings are only read from
+        disk when they are accessed.
+        """
+        segment = Segment(path)
+        fields = list(segment.inverted_index.keys())
+        analyzers = list(segment.inverted_index[fields[0]].keys())
 
-        index = cls(nlp, fields, analyzers)
-        index.inverted_index = data
+        index = cls(nlp, fields, analyzers, **segment.settings)
+        index.inverted_index = segment.inverted_index
 
         return index
 
     @classmethod
-    def merge(cls, nlp, *indices):
+    def merge(cls, nlp, *indices, disjoint=False, scoring=False,
+              positional=False):
+        """
+        Merge several (partial) indices into a new index. Set `disjoint` if
+        no word occurs in more than one of them, in which case they are
+        simply combined without touching the postings. Set `scoring` to keep
+        the duplicate doc ids of indices that were created in scoring mode.
+        Positional postings are merged like any other postings, `positional`
+        only marks the merged index.
+        """
         # Make sure all indices were created with the same settings
         fields = indices[0].keys()
         analyzers = indices[0][list(fields)[0]].keys()
@@ -140,25 +525,35 @@ class InvertedIndex:
             assert index[list(fields)[0]].keys() == analyzers
 
         # Create the base index
-        merged_index = cls(nlp, fields, analyzers)
+        merged_index = cls(nlp, fields, analyzers, scoring=scoring,
+                           positional=positional)
 
         for field in fields:
             for analyzer in analyzers:
-                # Gather tokens
-                tokens = chain(
-                    *[index[field][analyzer].keys() for index in indices])
-
-                # Concatenate postings
-                inverted_index = {
-                    token: chain(
-                        *[index[field][analyzer].get(token, [])
-                          for index in indices
-                          ])
-                    for token in tokens
-                }
+                inverted_index = merged_index.inverted_index[field][analyzer]
+
+                if disjoint:
+                    for index in indices:
+                        inverted_index.update(
+                            (token, as_postings(postings)) for token, postings
+                            in index[field][analyzer].items()
+                        )
+                    inverted_index.pack()
+                    continue
 
-                merged_index.inverted_index[field][analyzer] = inverted_index
+                # Gather the postings of each token in the order of the
+                # indices, in a single pass over each index
+                postings_lists = defaultdict(list)
+                for index in indices:
+                    for token, postings in index[field][analyzer].items():
+                        postings_lists[token].append(postings)
 
-        merged_index._sort_index()
+                # Merge the sorted postings of all indices that contain the
+                # token
+                inverted_index.update(
+                    (token, merge_sorted(*postings, unique=not scoring))
+                    for token, postings in postings_lists.items()
+                )
+                inverted_index.pack()
 
         return merged_index
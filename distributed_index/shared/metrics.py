@@ -0,0 +1,278 @@
+"""
+Counters, gauges and histograms of a node, exposed by /api/metrics in the
+text format of Prometheus:
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+import logging
+import weakref
+from bisect import bisect_left
+
+from tornado.web import OutputTransform
+
+from distributed_index.shared import tracing
+from distributed_index.shared.process import proportional_memory, \
+    resident_memory, uptime
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Prefix of the names of all metrics
+PREFIX = 'distributed_index_'
+
+# Upper bounds of the buckets of histograms of durations in seconds
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 300)
+
+access_log = logging.getLogger('tornado.access')
+
+# Bytes of the response body sent for each request, see `ByteCounter`
+_sent_bytes = weakref.WeakKeyDictionary()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n') \
+        .replace('"', r'\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(value)}"'
+                          for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
+
+
+class Metric:
+    TYPE = None
+
+    def __init__(self, name, help):
+        self.name = PREFIX + name
+        self.help = help
+
+        # Value by the sorted tuple of (label, value) pairs
+        self.values = {}
+
+    def samples(self):
+        """
+        Yield tuples of the name, labels and value of each sample.
+        """
+        for labels, value in sorted(self.values.items()):
+            yield self.name, labels, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(
+            f"{name}{_format_labels(labels)} {_format_value(value)}"
+            for name, labels, value in self.samples()
+        )
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        if value is None:
+            return
+
+        self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, buckets=SECONDS_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        if key not in self.values:
+            # Observations per bucket, their sum and their number
+            self.values[key] = [[0] * len(self.buckets), 0, 0]
+
+        counts, _, _ = state = self.values[key]
+        counts[bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield (f"{self.name}_bucket",
+                       labels + (('le', _format_value(bound)),),
+                       cumulative)
+
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class Metrics:
+    """
+    The metrics of a node by name. Metrics are created on first use.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, cls, name, help, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = cls(name, help, **kwargs)
+
+        return self.metrics[name]
+
+    def counter(self, name, help):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help, buckets=SECONDS_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render(self):
+        return '\n'.join(
+            metric.render() for _, metric in sorted(self.metrics.items())
+        ) + '\n'
+
+
+def record_process(metrics):
+    """
+    Update the memory and the uptime of this process.
+    """
+    metrics.gauge(
+        'resident_memory_bytes', "Resident memory of the process."
+    ).set(resident_memory())
+    metrics.gauge(
+        'proportional_memory_bytes',
+        "Proportional memory of the process (shared pages count in parts)."
+    ).set(proportional_memory())
+    metrics.gauge(
+        'uptime_seconds', "Seconds since the process was started."
+    ).set(uptime())
+
+
+def record_stage(metrics, stage, seconds):
+    metrics.histogram(
+        'stage_seconds', "Time spent in the stages of indexing and merging."
+    ).observe(seconds, stage=stage)
+
+
+def record_index(metrics, stats):
+    """
+    Count what `InvertedIndex.index` processed and record the time of each
+    of its stages: the NLP pipeline, `_add_to_index` and `_sort_index`.
+    """
+    if not stats:
+        return
+
+    metrics.counter(
+        'indexed_documents_total', "Documents that were indexed."
+    ).inc(stats['documents'])
+    metrics.counter(
+        'indexed_tokens_total', "Valid tokens of the indexed texts."
+    ).inc(stats['tokens'])
+    metrics.counter(
+        'indexed_postings_total', "Postings that were added to the index."
+    ).inc(stats['postings'])
+    metrics.counter(
+        'analysis_cache_hits_total',
+        "Texts that were taken from the analysis cache."
+    ).inc(stats['cached'])
+
+    for stage in ('analyze', 'add_to_index', 'sort_index'):
+        record_stage(metrics, stage, stats[f'{stage}_seconds'])
+
+
+class ByteCounter(OutputTransform):
+    """
+    Counts the bytes of the response bodies as they are written, for
+    `record_request`. It must be one of the `transforms` of the tornado
+    application.
+    """
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.request = request
+        _sent_bytes[request] = 0
+
+    def transform_first_chunk(self, status_code, headers, chunk, finishing):
+        _sent_bytes[self.request] += len(chunk)
+        return status_code, headers, chunk
+
+    def transform_chunk(self, chunk, finishing):
+        _sent_bytes[self.request] += len(chunk)
+        return chunk
+
+
+def record_request(metrics, handler):
+    """
+    Count a finished request and the bytes of its body and its response.
+    """
+    request = handler.request
+    name = type(handler).__name__
+
+    metrics.counter(
+        'http_requests_total', "Requests by handler and status code."
+    ).inc(handler=name, code=handler.get_status())
+    metrics.histogram(
+        'http_request_seconds', "Time to answer requests by handler."
+    ).observe(request.request_time(), handler=name)
+
+    # Streamed bodies are not kept, but their length is announced
+    body = request.body if isinstance(request.body, bytes) else b''
+    received = int(request.headers.get('Content-Length') or len(body))
+    metrics.counter(
+        'http_received_bytes_total', "Bytes of request bodies by handler."
+    ).inc(received, handler=name)
+
+    # Counted while the response was written, see `ByteCounter`
+    sent = _sent_bytes.pop(request, 0)
+    metrics.counter(
+        'http_sent_bytes_total', "Bytes of response bodies by handler."
+    ).inc(sent, handler=name)
+
+
+def request_logger(metrics, node):
+    """
+    Create the `log_function` of the tornado application: each finished
+    request updates the metrics and its span is logged if it belongs to a
+    trace, before it is logged like tornado does by default.
+    """
+
+    def log_request(handler):
+        record_request(metrics, handler)
+        tracing.log_span(handler, node)
+
+        if handler.get_status() < 400:
+            log_method = access_log.info
+        elif handler.get_status() < 500:
+            log_method = access_log.warning
+        else:
+            log_method = access_log.error
+
+        request = handler.request
+        log_method("%d %s %s (%s) %.2fms", handler.get_status(),
+                   request.method, request.uri, request.remote_ip,
+                   1000.0 * request.request_time())
+
+    return log_request
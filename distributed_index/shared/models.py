@@ -1,5 +1,5 @@
 from schematics.models import Model
-from schematics.types import StringType, IntType
+from schematics.types import FloatType, StringType, IntType
 from schematics.types.compound import ListType, ModelType, DictType
 
 
@@ -17,6 +17,11 @@ class NodeHealth(Model):
         'red'
     ])
     node_name = StringType(required=True)
+    # Seconds it took to start the node and its memory in bytes, see
+    # `distributed_index.shared.process`.
+    startup_time = FloatType(serialize_when_none=False)
+    resident_memory = IntType(serialize_when_none=False)
+    proportional_memory = IntType(serialize_when_none=False)
 
 
 class HealthResponse(NodeHealth):
@@ -0,0 +1,56 @@
+from bisect import bisect
+from hashlib import md5
+
+# Number of points of each node on the ring. More points spread the words
+# more evenly over the nodes.
+VIRTUAL_NODES = 128
+
+
+def _hash(key):
+    """
+    Unlike the built-in `hash`, this is the same in every process.
+    """
+    return int.from_bytes(md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hashing of words to the nodes that own them. Each node is
+    placed on the ring at several points derived from its name, and a word
+    belongs to the node of the next point after the hash of the word.
+    Adding or removing a node therefore only moves the words next to its
+    points, about 1/N of them, and any process that knows the names of the
+    nodes can compute the owner of a word.
+    """
+
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("A hash ring needs at least one node.")
+
+        points = sorted(
+            (_hash(f"{node}#{i}"), position)
+            for position, node in enumerate(self.nodes)
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._positions = [position for _, position in points]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def partition(self, word):
+        """
+        Return the partition of a word, i.e. the position of its owner in
+        `nodes`. Partitions are not memoized here: the master looks up the
+        terms of arbitrary queries, and indices keep the partitions of
+        their words themselves (see `InvertedIndex.partition`).
+        """
+        point = bisect(self._hashes, _hash(word)) % len(self._hashes)
+        return self._positions[point]
+
+    def owner(self, word):
+        """
+        Return the name of the node that owns a word.
+        """
+        return self.nodes[self.partition(word)]
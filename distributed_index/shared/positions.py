@@ -0,0 +1,77 @@
+"""
+Positional postings.
+
+In positional mode, a postings list holds one entry per occurrence of a term
+with the doc id and the token position packed into one integer:
+`doc_id << 32 | position`. The entries still sort by doc id first, so all
+postings operations (sort, k-way merge, partitioning, the delta-encoded wire
+format) work on them unchanged, and consecutive positions within a document
+delta-encode to a byte each. Doc ids must be smaller than 2^31.
+
+The overhead is one integer per token occurrence and analyzer, the same as
+the term frequencies of the scoring mode.
+"""
+import numpy as np
+
+from distributed_index.shared.postings import POSTINGS_DTYPE, as_postings, \
+    to_postings
+
+POSITION_BITS = 32
+
+
+def encode(doc_id, position):
+    return (int(doc_id) << POSITION_BITS) | int(position)
+
+
+def doc_ids(postings):
+    """
+    Doc ids of a positional postings list, once per occurrence.
+    """
+    return as_postings(postings) >> POSITION_BITS
+
+
+def strip_positions(inverted_index):
+    """
+    Turn the positional postings of an inverted index into plain postings
+    lists of distinct doc ids.
+    """
+    return {
+        field: {
+            analyzer: {
+                term: to_postings(doc_ids(postings))
+                for term, postings in index.items()
+            }
+            for analyzer, index in analyzers.items()
+        }
+        for field, analyzers in inverted_index.items()
+    }
+
+
+def match_phrase(postings, slop=0):
+    """
+    Doc ids of the documents in which the terms of the given positional
+    postings lists occur in this order. Each term must follow the previous
+    one within `slop` + 1 positions.
+    """
+    if not postings:
+        return as_postings([])
+
+    # Occurrences of the phrase so far, as the entries of its last term
+    matches = as_postings(postings[0])
+
+    for term_postings in postings[1:]:
+        term_postings = as_postings(term_postings)
+        if not len(matches) or not len(term_postings):
+            return as_postings([])
+
+        # For each occurrence of the next term, find the closest preceding
+        # match. Entries of the same document are adjacent integers, so the
+        # distance is only small within a document.
+        previous = np.searchsorted(matches, term_postings) - 1
+        valid = previous >= 0
+        candidates = term_postings[valid]
+        distance = candidates - matches[previous[valid]]
+
+        matches = candidates[(distance >= 1) & (distance <= slop + 1)]
+
+    return np.unique(matches >> POSITION_BITS).astype(POSTINGS_DTYPE)
@@ -0,0 +1,91 @@
+import heapq
+
+import numpy as np
+
+# Document ids are stored as typed integer arrays instead of lists of boxed
+# python ints.
+POSTINGS_DTYPE = np.int64
+
+# Postings lists either contain each doc id once, or once per occurrence of
+# the term if term frequencies are kept (`unique=False` below).
+
+
+def as_postings(doc_ids):
+    """
+    Return the given doc ids as a postings array without sorting them.
+    """
+    return np.asarray(doc_ids, dtype=POSTINGS_DTYPE)
+
+
+def to_postings(doc_ids, unique=True):
+    """
+    Create a sorted postings array from the given doc ids. Duplicates are
+    removed unless `unique` is False.
+    """
+    if not unique:
+        return np.sort(as_postings(doc_ids))
+
+    return np.unique(as_postings(doc_ids))
+
+
+def union(*postings, unique=True):
+    """
+    Union of several sorted postings lists as a sorted array. Duplicates are
+    removed unless `unique` is False.
+    """
+    if len(postings) == 1:
+        return as_postings(postings[0])
+
+    return to_postings(
+        np.concatenate([as_postings(p) for p in postings]), unique)
+
+
+def term_frequencies(postings):
+    """
+    Return the distinct doc ids of a postings list that keeps duplicates and
+    how often each of them occurs.
+    """
+    return np.unique(as_postings(postings), return_counts=True)
+
+
+def intersect(*postings):
+    """
+    Intersection of several sorted postings lists without duplicates.
+    """
+    # Start with the shortest list to keep the intermediate results small.
+    postings = sorted((as_postings(p) for p in postings), key=len)
+
+    result = postings[0]
+    for other in postings[1:]:
+        result = np.intersect1d(result, other, assume_unique=True)
+
+    return result
+
+
+def difference(postings, other):
+    """
+    Doc ids of the first sorted postings list that are not in the second.
+    """
+    return np.setdiff1d(
+        as_postings(postings), as_postings(other), assume_unique=True)
+
+
+def merge_sorted(*postings, unique=True):
+    """
+    K-way merge of sorted postings lists using a heap. Duplicates are dropped
+    while merging (unless `unique` is False), so the inputs never need to be
+    re-sorted.
+    """
+    if len(postings) == 1:
+        return as_postings(postings[0])
+
+    merged = []
+    last = None
+    for doc_id in heapq.merge(*[
+        p.tolist() if isinstance(p, np.ndarray) else p for p in postings
+    ]):
+        if doc_id != last or not unique:
+            merged.append(doc_id)
+            last = doc_id
+
+    return as_postings(merged)
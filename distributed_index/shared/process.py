@@ -0,0 +1,91 @@
+"""
+Statistics about processes, read from /proc. They are only available on
+Linux, elsewhere the functions return None. `pid` defaults to the current
+process.
+"""
+import os
+
+
+def _read_kilobytes(path, key):
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return None
+
+
+def _stat(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        # The name of the command might contain spaces
+        return f.read().rsplit(')', 1)[1].split()
+
+
+def resident_memory(pid='self'):
+    """
+    Resident memory of a process in bytes. Pages that are shared with other
+    processes, e.g. a model that was loaded before forking, count fully.
+    """
+    return _read_kilobytes(f'/proc/{pid}/status', 'VmRSS')
+
+
+def peak_memory(pid='self'):
+    """
+    Peak resident memory of a process in bytes.
+    """
+    return _read_kilobytes(f'/proc/{pid}/status', 'VmHWM')
+
+
+def proportional_memory(pid='self'):
+    """
+    Proportional memory of a process in bytes: each page that is shared
+    with other processes only counts in parts.
+    """
+    return _read_kilobytes(f'/proc/{pid}/smaps_rollup', 'Pss')
+
+
+def uptime(pid='self'):
+    """
+    Seconds since a process was started (or forked).
+    """
+    try:
+        fields = _stat(pid)
+        with open('/proc/uptime') as f:
+            system_uptime = float(f.read().split()[0])
+    except OSError:
+        return None
+
+    # The start time is the 22nd field, in clock ticks after boot
+    started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    return system_uptime - started
+
+
+def descendants(pid):
+    """
+    The pids of the children of a process, their children and so on.
+    """
+    children = {}
+    try:
+        pids = [int(name) for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return []
+
+    for pid_ in pids:
+        try:
+            # The parent pid is the 4th field
+            parent = int(_stat(pid_)[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(pid_)
+
+    result = []
+    todo = [pid]
+    while todo:
+        for child in children.get(todo.pop(), []):
+            result.append(child)
+            todo.append(child)
+
+    return result
@@ -0,0 +1,57 @@
+import json
+
+from schematics.exceptions import ModelValidationError
+from supercell.api import ContentType, JsonProvider, ProviderBase
+from supercell.provider import NoProviderFound
+from tornado.web import HTTPError
+
+from distributed_index.shared import wire
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.models import InvertedIndexModel
+
+
+class InvertedIndexProvider(JsonProvider):
+    """
+    Provides inverted index models in the binary format of
+    `distributed_index.shared.wire`. Errors are still returned as JSON.
+
+    Handlers that have the postings as arrays write them with `provide_index`
+    instead, so that they are not converted to a model first.
+    """
+
+    CONTENT_TYPE = ContentType(wire.CONTENT_TYPE)
+
+    def provide(self, model, handler, **kwargs):
+        try:
+            model.validate()
+        except ModelValidationError as e:
+            raise HTTPError(500, reason=json.dumps({
+                "result_model": e.messages
+            }))
+
+        handler.set_header('Content-Type', wire.CONTENT_TYPE)
+        handler.write(wire.encode_index(model.to_primitive()))
+
+
+def provide_index(handler, inverted_index):
+    """
+    Write an inverted index with array postings in the binary format if the
+    client accepts it, the mirror image of `InvertedIndexConsumer`. Returns
+    None in that case, otherwise the model of the index for the JSON
+    provider.
+    """
+    try:
+        provider_class, _ = ProviderBase.map_provider(
+            handler.request.headers.get('Accept', ''), handler,
+            allow_default=True)
+    except NoProviderFound:
+        provider_class = None
+
+    if provider_class is InvertedIndexProvider:
+        handler.set_header('Content-Type', wire.CONTENT_TYPE)
+        handler.write(wire.encode_index(inverted_index))
+        return None
+
+    response = InvertedIndexModel(InvertedIndex.serialize(inverted_index))
+    response.validate()
+    return response
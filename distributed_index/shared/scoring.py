@@ -0,0 +1,140 @@
+import numpy as np
+
+from distributed_index.shared.postings import POSTINGS_DTYPE, \
+    term_frequencies, to_postings
+
+# Default BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+class FieldLengths:
+    """
+    Number of valid tokens of a field for each document, stored as sorted
+    arrays for vectorized lookups.
+    """
+
+    def __init__(self, lengths):
+        doc_ids = np.fromiter(
+            (int(doc_id) for doc_id in lengths), dtype=POSTINGS_DTYPE,
+            count=len(lengths))
+        values = np.fromiter(
+            lengths.values(), dtype=np.int64, count=len(lengths))
+
+        self._set(doc_ids, values)
+
+    @classmethod
+    def from_arrays(cls, doc_ids, lengths):
+        """
+        Create an instance from arrays of doc ids and their lengths.
+        """
+        field_lengths = cls({})
+        field_lengths._set(np.asarray(doc_ids, dtype=POSTINGS_DTYPE),
+                           np.asarray(lengths, dtype=np.int64))
+        return field_lengths
+
+    def _set(self, doc_ids, lengths):
+        order = np.argsort(doc_ids)
+        self.doc_ids = doc_ids[order]
+        self.lengths = lengths[order]
+
+    def update(self, other):
+        """
+        Add the lengths of the documents of another instance, replacing the
+        ones of documents that are known already.
+        """
+        keep = ~np.isin(self.doc_ids, other.doc_ids)
+        self._set(
+            np.concatenate((self.doc_ids[keep], other.doc_ids)),
+            np.concatenate((self.lengths[keep], other.lengths))
+        )
+
+    def delete(self, doc_ids):
+        """
+        Forget the lengths of the given documents.
+        """
+        keep = ~np.isin(self.doc_ids, np.asarray(doc_ids, dtype=np.int64))
+        self._set(self.doc_ids[keep], self.lengths[keep])
+
+    @property
+    def number_of_documents(self):
+        return len(self.doc_ids)
+
+    @property
+    def average_length(self):
+        return self.lengths.mean() if len(self.lengths) else 0.0
+
+    def get(self, doc_ids):
+        """
+        Lengths of the given (known) documents.
+        """
+        return self.lengths[np.searchsorted(self.doc_ids, doc_ids)]
+
+
+def strip_frequencies(inverted_index):
+    """
+    Turn the postings of an inverted index in scoring mode, which repeat a
+    doc id for every occurrence of the term, into plain postings lists of
+    distinct doc ids.
+    """
+    return {
+        field: {
+            analyzer: {
+                term: to_postings(postings)
+                for term, postings in index.items()
+            }
+            for analyzer, index in analyzers.items()
+        }
+        for field, analyzers in inverted_index.items()
+    }
+
+
+def bm25(tf, dl, df, number_of_documents, average_length, k1=K1, b=B):
+    """
+    BM25 score of a term for documents with the given term frequencies and
+    lengths. `df` is the number of documents that contain the term.
+    """
+    idf = np.log(1 + (number_of_documents - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * dl / max(average_length, 1e-9))
+
+    return idf * tf * (k1 + 1) / (tf + norm)
+
+
+def score(doc_ids, postings, field_lengths, k1=K1, b=B):
+    """
+    Sum of the BM25 scores of all terms for the given sorted doc ids.
+    `postings` are the postings lists (with duplicates) of the query terms.
+    """
+    scores = np.zeros(len(doc_ids))
+
+    for term_postings in postings:
+        term_doc_ids, tf = term_frequencies(term_postings)
+
+        # Only score the matching documents
+        matches = np.isin(term_doc_ids, doc_ids, assume_unique=True)
+        scores[np.searchsorted(doc_ids, term_doc_ids[matches])] += bm25(
+            tf[matches],
+            field_lengths.get(term_doc_ids[matches]),
+            len(term_doc_ids),
+            field_lengths.number_of_documents,
+            field_lengths.average_length,
+            k1, b
+        )
+
+    return scores
+
+
+def top_k(doc_ids, scores, k):
+    """
+    Return the k best doc ids and their scores, best first.
+    """
+    if k < len(doc_ids):
+        candidates = np.argpartition(-scores, k - 1)[:k] if k else []
+    else:
+        candidates = np.arange(len(doc_ids))
+
+    # Sort by score and by doc id for equal scores
+    candidates = np.asarray(candidates, dtype=np.int64)
+    order = np.lexsort((doc_ids[candidates], -scores[candidates]))
+
+    return doc_ids[candidates[order]], scores[candidates[order]]
@@ -0,0 +1,220 @@
+"""
+Immutable on-disk format of an inverted index that is read via mmap.
+
+Layout:
+
+    magic
+    for each field and analyzer, a table of n terms:
+        term offsets: n + 1 uint64 into the term blob
+        postings offsets: n + 1 uint64 into the postings blob
+        term blob: the UTF-8 encoded terms in sorted (byte) order
+        postings blob: the postings lists as delta-encoded varints
+    directory: JSON, with the number of terms and the offset of each table
+    offset of the directory as uint64
+
+All uint64 are little-endian. Opening a segment only reads the directory.
+Terms are found by a binary search over the mapped term dictionary and only
+the postings of terms that are looked up are decoded, so the resident
+memory stays proportional to the terms that are accessed.
+"""
+import json
+import mmap
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+from distributed_index.shared.postings import POSTINGS_DTYPE
+from distributed_index.shared.wire import decode_varints, delta_encode, \
+    encode_varints, varint_lengths
+
+MAGIC = b'DIXSEG\x00\x01'
+
+OFFSET = struct.Struct('<Q')
+OFFSETS_DTYPE = np.dtype('<u8')
+
+
+def _table(index):
+    """
+    Encode the term dictionary and postings of one field and analyzer.
+    """
+    terms = sorted(term.encode('utf-8') for term in index)
+    term_lengths = np.array([len(term) for term in terms], dtype=np.int64)
+
+    deltas, lengths = delta_encode(
+        index[term.decode('utf-8')] for term in terms)
+    byte_lengths = varint_lengths(deltas)
+
+    # Byte offset of each postings list: sum the byte lengths of the values
+    # before its first value.
+    value_offsets = np.concatenate(([0], np.cumsum(byte_lengths)))
+    postings_offsets = value_offsets[np.concatenate(([0], np.cumsum(lengths)))]
+    term_offsets = np.concatenate(([0], np.cumsum(term_lengths)))
+
+    return b''.join([
+        term_offsets.astype(OFFSETS_DTYPE).tobytes(),
+        postings_offsets.astype(OFFSETS_DTYPE).tobytes(),
+        b''.join(terms),
+        encode_varints(deltas)
+    ])
+
+
+def write_segment(path, inverted_index, **settings):
+    """
+    Write an inverted index (field -> analyzer -> term -> postings) to a
+    segment file. The keyword arguments are stored in the directory.
+    """
+    directory = {"settings": settings, "fields": {}}
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+
+        for field, analyzers in inverted_index.items():
+            directory["fields"][field] = {}
+            for analyzer, index in analyzers.items():
+                # Align the tables for the offset arrays
+                f.write(b'\x00' * (-f.tell() % OFFSETS_DTYPE.itemsize))
+
+                directory["fields"][field][analyzer] = [len(index), f.tell()]
+                f.write(_table(index))
+
+        offset = f.tell()
+        f.write(json.dumps(directory).encode('utf-8'))
+        f.write(OFFSET.pack(offset))
+
+
+class SegmentTable(Mapping):
+    """
+    Read-only mapping of the terms of one field and analyzer of a segment to
+    their postings.
+    """
+
+    def __init__(self, data, size, offset):
+        self.data = data
+        self.size = size
+
+        self.term_offsets = np.frombuffer(
+            data, dtype=OFFSETS_DTYPE, count=size + 1, offset=offset)
+        self.postings_offsets = np.frombuffer(
+            data, dtype=OFFSETS_DTYPE, count=size + 1,
+            offset=offset + OFFSETS_DTYPE.itemsize * (size + 1))
+
+        self.terms_start = offset + 2 * OFFSETS_DTYPE.itemsize * (size + 1)
+        self.postings_start = self.terms_start + int(self.term_offsets[-1])
+
+    def _term(self, i):
+        start = self.terms_start + int(self.term_offsets[i])
+        end = self.terms_start + int(self.term_offsets[i + 1])
+        return self.data[start:end]
+
+    def _postings(self, i):
+        start = self.postings_start + int(self.postings_offsets[i])
+        end = self.postings_start + int(self.postings_offsets[i + 1])
+        return np.cumsum(
+            decode_varints(self.data[start:end]).astype(POSTINGS_DTYPE))
+
+    def _bisect(self, term):
+        """
+        Binary search for the position of the first term that is not smaller
+        than the given (encoded) term.
+        """
+        low, high = 0, self.size
+
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _find(self, term):
+        """
+        Binary search for the position of a term, or None.
+        """
+        term = term.encode('utf-8')
+        i = self._bisect(term)
+
+        if i < self.size and self._term(i) == term:
+            return i
+
+        return None
+
+    def __getitem__(self, term):
+        i = self._find(term)
+        if i is None:
+            raise KeyError(term)
+
+        return self._postings(i)
+
+    def __contains__(self, term):
+        return self._find(term) is not None
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self._term(i).decode('utf-8')
+
+    def __len__(self):
+        return self.size
+
+    def items(self):
+        # Read the table in order instead of searching for every term
+        for i in range(self.size):
+            yield self._term(i).decode('utf-8'), self._postings(i)
+
+    def range(self, start=None, end=None):
+        """
+        The terms from `start` (inclusive) to `end` (exclusive) with their
+        postings, in sorted order. Either bound can be left open.
+        """
+        low = 0 if start is None else self._bisect(start.encode('utf-8'))
+        high = self.size if end is None else \
+            self._bisect(end.encode('utf-8'))
+
+        return {
+            self._term(i).decode('utf-8'): self._postings(i)
+            for i in range(low, high)
+        }
+
+    def prefix(self, prefix):
+        """
+        The terms that start with the given prefix with their postings, in
+        sorted order.
+        """
+        prefix = prefix.encode('utf-8')
+        low = high = self._bisect(prefix)
+        while high < self.size and self._term(high).startswith(prefix):
+            high += 1
+
+        return {
+            self._term(i).decode('utf-8'): self._postings(i)
+            for i in range(low, high)
+        }
+
+
+class Segment:
+    """
+    A segment file opened via mmap. `inverted_index` maps fields and
+    analyzers to lazy `SegmentTable`s.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a segment file: {path}")
+
+        offset, = OFFSET.unpack(self.data[-OFFSET.size:])
+        directory = json.loads(
+            self.data[offset:-OFFSET.size].decode('utf-8'))
+
+        self.settings = directory["settings"]
+        self.inverted_index = {
+            field: {
+                analyzer: SegmentTable(self.data, size, table_offset)
+                for analyzer, (size, table_offset) in analyzers.items()
+            }
+            for field, analyzers in directory["fields"].items()
+        }
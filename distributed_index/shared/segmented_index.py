@@ -0,0 +1,151 @@
+import numpy as np
+
+from distributed_index.shared import positions
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.postings import as_postings
+
+
+class SegmentedIndex:
+    """
+    Index that grows by adding immutable segments (inverted indices) instead
+    of rebuilding it, similar to an LSM tree.
+
+    Deleted documents are recorded as tombstones with the generation of the
+    index at the time of the deletion. They hide the postings of all
+    segments up to this generation, so that a document can be updated by
+    deleting it and adding its new version in a later segment. Segments and
+    tombstones are merged by `compact`.
+    """
+
+    def __init__(self, scoring=False, positional=False):
+        self.scoring = scoring
+        self.positional = positional
+
+        # Tuples of the generation and the index of each segment, oldest
+        # first.
+        self.segments = []
+        self.tombstones = {}
+        self.generation = 0
+
+    def add_segment(self, inverted_index):
+        """
+        Add an index as the newest segment.
+        """
+        self.generation += 1
+        self.segments.append((self.generation, inverted_index))
+
+    def delete(self, doc_ids):
+        """
+        Hide the given documents in all current segments.
+        """
+        for doc_id in doc_ids:
+            self.tombstones[int(doc_id)] = self.generation
+
+    def _doc_ids(self, postings):
+        if self.positional:
+            return positions.doc_ids(postings)
+
+        return as_postings(postings)
+
+    def _remove_deleted(self, partial_index, generation, tombstones=None):
+        """
+        Remove the documents that were deleted after the segment of the given
+        generation was added from its (partial) index. The tombstones of the
+        index are used unless others are given.
+        """
+        if tombstones is None:
+            tombstones = self.tombstones
+
+        deleted = np.array(
+            [doc_id for doc_id, deleted_in in tombstones.items()
+             if deleted_in >= generation],
+            dtype=np.int64
+        )
+        if not len(deleted):
+            return partial_index
+
+        result = {}
+        for field, analyzers in partial_index.items():
+            result[field] = {}
+            for analyzer, index in analyzers.items():
+                result[field][analyzer] = {}
+                for term, postings in index.items():
+                    postings = postings[
+                        ~np.isin(self._doc_ids(postings), deleted)]
+                    if len(postings):
+                        result[field][analyzer][term] = postings
+
+        return result
+
+    def _merge(self, partial_indices):
+        return InvertedIndex.merge(
+            None, *partial_indices,
+            scoring=self.scoring, positional=self.positional)
+
+    def create_partial_index(self, words):
+        """
+        Create a partial index over all segments that only contains the given
+        words.
+        """
+        if not self.segments:
+            return {}
+
+        partial_indices = [
+            self._remove_deleted(
+                inverted_index.create_partial_index(words), generation)
+            for generation, inverted_index in self.segments
+        ]
+        if len(partial_indices) == 1:
+            return partial_indices[0]
+
+        return self._merge(partial_indices).inverted_index
+
+    def compact(self):
+        """
+        Merge all segments into one and apply the tombstones to it.
+        """
+        if not self.segments:
+            self.tombstones = {}
+            return
+
+        segments = list(self.segments)
+        tombstones = dict(self.tombstones)
+        self.replace(segments, tombstones,
+                     self.merge_segments(segments, tombstones))
+
+    def merge_segments(self, segments, tombstones):
+        """
+        Merge the given segments of this index into one and apply the given
+        tombstones to it. Only the arguments are read, so that the merge can
+        run in another thread while segments are added, see `replace`.
+        """
+        return self._merge([
+            self._remove_deleted(
+                inverted_index.inverted_index, generation, tombstones)
+            for generation, inverted_index in segments
+        ])
+
+    def replace(self, segments, tombstones, merged_index):
+        """
+        Replace the given segments by their merged index (see
+        `merge_segments`) and drop the tombstones that were applied to it.
+        Segments and tombstones that were added in the meantime are kept.
+        Returns False (and changes nothing) if the given segments are not
+        the oldest segments of the index any more.
+        """
+        current = self.segments[:len(segments)]
+        if len(current) != len(segments) or any(
+                old is not new
+                for (_, old), (_, new) in zip(current, segments)):
+            return False
+
+        # Later segments get a higher generation, so no tombstone that was
+        # applied can affect them. Documents that were deleted again in the
+        # meantime keep their newer tombstone.
+        self.segments = [(segments[-1][0], merged_index)] + \
+            self.segments[len(segments):]
+        for doc_id, generation in tombstones.items():
+            if self.tombstones.get(doc_id) == generation:
+                del self.tombstones[doc_id]
+
+        return True
@@ -0,0 +1,224 @@
+"""
+Snapshots of the state of the nodes on disk, so that a restarted cluster
+serves the indexed documents right away instead of indexing the corpus
+again.
+
+A slave node keeps the segments of its shard as segment files (see
+`segment`) and a manifest with their generations and the tombstones.
+Loading the snapshot only maps the segment files, so the recovery is bound
+by the speed of the disk and not by the NLP pipeline. The master node keeps
+the nodes that own the words and the field lengths of the documents.
+
+Every file is written under a temporary name and renamed, and the manifest
+is replaced last, so that an interrupted snapshot leaves the previous one
+intact.
+"""
+import json
+import logging
+import os
+import threading
+from uuid import uuid4
+
+import numpy as np
+
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.partitioning import HashRing
+from distributed_index.shared.scoring import FieldLengths
+from distributed_index.shared.segmented_index import SegmentedIndex
+
+MANIFEST = 'manifest.json'
+FIELD_LENGTHS = 'field_lengths.npz'
+SEGMENT_SUFFIX = '.seg'
+
+logger = logging.getLogger(__name__)
+
+
+def _replace(path, write):
+    """
+    Write a file via the given function under a temporary name and move it
+    to its path once it is complete.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary, path)
+
+
+def _write_manifest(directory, manifest):
+    _replace(os.path.join(directory, MANIFEST),
+             lambda f: f.write(json.dumps(manifest).encode('utf-8')))
+
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ShardSnapshot:
+    """
+    Snapshot of the shard (a `SegmentedIndex`) of a slave node. Segments do
+    not change once they were added to the shard, so each of them is only
+    written once and later snapshots refer to the same file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        # Tuples of each segment of the last snapshot and its file name
+        self._files = []
+
+        # Snapshots are written by the merge threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def state(shard):
+        """
+        Copy what a snapshot needs of a shard, so that it can be written in
+        another thread while the shard changes.
+        """
+        return {
+            "scoring": shard.scoring,
+            "positional": shard.positional,
+            "generation": shard.generation,
+            "segments": list(shard.segments),
+            "tombstones": dict(shard.tombstones)
+        }
+
+    def _file(self, generation, inverted_index):
+        for segment, filename in self._files:
+            if segment is inverted_index:
+                return filename
+
+        filename = f"segment_{generation}_{uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+        path = os.path.join(self.directory, filename)
+        inverted_index.save_to_file(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+        return filename
+
+    def write(self, state):
+        """
+        Write the snapshot of the given state of a shard (see `state`) and
+        remove the segment files that are not part of it any more.
+        """
+        with self._lock:
+            files = [
+                (inverted_index, self._file(generation, inverted_index))
+                for generation, inverted_index in state["segments"]
+            ]
+
+            _write_manifest(self.directory, {
+                "scoring": state["scoring"],
+                "positional": state["positional"],
+                "generation": state["generation"],
+                "segments": [
+                    [generation, filename] for (generation, _), (_, filename)
+                    in zip(state["segments"], files)
+                ],
+                "tombstones": sorted(state["tombstones"].items())
+            })
+
+            used = {filename for _, filename in files}
+            for filename in os.listdir(self.directory):
+                if filename.endswith(SEGMENT_SUFFIX) and filename not in used:
+                    os.remove(os.path.join(self.directory, filename))
+
+            self._files = files
+
+    def save(self, shard):
+        self.write(self.state(shard))
+
+    def load(self):
+        """
+        Open the shard of the last snapshot, or return None if there is
+        none. The segments are mapped from their files, so their postings
+        are only read when they are accessed.
+        """
+        manifest = _read_manifest(self.directory)
+        if manifest is None:
+            return None
+
+        shard = SegmentedIndex(
+            scoring=manifest["scoring"], positional=manifest["positional"])
+        shard.generation = manifest["generation"]
+        shard.tombstones = {
+            int(doc_id): generation
+            for doc_id, generation in manifest["tombstones"]
+        }
+
+        files = []
+        for generation, filename in manifest["segments"]:
+            inverted_index = InvertedIndex.from_file(
+                None, os.path.join(self.directory, filename))
+            shard.segments.append((generation, inverted_index))
+            files.append((inverted_index, filename))
+
+        self._files = files
+
+        return shard
+
+
+class ClusterSnapshot:
+    """
+    Snapshot of the state of the cluster on the master node: the nodes that
+    own the words, in the order of their partitions, and the field lengths
+    of the documents. `settings` are the settings of the index (scoring and
+    positions), a snapshot of an index with other settings is not loaded.
+    """
+
+    def __init__(self, directory, settings):
+        self.directory = directory
+        self.settings = settings
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, cluster):
+        fields = sorted(cluster["field_lengths"])
+        arrays = {}
+        for i, field in enumerate(fields):
+            arrays[f"doc_ids_{i}"] = cluster["field_lengths"][field].doc_ids
+            arrays[f"lengths_{i}"] = cluster["field_lengths"][field].lengths
+
+        _replace(os.path.join(self.directory, FIELD_LENGTHS),
+                 lambda f: np.savez(f, **arrays))
+        _write_manifest(self.directory, {
+            "settings": self.settings,
+            "nodes": cluster["nodes"],
+            "fields": fields
+        })
+
+    def load(self):
+        """
+        Return the state of the cluster of the last snapshot (like the
+        `cluster` managed object), or None if there is none.
+        """
+        manifest = _read_manifest(self.directory)
+        if manifest is None:
+            return None
+
+        if manifest["settings"] != self.settings:
+            logger.warning(
+                f"Not loading the snapshot in {self.directory}, it was "
+                f"taken with other settings: {manifest['settings']}.")
+            return None
+
+        with np.load(os.path.join(self.directory, FIELD_LENGTHS)) as arrays:
+            field_lengths = {
+                field: FieldLengths.from_arrays(
+                    arrays[f"doc_ids_{i}"], arrays[f"lengths_{i}"])
+                for i, field in enumerate(manifest["fields"])
+            }
+
+        nodes = manifest["nodes"]
+        return {
+            "nodes": nodes,
+            "ring": HashRing([node['name'] for node in nodes]),
+            "field_lengths": field_lengths
+        }
@@ -0,0 +1,282 @@
+"""
+Term dictionary of an inverted index. Every term is stored once and gets an
+integer id, no matter in how many fields and analyzers it occurs. The
+postings of each field and analyzer are kept by term id in a `TermTable`.
+"""
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from distributed_index.shared.postings import POSTINGS_DTYPE
+
+# Marks postings that are not in the dict of a `TermTable` but packed
+_PACKED = object()
+
+
+class TermDictionary:
+    """
+    Interns the terms of an index. Ids are assigned in the order the terms
+    are added and never change, ids of removed terms are not reused. The
+    terms are also kept in sorted order (built on demand) for prefix and
+    range lookups.
+    """
+
+    def __init__(self):
+        self.ids = {}
+
+        # Term by id, None for removed terms
+        self.terms = []
+
+        self._sorted = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, term):
+        return term in self.ids
+
+    def add(self, term):
+        """
+        Return the id of a term, adding it if it is new.
+        """
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+            self._sorted = None
+
+        return term_id
+
+    def retain(self, ids):
+        """
+        Remove all terms whose id is not in the given set.
+        """
+        for term_id, term in enumerate(self.terms):
+            if term is not None and term_id not in ids:
+                del self.ids[term]
+                self.terms[term_id] = None
+                self._sorted = None
+
+    def sorted(self):
+        """
+        All terms in sorted order.
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self.ids)
+
+        return self._sorted
+
+    def range(self, start=None, end=None):
+        """
+        The terms from `start` (inclusive) to `end` (exclusive) in sorted
+        order. Either bound can be left open.
+        """
+        terms = self.sorted()
+        low = 0 if start is None else bisect_left(terms, start)
+        high = len(terms) if end is None else bisect_left(terms, end)
+
+        return terms[low:max(low, high)]
+
+    def prefix(self, prefix):
+        """
+        The terms that start with the given prefix in sorted order.
+        """
+        terms = self.sorted()
+        low = high = bisect_left(terms, prefix)
+        while high < len(terms) and terms[high].startswith(prefix):
+            high += 1
+
+        return terms[low:high]
+
+
+class TermTable(MutableMapping):
+    """
+    Postings of the terms of one field and analyzer, stored by the ids of a
+    shared `TermDictionary`. It behaves like a dict from terms to postings.
+
+    Postings are packed into a single array, because most terms only occur
+    in a few documents and an array for each of them would mostly consist
+    of overhead. Postings that are set later are kept in a dict until the
+    table is packed again, see `pack`.
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+
+        # Postings that were set since the table was packed, by term id.
+        # None marks a packed term that was removed.
+        self.postings = {}
+
+        # Packed postings: the slot of each term id (-1 if it has none) and
+        # the offsets of the postings of each slot into `data`. Slots are
+        # assigned in the order of the term ids.
+        self.slots = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.data = np.zeros(0, dtype=POSTINGS_DTYPE)
+
+    def _packed(self, term_id):
+        if term_id is None or term_id >= len(self.slots):
+            return None
+
+        slot = self.slots[term_id]
+        if slot < 0:
+            return None
+
+        return self.data[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def get_id(self, term_id):
+        """
+        Return the postings of a term id, or None.
+        """
+        postings = self.postings.get(term_id, _PACKED)
+        if postings is _PACKED:
+            return self._packed(term_id)
+
+        return postings
+
+    def set_id(self, term_id, postings):
+        """
+        Set the postings of a term id.
+        """
+        self.postings[term_id] = postings
+
+    def ids(self):
+        """
+        Return the ids of the terms of this table.
+        """
+        return [term_id for term_id, _ in self.items_by_id()]
+
+    def items_by_id(self, ids=None):
+        """
+        Yield the term ids and postings of the given term ids (all by
+        default) that are in this table.
+        """
+        if ids is None:
+            for term_id, postings in self.postings.items():
+                if postings is not None:
+                    yield term_id, postings
+
+            ids = np.flatnonzero(self.slots >= 0)
+            slots = np.arange(len(ids))
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            slots = np.full(len(ids), -1, dtype=np.int64)
+            packed = ids < len(self.slots)
+            slots[packed] = self.slots[ids[packed]]
+
+            # The terms that were set since the table was packed
+            if self.postings:
+                for term_id in ids.tolist():
+                    postings = self.postings.get(term_id)
+                    if postings is not None:
+                        yield term_id, postings
+
+        # Look up the offsets of all packed terms at once
+        found = slots >= 0
+        ids = ids[found].tolist()
+        starts = self.offsets[slots[found]].tolist()
+        ends = self.offsets[slots[found] + 1].tolist()
+
+        for term_id, start, end in zip(ids, starts, ends):
+            if term_id not in self.postings:
+                yield term_id, self.data[start:end]
+
+    def pack(self, ratio=0.0):
+        """
+        Move all postings into the packed array, unless fewer than `ratio`
+        of the terms were set since the last time.
+        """
+        if len(self.postings) <= ratio * (len(self.offsets) - 1):
+            return
+
+        items = list(self.items_by_id())
+        ids = np.fromiter((term_id for term_id, _ in items), dtype=np.int64,
+                          count=len(items))
+
+        # New terms get increasing ids, so the items are usually in order
+        if np.any(ids[1:] < ids[:-1]):
+            order = np.argsort(ids, kind='stable')
+            ids = ids[order]
+            items = [items[i] for i in order.tolist()]
+
+        lengths = np.fromiter((len(postings) for _, postings in items),
+                              dtype=np.int64, count=len(items))
+
+        self.data = np.concatenate(
+            [np.zeros(0, dtype=POSTINGS_DTYPE)] +
+            [postings for _, postings in items])
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)))
+        self.slots = np.full(len(self.terms.terms), -1, dtype=np.int64)
+        self.slots[ids] = np.arange(len(ids))
+        self.postings = {}
+
+    def __getitem__(self, term):
+        postings = self.get_id(self.terms.ids.get(term))
+        if postings is None:
+            raise KeyError(term)
+
+        return postings
+
+    def __setitem__(self, term, postings):
+        self.postings[self.terms.add(term)] = postings
+
+    def __delitem__(self, term):
+        term_id = self.terms.ids.get(term)
+        if self.get_id(term_id) is None:
+            raise KeyError(term)
+
+        if self._packed(term_id) is None:
+            del self.postings[term_id]
+        else:
+            self.postings[term_id] = None
+
+    def __contains__(self, term):
+        return self.get_id(self.terms.ids.get(term)) is not None
+
+    def __iter__(self):
+        terms = self.terms.terms
+        for term_id, _ in self.items_by_id():
+            yield terms[term_id]
+
+    def __len__(self):
+        if not self.postings:
+            return len(self.offsets) - 1
+
+        return sum(1 for _ in self.items_by_id())
+
+    def items(self):
+        # Look up the terms by id instead of the postings by term
+        terms = self.terms.terms
+        for term_id, postings in self.items_by_id():
+            yield terms[term_id], postings
+
+    def values(self):
+        for _, postings in self.items_by_id():
+            yield postings
+
+    def range(self, start=None, end=None):
+        """
+        The terms of this table from `start` (inclusive) to `end`
+        (exclusive) with their postings, in sorted order.
+        """
+        return self._select(self.terms.range(start, end))
+
+    def prefix(self, prefix):
+        """
+        The terms of this table that start with the given prefix with their
+        postings, in sorted order.
+        """
+        return self._select(self.terms.prefix(prefix))
+
+    def _select(self, terms):
+        ids = self.terms.ids
+        selected = dict(self.items_by_id([ids[term] for term in terms]))
+
+        return {
+            term: selected[ids[term]] for term in terms
+            if ids[term] in selected
+        }
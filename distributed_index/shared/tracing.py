@@ -0,0 +1,80 @@
+"""
+Traces of indexing jobs across the nodes. The master sends the id of the
+job as trace id with its requests to the slave nodes, which pass it on with
+their own requests to other nodes, together with the id of the span (the
+request) they are answering. Every request that belongs to a trace is
+logged as a span, so that the critical path of a job can be put together
+from the logs of all nodes:
+
+    trace=<id> span=<id> parent=<id or -> node=<name> handler=<name>
+    start=<unix time> seconds=<duration> status=<code>
+"""
+import logging
+import time
+from uuid import uuid4
+
+TRACE_HEADER = 'X-Trace-Id'
+PARENT_HEADER = 'X-Parent-Span'
+
+trace_log = logging.getLogger('distributed_index.trace')
+
+
+def trace_id(handler):
+    """
+    Id of the trace the request being handled belongs to, or None.
+    """
+    return handler.request.headers.get(TRACE_HEADER)
+
+
+def span_id(handler):
+    """
+    Id of the span of the request being handled.
+    """
+    request = handler.request
+    if not hasattr(request, 'span_id'):
+        request.span_id = uuid4().hex[:16]
+
+    return request.span_id
+
+
+def headers(handler):
+    """
+    Headers that continue the trace of the request being handled in the
+    requests it sends to other nodes.
+    """
+    trace = trace_id(handler)
+    if not trace:
+        return {}
+
+    return {TRACE_HEADER: trace, PARENT_HEADER: span_id(handler)}
+
+
+def log_span(handler, node):
+    """
+    Log a finished request if it belongs to a trace.
+    """
+    trace = trace_id(handler)
+    if not trace:
+        return
+
+    seconds = handler.request.request_time()
+    trace_log.info(
+        "trace=%s span=%s parent=%s node=%s handler=%s start=%.6f "
+        "seconds=%.6f status=%d",
+        trace, span_id(handler),
+        handler.request.headers.get(PARENT_HEADER, '-'), node,
+        type(handler).__name__, time.time() - seconds, seconds,
+        handler.get_status()
+    )
+
+
+def log_phase(trace, node, phase, start, end):
+    """
+    Log a part of a job that is not a request, e.g. a phase of the job on
+    the master node.
+    """
+    trace_log.info(
+        "trace=%s span=%s parent=- node=%s handler=%s start=%.6f "
+        "seconds=%.6f status=200",
+        trace, uuid4().hex[:16], node, phase, start, end - start
+    )
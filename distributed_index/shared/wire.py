@@ -0,0 +1,237 @@
+"""
+Compact binary format to send inverted indices between nodes.
+
+Layout (all integers are unsigned LEB128 varints):
+
+    magic
+    number of terms, then each term as length + UTF-8 bytes
+    number of fields, then for each field:
+        name
+        number of analyzers, then for each analyzer:
+            name
+            length of the block in bytes
+            block: number of entries, their term ids, their postings
+                   lengths and finally all postings, delta-encoded per list
+
+Every term is stored only once, no matter in how many fields and analyzers
+it occurs. Document ids must not be negative.
+"""
+import json
+
+import numpy as np
+
+from distributed_index.shared.postings import POSTINGS_DTYPE
+
+CONTENT_TYPE = 'application/x-inverted-index'
+
+MAGIC = b'DIX\x01'
+
+# Header of the responses to merge requests with the number of bytes of the
+# partial indices the node received from the other nodes.
+SHUFFLED_BYTES_HEADER = 'X-Shuffled-Bytes'
+
+
+def varint_lengths(values):
+    """
+    Number of bytes needed to encode each value as a varint (7 bits per
+    byte).
+    """
+    values = np.asarray(values, dtype=np.uint64)
+
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+
+    return lengths
+
+
+def encode_varints(values):
+    """
+    Encode an array of non-negative integers as varints.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = varint_lengths(values)
+
+    offsets = np.cumsum(lengths) - lengths
+    encoded = np.empty(int(lengths.sum()), dtype=np.uint8)
+
+    for i in range(int(lengths.max()) if len(values) else 0):
+        selected = lengths > i
+        payload = (values[selected] >> np.uint64(7 * i)) & np.uint64(0x7f)
+        more = (lengths[selected] > i + 1).astype(np.uint64) << np.uint64(7)
+        encoded[offsets[selected] + i] = payload | more
+
+    return encoded.tobytes()
+
+
+def decode_varints(data):
+    """
+    Decode a byte string of varints into an array of integers.
+    """
+    data = np.frombuffer(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # Position of each byte within its value
+    positions = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7f).astype(np.uint64) << \
+        (np.uint64(7) * positions.astype(np.uint64))
+
+    return np.add.reduceat(parts, starts)
+
+
+def delta_encode(postings):
+    """
+    Concatenate the given postings lists and delta-encode them, restarting
+    at the first entry of each list. Returns the deltas and the lengths of
+    the lists.
+    """
+    postings = list(postings)
+    lengths = np.array([len(p) for p in postings], dtype=np.int64)
+    doc_ids = np.concatenate(
+        [np.zeros(0, dtype=np.int64)] +
+        [np.asarray(p, dtype=np.int64) for p in postings]
+    )
+
+    deltas = np.diff(doc_ids, prepend=0)
+    starts = (np.cumsum(lengths) - lengths)[lengths > 0]
+    deltas[starts] = doc_ids[starts]
+
+    return deltas, lengths
+
+
+def _encode_varint(value):
+    return encode_varints([value])
+
+
+def _encode_string(text):
+    data = text.encode('utf-8')
+    return _encode_varint(len(data)) + data
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def varint(self):
+        value = shift = 0
+        while True:
+            byte = self.data[self.offset]
+            self.offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def bytes(self, length):
+        data = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return data
+
+    def string(self):
+        return bytes(self.bytes(self.varint())).decode('utf-8')
+
+
+def encode_index(inverted_index):
+    """
+    Encode an inverted index (field -> analyzer -> term -> postings).
+    """
+    term_ids = {}
+    for analyzers in inverted_index.values():
+        for index in analyzers.values():
+            for term in index:
+                term_ids.setdefault(term, len(term_ids))
+
+    parts = [MAGIC, _encode_varint(len(term_ids))]
+    parts.extend(_encode_string(term) for term in term_ids)
+
+    parts.append(_encode_varint(len(inverted_index)))
+    for field, analyzers in inverted_index.items():
+        parts.append(_encode_string(field))
+        parts.append(_encode_varint(len(analyzers)))
+
+        for analyzer, index in analyzers.items():
+            # Delta-encode all lists at once
+            deltas, lengths = delta_encode(index.values())
+            header = np.concatenate([
+                [len(index)], [term_ids[term] for term in index], lengths
+            ]).astype(np.int64)
+
+            block = encode_varints(np.concatenate([header, deltas]))
+
+            parts.append(_encode_string(analyzer))
+            parts.append(_encode_varint(len(block)))
+            parts.append(block)
+
+    return b''.join(parts)
+
+
+def decode_index(data):
+    """
+    Decode an inverted index that was encoded with `encode_index`. The
+    postings are returned as arrays.
+    """
+    data = memoryview(data)
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not an encoded inverted index.")
+
+    reader = _Reader(data)
+    reader.offset = len(MAGIC)
+
+    terms = [reader.string() for _ in range(reader.varint())]
+
+    inverted_index = {}
+    for _ in range(reader.varint()):
+        field = reader.string()
+        inverted_index[field] = {}
+
+        for _ in range(reader.varint()):
+            analyzer = reader.string()
+            values = decode_varints(reader.bytes(reader.varint()))
+
+            size = int(values[0])
+            ids = values[1:size + 1]
+            lengths = values[size + 1:2 * size + 1].astype(np.int64)
+            deltas = values[2 * size + 1:].astype(POSTINGS_DTYPE)
+
+            # Undo the delta encoding for all lists at once
+            doc_ids = np.cumsum(deltas)
+            starts = np.cumsum(lengths) - lengths
+            before = np.concatenate(([0], doc_ids))[starts]
+            doc_ids -= np.repeat(before, lengths)
+
+            inverted_index[field][analyzer] = {
+                terms[term_id]: postings for term_id, postings in zip(
+                    ids.tolist(), np.split(doc_ids, starts[1:]))
+            }
+
+    return inverted_index
+
+
+def accept(wire_format):
+    """
+    Value of the Accept header to request inverted indices in the given wire
+    format ('binary' or 'json').
+    """
+    if wire_format == 'binary':
+        return f"{CONTENT_TYPE}, application/json;q=0.5"
+
+    return 'application/json'
+
+
+def loads(response):
+    """
+    Parse the body of an HTTP response that contains an inverted index,
+    either in the binary format or as JSON.
+    """
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.startswith(CONTENT_TYPE):
+        return decode_index(response.body)
+
+    return json.loads(response.body)
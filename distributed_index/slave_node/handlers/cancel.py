@@ -0,0 +1,42 @@
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.decorators import consumes
+from supercell.mediatypes import Return
+
+from distributed_index.slave_node.models import CancelRequest, \
+    CancelResponse
+
+
+@consumes('application/json', model=CancelRequest)
+@provides('application/json', default=True)
+class CancelHandler(RequestHandler):
+    """
+    Handler for /api/index/cancel
+
+    Removes the documents of an index request from the index again, because
+    another node indexed the same chunk first. If the request did not
+    arrive yet, its documents are not indexed when it does.
+
+    The response is sent once the request is not running any more, so that
+    the master does not merge the index of this node before.
+    """
+
+    @async
+    def post(self, model=None):
+        index_container = self.environment.index_container
+
+        # Wait for the index requests that are running, see /api/index
+        with (yield index_container['lock'].acquire()):
+            doc_ids = index_container['tasks'].pop(model.task, None)
+
+            if doc_ids is None:
+                index_container['cancelled'].add(model.task)
+            else:
+                # Removing the documents touches the whole vocabulary
+                yield self.environment.merge_executor.submit(
+                    index_container['index'].delete, doc_ids)
+
+        response = CancelResponse({"success": True})
+        response.validate()
+        raise Return(response)
@@ -4,6 +4,8 @@ from supercell.api import provides
 from supercell.mediatypes import Return
 
 from distributed_index.shared.models import NodeHealth
+from distributed_index.shared.process import proportional_memory, \
+    resident_memory
 
 
 @provides('application/json', default=True)
@@ -15,7 +17,10 @@ class HealthHandler(RequestHandler):
         response = NodeHealth(
             {
                 "health": "green",
-                "node_name": self.config.node_name
+                "node_name": self.config.node_name,
+                "startup_time": self.environment.startup_time,
+                "resident_memory": resident_memory(),
+                "proportional_memory": proportional_memory()
             }
         )
 
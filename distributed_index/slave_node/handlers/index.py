@@ -1,11 +1,22 @@
+import json
+from urllib.parse import urlencode
+
 from supercell.api import RequestHandler
 from supercell.api import async
 from supercell.api import provides
 from supercell.decorators import consumes
-from supercell.mediatypes import Return
+from supercell.mediatypes import Return, Error
+from tornado import gen
+from tornado.httpclient import HTTPRequest
 
+from distributed_index.shared import tracing, wire
 from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.metrics import record_index
+from distributed_index.shared.partitioning import HashRing
+from distributed_index.slave_node.handlers.shuffle import receive
 from distributed_index.slave_node.models import IndexRequest, IndexResponse
+from distributed_index.slave_node.tasks import store_index
+from distributed_index.slave_node.workers import index_documents
 
 
 @consumes('application/json', model=IndexRequest)
@@ -20,17 +31,135 @@ class IndexHandler(RequestHandler):
 
         documents = [doc.serialize() for doc in model.documents]
 
-        # Create a new inverted index for the documents this node is
-        # assigned to.
-        inverted_index = InvertedIndex(nlp)
-        inverted_index.index(documents)
+        if model.task in index_container['cancelled']:
+            # Another node indexed these documents first, see
+            # /api/index/cancel.
+            documents = []
+
+        settings = {
+            "batch_size": self.config.nlp_batch_size,
+            "n_process": self.config.nlp_n_process,
+            "scoring": model.scoring,
+            "positional": model.positions
+        }
+
+        # The words are assigned to their partitions while indexing.
+        ring = None
+        if model.push:
+            ring = HashRing([node.name for node in model.push])
+        elif model.ring:
+            ring = HashRing(model.ring)
+
+        # Index the documents in a worker process, so that this node keeps
+        # answering requests in the meantime.
+        future = self.environment.index_executor.submit(
+            index_documents, documents, ring=ring, **settings)
+
+        if model.push:
+            inverted_index = yield future
+            record_index(self.environment.metrics, inverted_index.stats)
+
+            # Send the words to their owners instead of keeping them, the
+            # master does not need to know them.
+            success = yield self.push(inverted_index, model)
+            if not success:
+                raise Error(500, additional={
+                    "message": "Error pushing partial indices."
+                })
+
+            words = []
+        else:
+            # The documents of several requests are indexed in parallel, but
+            # added to the stored index in the order the requests arrived.
+            with (yield index_container['lock'].acquire()):
+                inverted_index = yield future
+                inverted_index.nlp = nlp
+                record_index(self.environment.metrics, inverted_index.stats)
+
+                stored = store_index(
+                    index_container, inverted_index, model.task,
+                    [int(doc['id']) for doc in documents], model.append)
+
+                if not stored:
+                    # The request was cancelled while it was indexed, the
+                    # node keeps the index it had.
+                    documents = []
+                    inverted_index = InvertedIndex(nlp, **settings)
+
+            words = inverted_index.words()
 
-        # Store the created index in memory to keep it for future requests.
-        index_container['index'] = inverted_index
+        field_lengths = None
+        if inverted_index.scoring:
+            field_lengths = {
+                field: {
+                    str(doc['id']): lengths[doc['id']]
+                    for doc in documents
+                }
+                for field, lengths in inverted_index.field_lengths.items()
+            }
 
         response = IndexResponse({
             "success": True,
-            "words": inverted_index.words()
+            "words": list(words),
+            "field_lengths": field_lengths
         })
         response.validate()
         raise Return(response)
+
+    @gen.coroutine
+    def push(self, inverted_index, model):
+        """
+        Send each partition of the index to the node that owns its words.
+        Returns whether all nodes received them.
+        """
+        arguments = urlencode({
+            "job": model.job,
+            "scoring": json.dumps(inverted_index.scoring),
+            "positional": json.dumps(inverted_index.positional)
+        })
+
+        requests = []
+        for i, node in enumerate(model.push):
+            partition = inverted_index.create_partition(i)
+            if not any(index for analyzers in partition.values()
+                       for index in analyzers.values()):
+                continue
+
+            if node.name == self.config.node_name:
+                receive(
+                    self.environment.index_container,
+                    self.environment.nlp,
+                    model.job,
+                    partition,
+                    scoring=inverted_index.scoring,
+                    positional=inverted_index.positional
+                )
+                continue
+
+            if self.config.wire_format == 'binary':
+                body = wire.encode_index(partition)
+                content_type = wire.CONTENT_TYPE
+            else:
+                body = json.dumps(InvertedIndex.serialize(partition))
+                content_type = 'application/json'
+
+            # The requests are part of the trace of this one
+            headers = {'content-type': content_type}
+            headers.update(tracing.headers(self))
+
+            requests.append(HTTPRequest(
+                f"http://{self.config.address}:{node.port}/api/shuffle"
+                f"?{arguments}",
+                method="POST",
+                body=body,
+                headers=headers,
+                request_timeout=3600
+            ))
+
+        responses = yield [
+            self.environment.http_client.fetch(request, raise_error=False)
+            for request in requests
+        ]
+
+        raise gen.Return(
+            all([response.code == 200 for response in responses]))
@@ -1,4 +1,5 @@
 import json
+import time
 
 from supercell.api import RequestHandler
 from supercell.api import async
@@ -7,66 +8,141 @@ from supercell.decorators import consumes
 from supercell.mediatypes import Return, Error
 from tornado.httpclient import HTTPRequest
 
+from distributed_index.shared import tracing, wire
 from distributed_index.shared.inverted_index import InvertedIndex
-from distributed_index.shared.models import InvertedIndexModel
+from distributed_index.shared.metrics import record_stage
+from distributed_index.shared.providers import InvertedIndexProvider, \
+    provide_index
+from distributed_index.shared.segmented_index import SegmentedIndex
 from distributed_index.slave_node.models import MergeRequest
 
 
 @consumes('application/json', model=MergeRequest)
 @provides('application/json', default=True)
+@provides(InvertedIndexProvider.CONTENT_TYPE.content_type)
 class MergeHandler(RequestHandler):
     """Handler for /api/merge"""
 
     @async
     def post(self, model=None):
         # Performs the merge stage. Receives a list of words that the node is
-        # responsible for and a list of other nodes to call.
+        # responsible for and a list of other nodes to call, or the job for
+        # which the other nodes pushed the words to this node.
         index_container = self.environment.index_container
         http_client = self.environment.http_client
         nlp = self.environment.nlp
 
-        words = model.words
-        nodes = model.nodes
-        index = index_container['index']
-
-        if not index:
-            raise Error(500, additional={
-                "message": "Index must be created first."
-            })
-
-        # Retrieve a partial index from all other nodes that contains only
-        # the words this node is assigned to.
-        requests = [
-            HTTPRequest(
-                f"http://{self.config.address}:{node['port']}"
-                f"/api/partial_index",
-                method="POST",
-                body=json.dumps({"words": words}),
-                headers={'content-type': 'application/json'},
-                request_timeout=3600
-            ) for node in nodes
-        ]
-
-        responses_raw = yield [
-            http_client.fetch(request) for request in requests
-        ]
-
-        # Check that all requests were successful
-        if not all([response.code == 200 for response in responses_raw]):
-            raise Error(500, additional={
-                "message": "Error creating partial index."
-            })
-
-        # Merge all the partial indices
-        partial_indices = [
-            json.loads(response.body) for response in responses_raw
-        ]
-        local_partial_index = index.create_partial_index(words)
-        partial_indices.append(local_partial_index)
-
-        merged_index = InvertedIndex.merge(nlp, *partial_indices)
-
-        # Return the merged index
-        response = InvertedIndexModel(merged_index.inverted_index)
-        response.validate()
-        raise Return(response)
+        if model.job is not None:
+            # The other nodes pushed the words this node owns to it while
+            # they indexed their documents, see /api/shuffle.
+            # Other jobs may already have pushed words as well, so only
+            # the ones of this job are taken.
+            merged_index = index_container['received'].pop(model.job, None)
+            if merged_index is None:
+                merged_index = InvertedIndex(
+                    nlp, scoring=model.scoring, positional=model.positions)
+            shuffled_bytes = \
+                index_container['received_bytes'].pop(model.job, 0)
+        else:
+            words = model.words
+            nodes = model.nodes
+            index = index_container['index']
+
+            if not index:
+                raise Error(500, additional={
+                    "message": "Index must be created first."
+                })
+
+            # Retrieve a partial index from all other nodes that contains
+            # only the words this node is assigned to. If the indices are
+            # partitioned, it is enough to ask for the partition instead of
+            # sending the words.
+            if model.partition is not None:
+                payload = {"partition": model.partition}
+            else:
+                payload = {"words": words}
+
+            # The requests are part of the trace of this one
+            headers = {
+                'content-type': 'application/json',
+                'accept': wire.accept(self.config.wire_format)
+            }
+            headers.update(tracing.headers(self))
+
+            requests = [
+                HTTPRequest(
+                    f"http://{self.config.address}:{node['port']}"
+                    f"/api/partial_index",
+                    method="POST",
+                    body=json.dumps(payload),
+                    headers=headers,
+                    request_timeout=3600
+                ) for node in nodes
+            ]
+
+            responses_raw = yield [
+                http_client.fetch(request) for request in requests
+            ]
+
+            # Check that all requests were successful
+            if not all([response.code == 200 for response in responses_raw]):
+                raise Error(500, additional={
+                    "message": "Error creating partial index."
+                })
+
+            # Merge all the partial indices
+            shuffled_bytes = sum(
+                len(response.body) for response in responses_raw)
+            partial_indices = [
+                wire.loads(response) for response in responses_raw
+            ]
+            if model.partition is not None and index.ring is not None:
+                local_partial_index = index.create_partition(model.partition)
+            else:
+                local_partial_index = index.create_partial_index(words)
+            partial_indices.append(local_partial_index)
+
+            # The postings are merged in a thread, so that this node keeps
+            # answering requests in the meantime.
+            t0 = time.perf_counter()
+            merged_index = yield self.environment.merge_executor.submit(
+                InvertedIndex.merge, nlp, *partial_indices,
+                scoring=index.scoring, positional=index.positional)
+            record_stage(self.environment.metrics, 'merge',
+                         time.perf_counter() - t0)
+
+        # Keep the merged index as the shard of the words this node owns,
+        # so that it can be searched later. Updates are added as a new
+        # segment of the shard.
+        shard = index_container['shard']
+        if not model.append or not shard:
+            shard = SegmentedIndex(
+                scoring=merged_index.scoring,
+                positional=merged_index.positional)
+
+        shard.delete(model.delete)
+        shard.add_segment(merged_index)
+        index_container['shard'] = shard
+
+        # Write the snapshot of the shard before answering, so that the
+        # shards are on disk by the time the master takes its snapshot.
+        snapshot = self.environment.snapshot
+        if snapshot is not None:
+            t0 = time.perf_counter()
+            yield self.environment.merge_executor.submit(
+                snapshot.write, snapshot.state(shard))
+            record_stage(self.environment.metrics, 'snapshot',
+                         time.perf_counter() - t0)
+
+        self.set_header(wire.SHUFFLED_BYTES_HEADER, str(shuffled_bytes))
+        self.environment.metrics.counter(
+            'shuffled_bytes_total',
+            "Bytes of partial indices received from other nodes."
+        ).inc(shuffled_bytes)
+
+        # Return the merged index (or an empty one if it is not needed)
+        if model.return_index:
+            raise Return(provide_index(self, merged_index.inverted_index))
+
+        raise Return(
+            provide_index(self, merged_index.create_partial_index([])))
@@ -0,0 +1,24 @@
+from supercell.api import RequestHandler
+from supercell.api import async
+
+from distributed_index.shared import metrics as metrics_
+from distributed_index.shared.metrics import record_process
+
+
+class MetricsHandler(RequestHandler):
+    """Handler for /api/metrics"""
+
+    @async
+    def get(self):
+        # The metrics are written as text for Prometheus instead of being
+        # returned as a model.
+        metrics = self.environment.metrics
+        record_process(metrics)
+
+        shard = self.environment.index_container['shard']
+        metrics.gauge(
+            'shard_segments', "Segments of the shard of this node."
+        ).set(len(shard.segments) if shard else 0)
+
+        self.set_header('Content-Type', metrics_.CONTENT_TYPE)
+        self.write(metrics.render())
@@ -4,19 +4,22 @@ from supercell.api import provides
 from supercell.decorators import consumes
 from supercell.mediatypes import Return, Error
 
-from distributed_index.shared.models import InvertedIndexModel
+from distributed_index.shared.providers import InvertedIndexProvider, \
+    provide_index
 from distributed_index.slave_node.models import PartialIndexRequest
 
 
 @consumes('application/json', model=PartialIndexRequest)
 @provides('application/json', default=True)
+@provides(InvertedIndexProvider.CONTENT_TYPE.content_type)
 class PartialIndexHandler(RequestHandler):
     """Handler for /api/partial_index"""
 
     @async
     def post(self, model=None):
         # Create a partial index that contains only entries for the words
-        # that are passed to the function.
+        # that are passed to the function, or return the requested partition
+        # if the index was partitioned when it was created.
 
         index_container = self.environment.index_container
         index = index_container['index']
@@ -26,8 +29,14 @@ class PartialIndexHandler(RequestHandler):
                 "message": "Index must be created first."
             })
 
-        partial_index = index.create_partial_index(model.words)
+        if model.partition is not None:
+            if index.ring is None:
+                raise Error(500, additional={
+                    "message": "Index is not partitioned."
+                })
 
-        response = InvertedIndexModel(partial_index)
-        response.validate()
-        raise Return(response)
+            partial_index = index.create_partition(model.partition)
+        else:
+            partial_index = index.create_partial_index(model.words or [])
+
+        raise Return(provide_index(self, partial_index))
@@ -0,0 +1,31 @@
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.decorators import consumes
+from supercell.mediatypes import Return, Error
+
+from distributed_index.shared.providers import InvertedIndexProvider, \
+    provide_index
+from distributed_index.slave_node.models import PostingsRequest
+
+
+@consumes('application/json', model=PostingsRequest)
+@provides('application/json', default=True)
+@provides(InvertedIndexProvider.CONTENT_TYPE.content_type)
+class PostingsHandler(RequestHandler):
+    """Handler for /api/postings"""
+
+    @async
+    def post(self, model=None):
+        # Return the postings of the given words from the shard of words
+        # this node owns since the last merge.
+        shard = self.environment.index_container['shard']
+
+        if not shard:
+            raise Error(500, additional={
+                "message": "Index must be merged first."
+            })
+
+        partial_index = shard.create_partial_index(model.words)
+
+        raise Return(provide_index(self, partial_index))
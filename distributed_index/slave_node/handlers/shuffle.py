@@ -0,0 +1,67 @@
+from supercell.api import RequestHandler
+from supercell.api import async
+from supercell.api import provides
+from supercell.decorators import consumes
+from supercell.mediatypes import Return
+
+from distributed_index.shared.consumers import InvertedIndexConsumer
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.models import InvertedIndexModel
+from distributed_index.slave_node.models import ShuffleResponse
+
+
+def receive(index_container, nlp, job, partial_index, scoring=False,
+            positional=False):
+    """
+    Add a partial index that was pushed to this node for the given job to
+    the ones that were received before. They contain different documents,
+    so merging them right away only touches the postings of their words.
+    """
+    received = index_container['received']
+
+    if job not in received:
+        fields = list(partial_index.keys())
+        analyzers = list(partial_index[fields[0]].keys())
+        received[job] = InvertedIndex(
+            nlp, fields, analyzers, scoring=scoring, positional=positional)
+
+    received[job].update(partial_index)
+
+
+@consumes('application/json', model=InvertedIndexModel)
+@consumes(InvertedIndexConsumer.CONTENT_TYPE.content_type,
+          model=InvertedIndexModel)
+@provides('application/json', default=True)
+class ShuffleHandler(RequestHandler):
+    """
+    Handler for /api/shuffle
+
+    Receives the partition of the words this node owns from the index that
+    another node created. The query arguments name the job and the settings
+    of the index.
+    """
+
+    @async
+    def post(self, model=None):
+        # The binary consumer passes the decoded index instead of a model.
+        if not isinstance(model, dict):
+            model = model.to_primitive()
+
+        # Count the bytes for the statistics of the merge
+        received_bytes = self.environment.index_container['received_bytes']
+        job = self.get_argument('job')
+        received_bytes[job] = \
+            received_bytes.get(job, 0) + len(self.request.body)
+
+        receive(
+            self.environment.index_container,
+            self.environment.nlp,
+            job,
+            model,
+            scoring=self.get_argument('scoring', 'false') == 'true',
+            positional=self.get_argument('positional', 'false') == 'true'
+        )
+
+        response = ShuffleResponse({"success": True})
+        response.validate()
+        raise Return(response)
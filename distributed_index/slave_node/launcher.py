@@ -0,0 +1,139 @@
+"""
+Starts several slave nodes that share one copy of the NLP models. The
+models are loaded once and the nodes are forked afterwards, so that they
+share the memory of the models (copy-on-write) and do not need to load them
+again. Nodes that exit are forked again, with a growing delay if they keep
+crashing right after they were started.
+
+Usage: start_slaves "<arguments of node 1>" "<arguments of node 2>" ...
+"""
+import logging
+import os
+import shlex
+import signal
+import sys
+import time
+import traceback
+
+from distributed_index import configuration
+from distributed_index.shared.process import proportional_memory, \
+    resident_memory
+from distributed_index.slave_node.service import SlaveNodeService, load_nlp
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before a node that exited is forked again. The delay
+# doubles with every further crash of the node, up to MAX_RESTART_DELAY,
+# and a node that crashed MAX_RESTARTS times in a row is not restarted.
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+MAX_RESTARTS = 10
+
+# Seconds a node must run before its exit does not count as a crash
+STABLE_SECONDS = 60
+
+# Seconds between checks for exited nodes while restarts are pending
+POLL_INTERVAL = 0.5
+
+
+def fork_node(arguments, nlp):
+    """
+    Fork a process that runs a slave node with the given command line
+    arguments and the loaded NLP models. Returns its pid.
+    """
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # The node handles the signals itself
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    code = 0
+    try:
+        sys.argv = [sys.argv[0]] + shlex.split(arguments)
+        SlaveNodeService.nlp = nlp
+        SlaveNodeService().main()
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        # Never return to the loop of the launcher
+        os._exit(code)
+
+
+def start_api():
+    """
+    Entry point to run the slave nodes.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    # The nodes share the engine of the configuration, see `load_nlp`
+    t0 = time.time()
+    nlp = load_nlp(configuration['slave']['nlp_engine'],
+                   configuration['slave']['lemma_table'],
+                   configuration['slave']['stop_words'],
+                   configuration['slave']['allow_missing_lemmas'])
+    logger.info(
+        f"Loaded the NLP models in {time.time() - t0:.1f}s, resident "
+        f"memory {(resident_memory() or 0) / 1024 ** 2:.0f} MB, "
+        f"proportional memory "
+        f"{(proportional_memory() or 0) / 1024 ** 2:.0f} MB."
+    )
+
+    # The arguments and start time of the node of each pid, the number of
+    # crashes in a row of each node and the pending restarts as tuples of
+    # their time and the arguments of the node.
+    nodes = {}
+    crashes = {}
+    restarts = []
+
+    def start(arguments):
+        nodes[fork_node(arguments, nlp)] = (arguments, time.time())
+
+    for arguments in sys.argv[1:]:
+        start(arguments)
+
+    def stop(signum, frame):
+        for pid in nodes:
+            os.kill(pid, signal.SIGTERM)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+
+    while nodes or restarts:
+        for restart in [restart for restart in restarts
+                        if restart[0] <= time.time()]:
+            restarts.remove(restart)
+            start(restart[1])
+
+        if not restarts:
+            pid, status = os.wait()
+        elif nodes:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        else:
+            pid, status = 0, 0
+
+        if not pid:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        if pid not in nodes:
+            continue
+
+        arguments, started = nodes.pop(pid)
+        if time.time() - started >= STABLE_SECONDS:
+            crashes[arguments] = 0
+        crashes[arguments] = crashes.get(arguments, 0) + 1
+
+        if crashes[arguments] > MAX_RESTARTS:
+            logger.error(
+                f"Node '{arguments}' exited with status {status} after "
+                f"{MAX_RESTARTS} restarts, giving up.")
+            continue
+
+        delay = min(RESTART_DELAY * 2 ** (crashes[arguments] - 1),
+                    MAX_RESTART_DELAY)
+        logger.warning(
+            f"Node '{arguments}' exited with status {status}, restarting it "
+            f"in {delay}s.")
+        restarts.append((time.time() + delay, arguments))
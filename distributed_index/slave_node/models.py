@@ -1,28 +1,77 @@
 from schematics.models import Model
 from schematics.types import StringType, BooleanType, IntType
-from schematics.types.compound import ModelType, ListType
+from schematics.types.compound import ModelType, ListType, DictType
 
 from distributed_index.shared.models import Document
 
 
+class NodeModel(Model):
+    name = StringType(required=True)
+    port = IntType(required=True)
+
+
 class IndexRequest(Model):
     documents = ListType(ModelType(Document), required=True)
+    # If set, the index is split into partitions of the words owned by each
+    # of these nodes (see `HashRing`) right after it was created.
+    ring = ListType(StringType())
+    # Add the documents to the existing index instead of replacing it.
+    append = BooleanType(default=False)
+    # Keep term frequencies and field lengths for ranked retrieval.
+    scoring = BooleanType(default=False)
+    # Keep the positions of the terms for phrase queries.
+    positions = BooleanType(default=False)
+    # If set, the index of the documents is not kept but partitioned by the
+    # owners of the words and pushed to them right away, see /api/shuffle.
+    push = ListType(ModelType(NodeModel))
+    job = StringType()
+    # Id of the chunk of documents, so that the master can cancel the
+    # request if another node indexed the same chunk first.
+    task = StringType()
 
 
 class IndexResponse(Model):
     success = BooleanType(required=True)
     words = ListType(StringType(), required=True)
-
-
-class NodeModel(Model):
-    name = StringType(required=True)
-    port = IntType(required=True)
+    # field -> doc id -> number of tokens, only in scoring mode.
+    field_lengths = DictType(
+        DictType(IntType()), serialize_when_none=False)
 
 
 class MergeRequest(Model):
     nodes = ListType(ModelType(NodeModel), required=True)
     words = ListType(StringType, required=True)
+    partition = IntType()
+    return_index = BooleanType(default=True)
+    # Add the merged index to the shard as a new segment instead of
+    # replacing it, after deleting the given documents from the shard.
+    append = BooleanType(default=False)
+    delete = ListType(IntType(), default=[])
+    # Merge the partial indices that were pushed to this node for this job
+    # instead of requesting them from the other nodes.
+    job = StringType()
+    # Settings of the index, for a node that did not receive any words.
+    scoring = BooleanType(default=False)
+    positions = BooleanType(default=False)
 
 
-class PartialIndexRequest(Model):
+class CancelRequest(Model):
+    task = StringType(required=True)
+
+
+class CancelResponse(Model):
+    success = BooleanType(required=True)
+
+
+class PostingsRequest(Model):
     words = ListType(StringType(), required=True)
+
+
+class PartialIndexRequest(Model):
+    # Either the words to include or the partition of a partitioned index.
+    words = ListType(StringType())
+    partition = IntType()
+
+
+class ShuffleResponse(Model):
+    success = BooleanType(required=True)
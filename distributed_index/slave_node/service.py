@@ -1,22 +1,92 @@
+import os
+import time
+
 import spacy
 from supercell.service import Service
+from tornado import gen
 from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import PeriodicCallback
+from tornado.locks import Lock
 from tornado.options import define
 
 from distributed_index import configuration
+from distributed_index.shared.analysis_cache import AnalysisCache
+from distributed_index.shared.fast_nlp import FastNLP, load_lemmas, \
+    load_stop_words
+from distributed_index.shared.metrics import ByteCounter, Metrics, \
+    request_logger
+from distributed_index.shared.process import proportional_memory, \
+    resident_memory, uptime
+from distributed_index.shared.snapshots import ShardSnapshot
+from distributed_index.slave_node.handlers.cancel import CancelHandler
 from distributed_index.slave_node.handlers.health import HealthHandler
 from distributed_index.slave_node.handlers.index import IndexHandler
 from distributed_index.slave_node.handlers.merge import MergeHandler
+from distributed_index.slave_node.handlers.metrics import MetricsHandler
 from distributed_index.slave_node.handlers.partial_index import \
     PartialIndexHandler
+from distributed_index.slave_node.handlers.postings import PostingsHandler
+from distributed_index.slave_node.handlers.shuffle import ShuffleHandler
+from distributed_index.slave_node.workers import create_index_executor, \
+    create_merge_executor
 
 # Register a custom command line argument to set the name of this node.
 define('node_name', type=str, help="Name of the slave node.")
+define('nlp_engine', type=str,
+       help="Engine that analyzes the texts: spacy or fast.")
+define('lemma_table', type=str,
+       help="Lookup table of lemmas of the fast engine (empty for spaCy's).")
+define('allow_missing_lemmas', type=bool,
+       help="Run the fast engine without lemmas if the table is missing.")
+define('stop_words', type=str,
+       help="File of stop words of the fast engine (empty for spaCy's).")
+define('nlp_batch_size', type=int,
+       help="Number of texts spaCy analyzes per batch (0 disables batching).")
+define('nlp_n_process', type=int,
+       help="Number of processes spaCy uses to analyze a batch.")
+define('wire_format', type=str,
+       help="Format to request indices from other nodes: binary or json.")
+define('index_processes', type=int,
+       help="Number of worker processes that index documents.")
+define('merge_threads', type=int,
+       help="Number of threads that merge indices.")
+define('analysis_cache', type=str,
+       help="Path of the cache of analyzed texts (empty to disable it).")
+define('analysis_cache_size', type=int,
+       help="Number of analyzed texts to keep in the cache.")
+define('compaction_interval', type=int,
+       help="Seconds between checks whether the shard must be compacted "
+            "(0 disables the compaction).")
+define('max_segments', type=int,
+       help="Number of segments of the shard that triggers a compaction.")
+define('snapshots', type=str,
+       help="Directory of the snapshots of the shard (empty to disable "
+            "them).")
+
+
+def load_nlp(engine='spacy', lemma_table=None, stop_words=None,
+             allow_missing_lemmas=False):
+    """
+    Load the spaCy NLP models, or create the fast engine with the given
+    files of lemmas and stop words, see `FastNLP` and `load_lemmas`.
+    """
+    if engine == 'fast':
+        return FastNLP(load_lemmas(lemma_table, allow_missing_lemmas),
+                       load_stop_words(stop_words))
+
+    if engine != 'spacy':
+        raise ValueError(f"Unknown NLP engine '{engine}'.")
+
+    return spacy.load('en', disable=['parser', 'ner'])
 
 
 class SlaveNodeService(Service):
     """The main service of the supercell application"""
 
+    # NLP models that were loaded before this process was forked, see
+    # `launcher`. Otherwise, each node loads them itself.
+    nlp = None
+
     def bootstrap(self):
         """
         Set custom options.
@@ -25,6 +95,97 @@ class SlaveNodeService(Service):
         if not self.config['address']:
             self.config['address'] = configuration['master']['host']
 
+        if not self.config['nlp_engine']:
+            self.config['nlp_engine'] = configuration['slave']['nlp_engine']
+
+        if self.config['lemma_table'] is None:
+            self.config['lemma_table'] = configuration['slave']['lemma_table']
+
+        if self.config['allow_missing_lemmas'] is None:
+            self.config['allow_missing_lemmas'] = \
+                configuration['slave']['allow_missing_lemmas']
+
+        if self.config['stop_words'] is None:
+            self.config['stop_words'] = configuration['slave']['stop_words']
+
+        if self.config['nlp_batch_size'] is None:
+            self.config['nlp_batch_size'] = \
+                configuration['slave']['nlp_batch_size']
+
+        if not self.config['nlp_n_process']:
+            self.config['nlp_n_process'] = \
+                configuration['slave']['nlp_n_process']
+
+        if not self.config['wire_format']:
+            self.config['wire_format'] = configuration['slave']['wire_format']
+
+        if not self.config['index_processes']:
+            self.config['index_processes'] = \
+                configuration['slave']['index_processes']
+
+        if not self.config['merge_threads']:
+            self.config['merge_threads'] = \
+                configuration['slave']['merge_threads']
+
+        if self.config['analysis_cache'] is None:
+            self.config['analysis_cache'] = \
+                configuration['slave']['analysis_cache']
+
+        if not self.config['analysis_cache_size']:
+            self.config['analysis_cache_size'] = \
+                configuration['slave']['analysis_cache_size']
+
+        if self.config['compaction_interval'] is None:
+            self.config['compaction_interval'] = \
+                configuration['slave']['compaction_interval']
+
+        if self.config['compaction_interval'] < 0:
+            raise ValueError("The compaction interval must not be negative.")
+
+        if not self.config['max_segments']:
+            self.config['max_segments'] = \
+                configuration['slave']['max_segments']
+
+        if self.config['snapshots'] is None:
+            self.config['snapshots'] = configuration['slave']['snapshots']
+
+    @gen.coroutine
+    def compact_shard(self):
+        """
+        Merge the segments of the shard once there are too many of them.
+        The segments are merged in a merge thread, so that the node keeps
+        answering requests, and replaced by the result afterwards.
+        """
+        index_container = self.environment.index_container
+        shard = index_container['shard']
+        if not shard or index_container['compacting'] or \
+                len(shard.segments) <= self.config.max_segments:
+            return
+
+        index_container['compacting'] = True
+        try:
+            segments = list(shard.segments)
+            tombstones = dict(shard.tombstones)
+            self.slog.info(f"Compacting {len(segments)} segments.")
+
+            merged_index = yield self.environment.merge_executor.submit(
+                shard.merge_segments, segments, tombstones)
+
+            # A new index replaced the shard in the meantime
+            if index_container['shard'] is not shard or \
+                    not shard.replace(segments, tombstones, merged_index):
+                self.slog.info("Discarding the compaction, the shard was "
+                               "replaced.")
+                return
+
+            # The segment files are written in a merge thread as well
+            snapshot = self.environment.snapshot
+            if snapshot is not None:
+                yield self.environment.merge_executor.submit(
+                    snapshot.write, snapshot.state(shard))
+        finally:
+            index_container['compacting'] = False
+
     def run(self):
         """
         Contains the main logic of the service, settings up handlers,
@@ -34,25 +195,111 @@ class SlaveNodeService(Service):
         http_client = AsyncHTTPClient(max_clients=100)
         self.environment.add_managed_object("http_client", http_client)
 
+        # The shard of the last snapshot of this node, so that it serves its
+        # words right away after a restart.
+        snapshot = None
+        shard = None
+        if self.config.snapshots:
+            snapshot = ShardSnapshot(
+                os.path.join(self.config.snapshots, self.config.node_name))
+
+            t0 = time.time()
+            shard = snapshot.load()
+            if shard is not None:
+                self.slog.info(
+                    f"Loaded {len(shard.segments)} segments of the shard "
+                    f"from '{snapshot.directory}' in "
+                    f"{time.time() - t0:.2f}s."
+                )
+        self.environment.add_managed_object("snapshot", snapshot)
+
         # Container to store the index in that this node is assigned to.
         # Note: This is the reason this api is *not* state-less.
-        self.environment.add_managed_object("index_container", {"index": None})
+        # The shard is the merged index of the words this node owns, and
+        # `received` holds the words that other nodes pushed to this node
+        # for each job (`received_bytes` their size). `tasks` holds the ids
+        # of the documents of each index request that can still be
+        # cancelled and `cancelled` the requests that were cancelled before
+        # they were done. `compacting` is set while the shard is compacted.
+        # The lock keeps index requests from changing the index at the same
+        # time.
+        self.environment.add_managed_object("index_container", {
+            "index": None,
+            "shard": shard,
+            "received": {},
+            "received_bytes": {},
+            "tasks": {},
+            "cancelled": set(),
+            "compacting": False,
+            "lock": Lock()
+        })
 
-        # Load the spaCy NLP models.
-        nlp = spacy.load('en', disable=['parser', 'ner'])
+        nlp = self.nlp
+        if nlp is None:
+            nlp = load_nlp(self.config.nlp_engine, self.config.lemma_table,
+                           self.config.stop_words,
+                           self.config.allow_missing_lemmas)
         self.environment.add_managed_object("nlp", nlp)
 
+        # Texts that were analyzed before (by any node) are not analyzed
+        # again.
+        cache = None
+        if self.config.analysis_cache:
+            cache = AnalysisCache(
+                self.config.analysis_cache, self.config.analysis_cache_size)
+
+        # Documents are indexed in worker processes and indices are merged in
+        # threads, so that the IO loop keeps answering requests. The worker
+        # processes are forked after the model was loaded to share it.
+        self.environment.add_managed_object(
+            "index_executor",
+            create_index_executor(nlp, self.config.index_processes, cache))
+        self.environment.add_managed_object(
+            "merge_executor",
+            create_merge_executor(self.config.merge_threads))
+
+        # Counters and timings reported by /api/metrics. Every request is
+        # counted, and logged as a span if it is part of a trace.
+        metrics = Metrics()
+        self.environment.add_managed_object("metrics", metrics)
+        self.environment.tornado_settings['log_function'] = \
+            request_logger(metrics, self.config.node_name)
+        self.environment.tornado_settings['transforms'] = [ByteCounter]
+
+        # Time it took to start the node, reported by /api/health
+        startup_time = uptime()
+        self.environment.add_managed_object("startup_time", startup_time)
+
         self.slog.info(
             f"Running Slave Node "
             f"('{self.config.node_name}') "
             f"on 'http://{self.config.address}:{self.config.port}'."
         )
+        if startup_time is not None:
+            self.slog.info(
+                f"Started in {startup_time:.1f}s, resident memory "
+                f"{(resident_memory() or 0) / 1024 ** 2:.0f} MB, "
+                f"proportional memory "
+                f"{(proportional_memory() or 0) / 1024 ** 2:.0f} MB."
+            )
 
         self.environment.add_handler(r"/api/health", HealthHandler, {})
         self.environment.add_handler(r"/api/index", IndexHandler, {})
+        self.environment.add_handler(r"/api/index/cancel", CancelHandler, {})
         self.environment.add_handler(r"/api/partial_index",
                                      PartialIndexHandler, {})
         self.environment.add_handler(r"/api/merge", MergeHandler, {})
+        self.environment.add_handler(r"/api/metrics", MetricsHandler, {})
+        self.environment.add_handler(r"/api/postings", PostingsHandler, {})
+        self.environment.add_handler(r"/api/shuffle", ShuffleHandler, {})
+
+        # Merge the segments that updates add to the shard in the background
+        if self.config.compaction_interval:
+            PeriodicCallback(
+                self.compact_shard, self.config.compaction_interval * 1000
+            ).start()
+        else:
+            self.slog.info("Compaction of the shard is disabled.")
 
 
 def start_api():
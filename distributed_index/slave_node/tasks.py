@@ -0,0 +1,35 @@
+"""
+Bookkeeping of the index requests of a slave node that the master node can
+cancel, because another node indexed the same chunk of documents first (see
+`Dispatcher`).
+"""
+
+
+def store_index(index_container, inverted_index, task=None, doc_ids=(),
+                append=False):
+    """
+    Store the index that a request created for the documents with the given
+    ids, or add it to the stored index with `append`. The ids are kept by
+    task, so that /api/index/cancel can remove the documents again.
+
+    A request that was cancelled in the meantime leaves the stored index as
+    it is, even if it would replace it. Returns whether the index was
+    stored.
+    """
+    if task in index_container['cancelled']:
+        index_container['cancelled'].discard(task)
+        return False
+
+    if append and index_container['index']:
+        # Add the documents to the index that is already stored.
+        index_container['index'].add(inverted_index)
+    else:
+        # Store the created index in memory to keep it for future requests.
+        index_container['index'] = inverted_index
+        index_container['tasks'] = {}
+
+    # Remember the documents of the request in case it is cancelled.
+    if task and doc_ids:
+        index_container['tasks'][task] = list(doc_ids)
+
+    return True
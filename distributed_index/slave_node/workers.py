@@ -0,0 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from distributed_index.shared.inverted_index import InvertedIndex
+
+# The NLP model of the worker processes. It is loaded before the workers are
+# forked, so that they share its memory instead of loading it again. Each
+# worker opens its own connection to the analysis cache.
+_nlp = None
+_cache = None
+
+
+def create_index_executor(nlp, processes, cache=None):
+    """
+    Create the pool of processes that index documents with the given
+    (loaded) NLP model and `AnalysisCache`.
+    """
+    global _nlp, _cache
+    _nlp = nlp
+    _cache = cache
+
+    # Fork all workers right away, while this process does not run any
+    # other threads yet.
+    executor = ProcessPoolExecutor(processes)
+    list(executor.map(int, range(processes)))
+
+    return executor
+
+
+def create_merge_executor(threads):
+    """
+    Create the pool of threads that merge indices. Indices are large, so
+    they are merged in threads to avoid copying them between processes.
+    """
+    return ThreadPoolExecutor(threads)
+
+
+def index_documents(documents, ring=None, **settings):
+    """
+    Index the given (serialized) documents in a worker process, partitioned
+    by the given `HashRing` if there is one. The created index is returned
+    without the NLP model.
+    """
+    inverted_index = InvertedIndex(_nlp, cache=_cache, **settings)
+    if ring:
+        inverted_index.partition(ring)
+
+    inverted_index.index(documents)
+
+    return inverted_index
@@ -11,7 +11,8 @@ setup(
     entry_points={
           'console_scripts': [
               'start_master = distributed_index.master_node.service:start_api',
-              'start_slave = distributed_index.slave_node.service:start_api'
+              'start_slave = distributed_index.slave_node.service:start_api',
+              'start_slaves = distributed_index.slave_node.launcher:start_api'
           ]
       }
 )
@@ -0,0 +1,121 @@
+from itertools import count
+
+from distributed_index.shared import analysis_cache
+from distributed_index.shared.analysis_cache import AnalysisCache, \
+    model_version
+from distributed_index.shared.fast_nlp import FastNLP
+from distributed_index.shared.inverted_index import InvertedIndex
+
+from benchmarks.stub import StubNLP
+
+
+class CountingNLP(StubNLP):
+    """
+    Counts the texts that are parsed.
+    """
+
+    def __init__(self, meta=None):
+        self.meta = meta
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+        return super().__call__(text)
+
+
+def entries(cache):
+    return cache.connection.execute(
+        "SELECT entries FROM analyses_count").fetchall()
+
+
+def test_get_and_flush(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+    cache = AnalysisCache(path)
+    cache.put('a', [[0, ["fox"]]])
+    assert cache.get('a') == [[0, ["fox"]]]
+    cache.flush()
+
+    # Another process sees the flushed entries
+    other = AnalysisCache(path)
+    assert other.get('a') == [[0, ["fox"]]]
+    assert other.get('b') is None
+    assert entries(other) == [(1,)]
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir, monkeypatch):
+    # Every flush happens at a later time
+    clock = count()
+    monkeypatch.setattr(analysis_cache.time, 'time', lambda: next(clock))
+
+    cache = AnalysisCache(str(tmpdir.join('cache.db')), max_entries=3)
+    for key in 'abc':
+        cache.put(key, [])
+        cache.flush()
+
+    # Using an entry keeps it
+    cache.get('a')
+    cache.put('d', [])
+    cache.flush()
+
+    assert [cache.get(key) is not None for key in 'abcd'] == \
+        [True, False, True, True]
+    assert entries(cache) == [(3,)]
+
+
+def test_entries_are_counted_once(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+    cache, other = AnalysisCache(path), AnalysisCache(path)
+    cache.put('a', [])
+    other.put('a', [])
+    other.put('b', [])
+    cache.flush()
+    other.flush()
+
+    assert entries(cache) == [(2,)]
+
+
+def test_keys_depend_on_the_model():
+    spacy_model = {"lang": "en", "name": "core_web_sm", "version": "2.0.0",
+                   "spacy_version": ">=2.0.0a18"}
+    upgraded = dict(spacy_model, version="2.1.0")
+
+    def key(meta):
+        return AnalysisCache.key(
+            "text", ['token'], model_version(CountingNLP(meta)))
+
+    assert key(spacy_model) == key(dict(spacy_model))
+    assert key(spacy_model) != key(upgraded)
+    assert key(spacy_model) != key(None)
+
+    fast = FastNLP({"foxes": "fox"}, ["the"])
+    assert model_version(fast) == \
+        model_version(FastNLP({"foxes": "fox"}, ["the"]))
+    assert model_version(fast) != model_version(FastNLP({}, ["the"]))
+
+
+def test_texts_are_parsed_once(tmpdir):
+    cache = AnalysisCache(str(tmpdir.join('cache.db')))
+    documents = [
+        {"id": 1, "text": "the fox"},
+        {"id": 2, "text": "the hen"},
+        {"id": 3, "text": "the fox"}
+    ]
+
+    nlp = CountingNLP()
+    index = InvertedIndex(nlp, batch_size=10, cache=cache)
+    index.index(documents)
+    assert sorted(nlp.texts) == ["the fox", "the hen"]
+    assert index.stats["cached"] == 1
+    assert index.inverted_index['text']['token']['fox'].tolist() == [1, 3]
+
+    # The next index takes all texts from the cache
+    nlp = CountingNLP()
+    cached_index = InvertedIndex(nlp, batch_size=10, cache=cache)
+    cached_index.index(documents)
+    assert nlp.texts == []
+    assert cached_index.words() == index.words()
+
+    # Unless the model changed
+    nlp = CountingNLP({"name": "other"})
+    InvertedIndex(nlp, batch_size=10, cache=cache).index(documents)
+    assert len(nlp.texts) == 2
@@ -0,0 +1,34 @@
+import logging
+
+import pytest
+
+from distributed_index.shared.fast_nlp import load_lemmas
+
+
+def test_lemmas_are_loaded(tmpdir):
+    table = tmpdir.join('lemmas.tsv')
+    table.write("foxes\tfox\nran\trun\nbroken line\n")
+
+    assert load_lemmas(str(table)) == {"foxes": "fox", "ran": "run"}
+
+
+def test_missing_table_is_rejected(tmpdir):
+    with pytest.raises(ValueError):
+        load_lemmas(str(tmpdir.join('missing.tsv')))
+
+
+def test_empty_table_is_rejected(tmpdir):
+    table = tmpdir.join('lemmas.tsv')
+    table.write("no lemmas here\n")
+
+    with pytest.raises(ValueError):
+        load_lemmas(str(table))
+
+
+def test_missing_table_can_be_allowed(tmpdir, caplog):
+    with caplog.at_level(logging.WARNING):
+        lemmas = load_lemmas(str(tmpdir.join('missing.tsv')),
+                             allow_missing=True)
+
+    assert lemmas == {}
+    assert "Words are their own lemmas" in caplog.text
@@ -0,0 +1,42 @@
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+from tornado.web import Application, RequestHandler
+
+from distributed_index.shared.metrics import (
+    ByteCounter, Metrics, request_logger
+)
+
+
+class EchoHandler(RequestHandler):
+    def post(self):
+        self.write(self.request.body * 2)
+
+
+def test_bytes_of_requests_and_responses_are_counted():
+    metrics = Metrics()
+    application = Application(
+        [('/echo', EchoHandler)], transforms=[ByteCounter],
+        log_function=request_logger(metrics, 'test'))
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(application)
+    server.add_sockets([sock])
+
+    @gen.coroutine
+    def send():
+        client = AsyncHTTPClient()
+        for body in (b'abc', b'defg'):
+            yield client.fetch(f'http://127.0.0.1:{port}/echo',
+                               method='POST', body=body)
+
+    IOLoop.current().run_sync(send)
+    server.stop()
+    rendered = metrics.render()
+
+    assert ('http_requests_total{code="200",handler="EchoHandler"} 2'
+            in rendered)
+    assert 'http_received_bytes_total{handler="EchoHandler"} 7' in rendered
+    assert 'http_sent_bytes_total{handler="EchoHandler"} 14' in rendered
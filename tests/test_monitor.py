@@ -0,0 +1,78 @@
+import logging
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from distributed_index.master_node import monitor as monitor_module
+from distributed_index.master_node.monitor import SlaveMonitor
+
+
+class FakeProcess:
+    """
+    A process that exits right away if its command says so.
+    """
+    started = []
+
+    def __init__(self, command):
+        self.returncode = 1 if command == ['crash'] else None
+        FakeProcess.started.append(command)
+
+    def poll(self):
+        return self.returncode
+
+
+class FakeResponse:
+    code = 200
+    body = b'{}'
+
+
+class FakeClient:
+    @gen.coroutine
+    def fetch(self, request, raise_error=True):
+        raise gen.Return(FakeResponse())
+
+
+def create_monitor(monkeypatch, clock):
+    FakeProcess.started = []
+    monkeypatch.setattr(monitor_module.subprocess, 'Popen', FakeProcess)
+    monkeypatch.setattr(monitor_module.time, 'time', lambda: clock[0])
+    monkeypatch.setattr(monitor_module, 'MAX_RESTARTS', 3)
+
+    return SlaveMonitor(FakeClient(), 'localhost', 5, 30,
+                        logging.getLogger(__name__))
+
+
+def heartbeats(monitor, clock, seconds):
+    for _ in range(seconds):
+        clock[0] += 1
+        IOLoop.current().run_sync(monitor.heartbeat)
+
+
+def test_crashing_node_is_given_up(monkeypatch):
+    clock = [0]
+    monitor = create_monitor(monkeypatch, clock)
+    monitor.start({"name": "slave_0", "port": 8081}, ['crash'])
+    monitor.start({"name": "slave_1", "port": 8082}, ['run'])
+
+    # Restarted after 1, 2 and 4 seconds, then given up
+    heartbeats(monitor, clock, 30)
+    assert FakeProcess.started.count(['crash']) == 4
+    assert monitor.given_up == {"slave_0"}
+    assert [node['name'] for node in monitor.live_nodes()] == ["slave_1"]
+
+
+def test_stable_node_is_restarted_right_away(monkeypatch):
+    clock = [0]
+    monitor = create_monitor(monkeypatch, clock)
+    node = {"name": "slave_0", "port": 8081}
+    monitor.start(node, ['run'])
+
+    for _ in range(5):
+        # The node runs for a long time before it exits
+        heartbeats(monitor, clock, monitor_module.STABLE_SECONDS)
+        assert monitor.is_alive(node)
+        monitor.processes["slave_0"].returncode = 1
+        heartbeats(monitor, clock, 2)
+
+    assert FakeProcess.started.count(['run']) == 6
+    assert monitor.given_up == set()
@@ -0,0 +1,60 @@
+import pytest
+
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.partitioning import HashRing
+
+from benchmarks import corpus
+from benchmarks.stub import StubNLP
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+
+def test_owners_do_not_depend_on_the_order():
+    ring = HashRing(['a', 'b', 'c'])
+    other = HashRing(['c', 'a', 'b'])
+
+    for word in WORDS:
+        assert ring.owner(word) == other.owner(word)
+        assert ring.nodes[ring.partition(word)] == ring.owner(word)
+
+
+def test_words_are_spread_over_the_nodes():
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    counts = {node: 0 for node in ring.nodes}
+    for word in WORDS:
+        counts[ring.owner(word)] += 1
+
+    for count in counts.values():
+        assert len(WORDS) / 8 < count < len(WORDS) / 2
+
+
+def test_adding_a_node_only_moves_its_words():
+    ring = HashRing(['a', 'b', 'c'])
+    larger = HashRing(['a', 'b', 'c', 'd'])
+
+    moved = [word for word in WORDS if ring.owner(word) != larger.owner(word)]
+    assert all(larger.owner(word) == 'd' for word in moved)
+    assert len(moved) < len(WORDS) / 2
+
+
+def test_empty_ring():
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_index_partitions():
+    index = InvertedIndex(StubNLP())
+    index.index(corpus.generate(20))
+    ring = HashRing(['a', 'b', 'c'])
+    index.partition(ring)
+
+    words = set()
+    for partition in range(len(ring)):
+        partial_index = index.create_partition(partition)
+        for analyzers in partial_index.values():
+            for partial in analyzers.values():
+                assert all(ring.partition(word) == partition
+                           for word in partial)
+                words.update(partial)
+
+    assert words == set(index.words())
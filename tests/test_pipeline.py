@@ -0,0 +1,167 @@
+import json
+from types import SimpleNamespace
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from distributed_index.master_node import pipeline
+from distributed_index.master_node.pipeline import Dispatcher, \
+    IndexPipelineMixin, cost_batches, cost_chunks, document_cost
+
+
+def documents(*lengths):
+    return [{"id": i, "text": "x" * length}
+            for i, length in enumerate(lengths)]
+
+
+def batch_costs(batches):
+    return [sum(map(document_cost, batch)) for batch in batches]
+
+
+def test_cost_batches():
+    corpus = documents(1000, 800, 600, 400, 300, 200, 100, 100)
+    batches = cost_batches(corpus, 3)
+
+    assert sorted(doc["id"] for batch in batches for doc in batch) == \
+        list(range(len(corpus)))
+
+    # The cost of the batches differs by less than the cheapest document
+    costs = batch_costs(batches)
+    assert max(costs) - min(costs) < document_cost(corpus[-1])
+
+
+def test_cost_batches_with_few_documents():
+    batches = cost_batches(documents(10, 5000), 3)
+
+    assert sorted(map(len, batches)) == [0, 1, 1]
+    assert cost_batches([], 2) == [[], []]
+
+
+def test_cost_chunks():
+    corpus = documents(100, 100, 2000, 100, 100, 100)
+    chunks = cost_chunks(corpus, 700)
+
+    # The chunks are consecutive and an expensive document gets its own
+    assert [[doc["id"] for doc in chunk] for chunk in chunks] == \
+        [[0, 1], [2], [3, 4], [5]]
+    assert all(cost <= 700 for chunk, cost in zip(chunks, batch_costs(chunks))
+               if len(chunk) > 1)
+
+
+class FakeResponse:
+    def __init__(self, code):
+        self.code = code
+        self.body = b'{"success": true, "words": []}'
+
+
+class FakeClient:
+    """
+    Answers the requests of the `Dispatcher` after a delay per document
+    that depends on the node and records them.
+    """
+
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = set(failing)
+        self.log = []
+
+    @gen.coroutine
+    def fetch(self, request, raise_error=True):
+        port = request.url.split(':')[2].split('/')[0]
+        body = json.loads(request.body)
+
+        if request.url.endswith('/api/index/cancel'):
+            self.log.append(('cancel', port, body['task']))
+            raise gen.Return(FakeResponse(200))
+
+        self.log.append(('index', port, body.get('task'), body['append'],
+                         [doc['id'] for doc in body['documents']]))
+        yield gen.sleep(self.delays[port] * len(body['documents']))
+        self.log.append(('done', port, body.get('task')))
+
+        raise gen.Return(FakeResponse(500 if port in self.failing else 200))
+
+
+class FakeHandler(IndexPipelineMixin):
+    def __init__(self, client):
+        self.config = SimpleNamespace(
+            address='localhost', scoring=False, positions=False,
+            shuffle='pull', prepartition=False)
+        self.environment = SimpleNamespace(http_client=client)
+        self._trace = 'trace'
+
+
+NODES = [{"name": name, "port": name} for name in "abc"]
+
+
+def dispatch(client, chunks, **kwargs):
+    dispatcher = Dispatcher(FakeHandler(client), NODES, **kwargs)
+
+    @gen.coroutine
+    def run():
+        for chunk in chunks:
+            yield dispatcher.send(chunk)
+        responses = yield dispatcher.finish()
+        raise gen.Return(responses)
+
+    return dispatcher, IOLoop.current().run_sync(run)
+
+
+def indexed(client, node):
+    return [entry[4] for entry in client.log
+            if entry[0] == 'index' and entry[1] == node]
+
+
+def test_chunks_are_appended():
+    client = FakeClient({'a': 0.001, 'b': 0.001, 'c': 0.001})
+    chunks = [documents(1, 1) for _ in range(5)]
+    dispatcher, responses = dispatch(client, chunks)
+
+    assert len(responses) == 5
+    for node in "abc":
+        appends = [entry[3] for entry in client.log
+                   if entry[0] == 'index' and entry[1] == node]
+        assert appends[0] is False and all(appends[1:])
+
+
+def test_failed_node():
+    client = FakeClient({'a': 0.001, 'b': 0.001, 'c': 0.001},
+                        failing={'b'})
+    chunks = [[{"id": i, "text": "x"}] for i in range(6)]
+    dispatcher, responses = dispatch(client, chunks, keep_chunks=True)
+
+    assert dispatcher.failed == {'b'}
+    indexed_ids = sorted(
+        doc_id for node in "ac" for ids in indexed(client, node)
+        for doc_id in ids)
+    assert indexed_ids == list(range(6))
+    assert all(response.code == 200 for response in responses)
+
+
+def test_speculation(monkeypatch):
+    monkeypatch.setattr(pipeline, 'SPECULATION_INTERVAL', 0.01)
+
+    # Node c is much slower than the others
+    client = FakeClient({'a': 0.01, 'b': 0.01, 'c': 0.5})
+    chunks = [[{"id": i, "text": "x"}, {"id": i + 100, "text": "x"}]
+              for i in range(6)]
+    dispatcher, responses = dispatch(
+        client, chunks, keep_chunks=True, speculative=True,
+        speculation_factor=2)
+
+    # The chunk of c was indexed by another node as well and cancelled on c
+    cancels = [entry for entry in client.log if entry[0] == 'cancel']
+    assert [entry[1] for entry in cancels] == ['c']
+    task = cancels[0][2]
+    assert dispatcher.finished[task] in 'ab'
+    assert dispatcher.documents_indexed == 12
+
+    # The losing copy was done before the index is merged
+    assert ('done', 'c', task) in client.log
+
+    # It was the first chunk of c, so c replaced its index again with an
+    # empty request
+    assert len(responses) == 7
+    assert indexed(client, 'c')[-1] == []
+    assert [entry[3] for entry in client.log
+            if entry[0] == 'index' and entry[1] == 'c'][-1] is False
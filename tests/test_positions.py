@@ -0,0 +1,58 @@
+from distributed_index.shared import positions
+from distributed_index.shared.inverted_index import InvertedIndex
+
+from benchmarks.stub import StubNLP
+
+DOCUMENTS = [
+    {"id": 1, "text": "quick brown fox"},
+    {"id": 2, "text": "brown quick fox"},
+    {"id": 3, "text": "quick old brown fox"},
+    {"id": 4, "text": "the fox quick brown"}
+]
+
+
+def postings(*entries):
+    return [positions.encode(doc_id, position)
+            for doc_id, position in entries]
+
+
+def phrase(index, text, slop=0):
+    tokens = index.inverted_index['text']['token']
+    return positions.match_phrase(
+        [tokens.get(term, []) for term in text.split()], slop).tolist()
+
+
+def test_encode():
+    entry = positions.encode(5, 7)
+    assert positions.doc_ids([entry]).tolist() == [5]
+    assert entry & (2 ** positions.POSITION_BITS - 1) == 7
+
+
+def test_match_phrase():
+    first = postings((1, 0), (2, 4), (3, 1))
+    second = postings((1, 1), (2, 3), (3, 3))
+
+    assert positions.match_phrase([first, second]).tolist() == [1]
+    assert positions.match_phrase([first, second], slop=1).tolist() == [1, 3]
+    assert positions.match_phrase([second, first]).tolist() == [2]
+    assert positions.match_phrase([]).tolist() == []
+    assert positions.match_phrase([first, []]).tolist() == []
+
+
+def test_phrases_of_an_index():
+    index = InvertedIndex(StubNLP(), positional=True)
+    index.index(DOCUMENTS)
+
+    assert phrase(index, "quick brown") == [1, 4]
+    assert phrase(index, "quick brown fox") == [1]
+    assert phrase(index, "quick brown fox", slop=1) == [1, 3]
+    assert phrase(index, "brown quick") == [2]
+    assert phrase(index, "quick unknown") == []
+
+
+def test_strip_positions():
+    index = InvertedIndex(StubNLP(), positional=True)
+    index.index(DOCUMENTS)
+
+    stripped = positions.strip_positions(index.inverted_index)
+    assert stripped['text']['token']['fox'].tolist() == [1, 2, 3, 4]
@@ -0,0 +1,70 @@
+import numpy as np
+
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.scoring import FieldLengths, bm25, score, \
+    strip_frequencies, top_k
+
+from benchmarks.stub import StubNLP
+
+
+def test_field_lengths():
+    lengths = FieldLengths({"3": 10, "1": 2})
+    lengths.update(FieldLengths({"2": 4, "3": 6}))
+    assert lengths.doc_ids.tolist() == [1, 2, 3]
+    assert lengths.get([3, 1]).tolist() == [6, 2]
+    assert lengths.average_length == 4
+
+    lengths.delete([2])
+    assert lengths.number_of_documents == 2
+    assert FieldLengths.from_arrays([3, 1], [6, 2]).get([1]).tolist() == [2]
+
+
+def test_bm25():
+    # Rare terms, frequent terms and short documents score higher
+    assert bm25(1, 10, 1, 100, 10) > bm25(1, 10, 50, 100, 10)
+    assert bm25(3, 10, 1, 100, 10) > bm25(1, 10, 1, 100, 10)
+    assert bm25(1, 5, 1, 100, 10) > bm25(1, 20, 1, 100, 10)
+
+    # The frequency saturates
+    assert bm25(100, 10, 1, 100, 10) < bm25(1, 10, 1, 100, 10) * 3
+
+
+def test_score():
+    doc_ids = np.array([1, 2, 3])
+    lengths = FieldLengths({"1": 3, "2": 3, "3": 3})
+
+    # Term a occurs twice in document 1, term b once in document 3
+    scores = score(doc_ids, [[1, 1, 2], [3]], lengths)
+    assert scores[0] > scores[1] > 0
+    assert scores[2] > scores[1]
+
+    # Postings of documents that do not match are ignored
+    assert score(np.array([2]), [[1, 1, 2]], lengths).tolist() == \
+        [scores[1]]
+
+
+def test_top_k():
+    doc_ids = np.array([1, 2, 3, 4])
+    scores = np.array([0.5, 2.0, 0.5, 1.0])
+
+    assert [ids.tolist() for ids in top_k(doc_ids, scores, 2)] == \
+        [[2, 4], [2.0, 1.0]]
+
+    # Ties are broken by doc id
+    assert top_k(doc_ids, scores, 4)[0].tolist() == [2, 4, 1, 3]
+    assert top_k(doc_ids, scores, 10)[0].tolist() == [2, 4, 1, 3]
+    assert top_k(doc_ids, scores, 0)[0].tolist() == []
+
+
+def test_scoring_index():
+    index = InvertedIndex(StubNLP(), scoring=True)
+    index.index([
+        {"id": 1, "text": "fox fox hen"},
+        {"id": 2, "text": "fox"}
+    ])
+
+    tokens = index.inverted_index['text']['token']
+    assert tokens['fox'].tolist() == [1, 1, 2]
+    assert index.field_lengths['text'] == {1: 3, 2: 1}
+    assert strip_frequencies(index.inverted_index)['text']['token'][
+        'fox'].tolist() == [1, 2]
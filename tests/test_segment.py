@@ -0,0 +1,62 @@
+import pytest
+
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.segment import Segment, write_segment
+
+from benchmarks import corpus
+from benchmarks.stub import StubNLP
+from tests.test_wire import as_lists
+
+
+def test_small_index_round_trip(tmpdir):
+    inverted_index = {
+        'text': {
+            'token': {'ka': [0, 5, 6], 'lo': [], 'mí': [2 ** 40]},
+            'lemma': {}
+        }
+    }
+    path = str(tmpdir.join('small.seg'))
+    write_segment(path, inverted_index, scoring=True)
+
+    segment = Segment(path)
+    assert segment.settings == {'scoring': True}
+    assert as_lists(segment.inverted_index) == inverted_index
+
+    table = segment.inverted_index['text']['token']
+    assert list(table) == ['ka', 'lo', 'mí']
+    assert 'mi' not in table
+    assert table.prefix('m') == {'mí': table['mí']}
+    with pytest.raises(KeyError):
+        table['mi']
+
+
+@pytest.mark.parametrize('settings', [
+    {'scoring': False, 'positional': False},
+    {'scoring': True, 'positional': False},
+    {'scoring': False, 'positional': True}
+])
+def test_index_round_trip(tmpdir, settings):
+    index = InvertedIndex(StubNLP(), fields=['title', 'text'], **settings)
+    index.index(corpus.generate(30))
+    path = str(tmpdir.join('index.seg'))
+    index.save_to_file(path)
+
+    loaded = InvertedIndex.from_file(None, path)
+    assert loaded.fields == index.fields
+    assert loaded.analyzers == index.analyzers
+    assert loaded.scoring == index.scoring
+    assert loaded.positional == index.positional
+    assert as_lists(loaded.inverted_index) == \
+        as_lists(index.inverted_index)
+
+    table = loaded.inverted_index['text']['token']
+    words = sorted(table)
+    assert list(table.range(words[1], words[3])) == words[1:3]
+
+
+def test_not_a_segment(tmpdir):
+    path = tmpdir.join('index.json')
+    path.write('{"text": {}}')
+
+    with pytest.raises(ValueError):
+        Segment(str(path))
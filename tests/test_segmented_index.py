@@ -0,0 +1,87 @@
+from distributed_index.shared import positions
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.segmented_index import SegmentedIndex
+
+from benchmarks.stub import StubNLP
+
+
+def create_index(*texts, **settings):
+    index = InvertedIndex(StubNLP(), **settings)
+    index.index([{"id": doc_id, "text": text} for doc_id, text in texts])
+    return index
+
+
+def search(shard, word):
+    partial_index = shard.create_partial_index([word])
+    return sorted(set(
+        partial_index.get('text', {}).get('token', {}).get(word, [])))
+
+
+def test_update_a_document():
+    shard = SegmentedIndex()
+    shard.add_segment(create_index((1, "fox"), (2, "fox hen")))
+
+    # Replace document 2 by a new version without "fox"
+    shard.delete([2])
+    shard.add_segment(create_index((2, "hen")))
+
+    assert search(shard, 'fox') == [1]
+    assert search(shard, 'hen') == [2]
+
+    shard.delete([1])
+    assert search(shard, 'fox') == []
+
+
+def test_compact():
+    shard = SegmentedIndex()
+    shard.add_segment(create_index((1, "fox"), (2, "fox hen")))
+    shard.delete([2])
+    shard.add_segment(create_index((2, "hen"), (3, "fox")))
+
+    shard.compact()
+    assert len(shard.segments) == 1
+    assert shard.tombstones == {}
+    assert search(shard, 'fox') == [1, 3]
+    assert search(shard, 'hen') == [2]
+
+
+def test_replace_keeps_newer_changes():
+    shard = SegmentedIndex()
+    shard.add_segment(create_index((1, "fox"), (2, "fox")))
+    shard.delete([2])
+    shard.add_segment(create_index((3, "fox")))
+
+    segments = list(shard.segments)
+    tombstones = dict(shard.tombstones)
+    merged_index = shard.merge_segments(segments, tombstones)
+
+    # A segment is added and document 3 is deleted while merging
+    shard.delete([3])
+    shard.add_segment(create_index((4, "fox")))
+
+    assert shard.replace(segments, tombstones, merged_index)
+    assert [generation for generation, _ in shard.segments] == [2, 3]
+    assert shard.tombstones == {3: 2}
+    assert search(shard, 'fox') == [1, 4]
+
+
+def test_replace_after_the_shard_changed():
+    shard = SegmentedIndex()
+    shard.add_segment(create_index((1, "fox")))
+    segments = list(shard.segments)
+    merged_index = shard.merge_segments(segments, {})
+
+    # Another compaction replaced the segments first
+    shard.compact()
+    assert not shard.replace(segments, {}, merged_index)
+    assert search(shard, 'fox') == [1]
+
+
+def test_positional_tombstones():
+    shard = SegmentedIndex(positional=True)
+    shard.add_segment(
+        create_index((1, "fox"), (2, "hen fox"), positional=True))
+    shard.delete([1])
+
+    fox = shard.create_partial_index(['fox'])['text']['token']['fox']
+    assert positions.doc_ids(fox).tolist() == [2]
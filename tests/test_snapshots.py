@@ -0,0 +1,92 @@
+import os
+
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.scoring import FieldLengths
+from distributed_index.shared.segmented_index import SegmentedIndex
+from distributed_index.shared.snapshots import ClusterSnapshot, \
+    ShardSnapshot
+
+from benchmarks.stub import StubNLP
+
+
+def create_index(*texts):
+    index = InvertedIndex(StubNLP(), scoring=True)
+    index.index([{"id": doc_id, "text": text} for doc_id, text in texts])
+    return index
+
+
+def search(shard, word):
+    partial_index = shard.create_partial_index([word])
+    return sorted(set(
+        partial_index.get('text', {}).get('token', {}).get(word, [])))
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory)
+                  if name.endswith('.seg'))
+
+
+def test_restore_a_shard(tmpdir):
+    shard = SegmentedIndex(scoring=True)
+    shard.add_segment(create_index((1, "fox hen"), (2, "fox")))
+    shard.delete([2])
+    shard.add_segment(create_index((2, "hen")))
+
+    directory = str(tmpdir.join('node'))
+    ShardSnapshot(directory).save(shard)
+
+    restored = ShardSnapshot(directory).load()
+    assert restored.scoring and not restored.positional
+    assert restored.generation == shard.generation
+    assert restored.tombstones == shard.tombstones
+    assert [generation for generation, _ in restored.segments] == [1, 2]
+    assert search(restored, 'fox') == [1]
+    assert search(restored, 'hen') == [1, 2]
+
+
+def test_segments_are_written_once(tmpdir):
+    directory = str(tmpdir.join('node'))
+    snapshot = ShardSnapshot(directory)
+    shard = SegmentedIndex()
+    shard.add_segment(create_index((1, "fox")))
+    snapshot.save(shard)
+    first = segment_files(directory)
+
+    shard.add_segment(create_index((2, "hen")))
+    snapshot.save(shard)
+    assert set(first) < set(segment_files(directory))
+
+    # The files of merged segments are removed
+    shard.compact()
+    snapshot.save(shard)
+    assert len(segment_files(directory)) == 1
+    assert search(ShardSnapshot(directory).load(), 'hen') == [2]
+
+
+def test_no_snapshot(tmpdir):
+    assert ShardSnapshot(str(tmpdir.join('node'))).load() is None
+    assert ClusterSnapshot(str(tmpdir.join('master')), {}).load() is None
+
+
+def test_restore_the_cluster(tmpdir):
+    directory = str(tmpdir.join('master'))
+    settings = {"scoring": True, "positions": False}
+    nodes = [{"name": "slave_0", "port": 8081},
+             {"name": "slave_1", "port": 8082}]
+    ClusterSnapshot(directory, settings).save({
+        "nodes": nodes,
+        "field_lengths": {
+            "text": FieldLengths({"1": 3, "2": 5}),
+            "title": FieldLengths({"1": 1})
+        }
+    })
+
+    cluster = ClusterSnapshot(directory, dict(settings)).load()
+    assert cluster["nodes"] == nodes
+    assert cluster["ring"].nodes == ["slave_0", "slave_1"]
+    assert cluster["field_lengths"]["text"].get([2, 1]).tolist() == [5, 3]
+    assert cluster["field_lengths"]["title"].number_of_documents == 1
+
+    # A snapshot of an index with other settings is not restored
+    assert ClusterSnapshot(
+        directory, dict(settings, scoring=False)).load() is None
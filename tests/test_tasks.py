@@ -0,0 +1,52 @@
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.slave_node.tasks import store_index
+
+from benchmarks import corpus
+from benchmarks.stub import StubNLP
+
+
+def create_index(documents):
+    index = InvertedIndex(StubNLP())
+    index.index(documents)
+    return index
+
+
+def index_container(index=None):
+    return {"index": index, "tasks": {}, "cancelled": set()}
+
+
+def test_store_and_append():
+    documents = corpus.generate(4)
+    container = index_container(create_index(documents[:1]))
+
+    first = create_index(documents[1:3])
+    assert store_index(container, first, 'a', [1, 2])
+    assert container['index'] is first
+    assert container['tasks'] == {'a': [1, 2]}
+
+    assert store_index(container, create_index(documents[3:]), 'b', [3],
+                       append=True)
+    assert container['index'] is first
+    assert set(container['index'].words()) == \
+        set(create_index(documents[1:]).words())
+    assert container['tasks'] == {'a': [1, 2], 'b': [3]}
+
+
+def test_cancelled_request_keeps_the_index():
+    documents = corpus.generate(2)
+    stored = create_index(documents[:1])
+    container = index_container(stored)
+    container['tasks'] = {'a': [0]}
+    container['cancelled'].add('b')
+
+    # A request that replaces the index
+    assert not store_index(container, create_index(documents[1:]), 'b', [1])
+    assert container['index'] is stored
+    assert container['tasks'] == {'a': [0]}
+    assert container['cancelled'] == set()
+
+    # Nothing is stored before the first index either
+    container = index_container()
+    container['cancelled'].add('b')
+    assert not store_index(container, create_index(documents), 'b', [0, 1])
+    assert container['index'] is None
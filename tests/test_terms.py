@@ -0,0 +1,151 @@
+import numpy as np
+
+from distributed_index.shared.inverted_index import InvertedIndex
+from distributed_index.shared.terms import TermDictionary, TermTable
+
+from benchmarks import corpus
+from benchmarks.stub import StubNLP
+
+
+def postings(*doc_ids):
+    return np.array(doc_ids, dtype=np.int64)
+
+
+def as_dict(table):
+    return {term: list(postings) for term, postings in table.items()}
+
+
+def test_dictionary_ids_are_stable():
+    terms = TermDictionary()
+    assert terms.add('b') == 0
+    assert terms.add('a') == 1
+    assert terms.add('b') == 0
+
+    terms.retain({1})
+    assert 'b' not in terms
+    assert terms.terms == [None, 'a']
+
+    # Ids of removed terms are not reused
+    assert terms.add('b') == 2
+    assert terms.sorted() == ['a', 'b']
+
+
+def test_dictionary_range_and_prefix():
+    terms = TermDictionary()
+    for term in ['kalo', 'ka', 'mine', 'kato', 'lo']:
+        terms.add(term)
+
+    assert terms.prefix('ka') == ['ka', 'kalo', 'kato']
+    assert terms.prefix('x') == []
+    assert terms.range('kalo', 'mine') == ['kalo', 'kato', 'lo']
+    assert terms.range(end='kalo') == ['ka']
+    assert terms.range('z', 'a') == []
+
+
+def test_table_round_trip():
+    table = TermTable(TermDictionary())
+    expected = {'ka': [1, 2], 'lo': [3], 'mi': [2, 5, 9]}
+    for term, doc_ids in expected.items():
+        table[term] = postings(*doc_ids)
+
+    assert as_dict(table) == expected
+    table.pack()
+    assert not table.postings
+    assert as_dict(table) == expected
+    assert len(table) == 3
+    assert list(table['mi']) == [2, 5, 9]
+    assert 'ne' not in table
+
+
+def test_table_packed_offsets():
+    table = TermTable(TermDictionary())
+    table['ka'] = postings(1, 2)
+    table['lo'] = postings()
+    table['mi'] = postings(4, 5, 6)
+    table.pack()
+
+    assert list(table.offsets) == [0, 2, 2, 5]
+    assert list(table.data) == [1, 2, 4, 5, 6]
+    assert list(table.slots) == [0, 1, 2]
+    assert list(table['lo']) == []
+
+
+def test_table_delete_and_add_again():
+    terms = TermDictionary()
+    table = TermTable(terms)
+    table['ka'] = postings(1)
+    table['lo'] = postings(2)
+    table.pack()
+
+    # Deleting a packed term leaves a marker until the table is packed
+    del table['ka']
+    assert table.postings == {terms.ids['ka']: None}
+    assert 'ka' not in table
+    assert as_dict(table) == {'lo': [2]}
+    assert len(table) == 1
+
+    table['ka'] = postings(3)
+    assert as_dict(table) == {'lo': [2], 'ka': [3]}
+
+    # Deleting a term that was not packed yet drops it from the dict
+    table['mi'] = postings(4)
+    del table['mi']
+    assert terms.ids['mi'] not in table.postings
+
+    table.pack()
+    assert as_dict(table) == {'ka': [3], 'lo': [2]}
+    assert list(table.slots) == [0, 1, -1]
+
+
+def test_table_pack_ratio():
+    table = TermTable(TermDictionary())
+    for i in range(8):
+        table[f"t{i}"] = postings(i)
+    table.pack()
+
+    table['t0'] = postings(10)
+    table.pack(ratio=0.25)
+    assert table.postings
+
+    table['t1'] = postings(11)
+    table['t2'] = postings(12)
+    table.pack(ratio=0.25)
+    assert not table.postings
+    assert list(table['t0']) == [10]
+
+
+def test_tables_share_the_dictionary():
+    terms = TermDictionary()
+    tokens, lemmas = TermTable(terms), TermTable(terms)
+    tokens['runs'] = postings(1)
+    lemmas['run'] = postings(1)
+    lemmas['runs'] = postings(2)
+
+    assert len(terms) == 2
+    assert list(tokens.ids()) == [terms.ids['runs']]
+    assert dict(tokens.items_by_id([1, 0, 7])) == {0: tokens['runs']}
+    assert tokens.prefix('ru') == {'runs': tokens['runs']}
+    assert lemmas.range('run', 'runs') == {'run': lemmas['run']}
+
+
+def test_delete_and_add_again():
+    documents = corpus.generate(20)
+    index = InvertedIndex(StubNLP())
+    index.index(documents)
+    words = set(index.words())
+
+    index.delete([doc['id'] for doc in documents[:10]])
+    remaining = InvertedIndex(StubNLP())
+    remaining.index(documents[10:])
+
+    # Words that only occurred in the deleted documents are forgotten
+    assert set(index.terms) == set(remaining.words())
+    assert None in index.terms.terms
+    for field in index.fields:
+        for analyzer in index.analyzers:
+            assert as_dict(index.inverted_index[field][analyzer]) == \
+                as_dict(remaining.inverted_index[field][analyzer])
+
+    index.index(documents[:10])
+    assert set(index.words()) == words
+    assert len(index.terms) == len(words)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from distributed_index.shared import wire
+from distributed_index.shared.inverted_index import InvertedIndex
+
+from benchmarks import corpus
+from benchmarks.stub import StubNLP
+
+
+def as_lists(inverted_index):
+    return {
+        field: {
+            analyzer: {
+                term: list(postings) for term, postings in index.items()
+            }
+            for analyzer, index in analyzers.items()
+        }
+        for field, analyzers in inverted_index.items()
+    }
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2 ** 32, 2 ** 62],
+                      dtype=np.int64)
+    data = wire.encode_varints(values)
+
+    assert len(data) == wire.varint_lengths(values).sum()
+    assert list(wire.decode_varints(data)) == list(values)
+
+
+def test_small_index_round_trip():
+    inverted_index = {
+        'text': {
+            'token': {'ka': [0, 5, 6], 'lo': [], 'mí': [2 ** 40]},
+            'lemma': {'ka': [1]}
+        },
+        'title': {'token': {}, 'lemma': {'lo': [3, 3, 4]}}
+    }
+
+    decoded = wire.decode_index(wire.encode_index(inverted_index))
+    assert as_lists(decoded) == inverted_index
+
+
+@pytest.mark.parametrize('settings', [
+    {},
+    {'scoring': True},
+    {'positional': True}
+])
+def test_index_round_trip(settings):
+    index = InvertedIndex(StubNLP(), fields=['title', 'text'], **settings)
+    index.index(corpus.generate(30))
+
+    decoded = wire.decode_index(wire.encode_index(index.inverted_index))
+    assert as_lists(decoded) == as_lists(index.inverted_index)
+
+
+def test_not_an_index():
+    with pytest.raises(ValueError):
+        wire.decode_index(b'{"text": {}}')
+
+
+def test_encode_array_postings_directly():
+    # The handlers encode the arrays of the index without a model
+    index = InvertedIndex(StubNLP(), scoring=True)
+    index.index(corpus.generate(10))
+    partial_index = index.create_partial_index(index.words()[:50])
+
+    assert wire.encode_index(partial_index) == wire.encode_index(
+        InvertedIndex.serialize(partial_index))